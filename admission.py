@@ -0,0 +1,356 @@
+"""
+admission.py
+Admission control in front of every outbound LLM and search call.
+
+One gate per backend bounds how many calls run at once and how much quota
+they use per minute (tokens for OpenAI, queries for Google). Calls that
+cannot start yet wait in a queue served by priority (high, normal, low)
+and, within a priority, round-robin across tenants, so one heavy tenant
+cannot take the whole quota from the others.
+
+Backpressure is applied when a request starts, not halfway through it:
+admit() rejects a new request with Overloaded (carrying a retry-after
+estimate) when the queues are full or the tenant already has too many
+requests running, and otherwise reports how many calls are queued ahead.
+Calls of an admitted request always queue and only fail if their own
+deadline passes first.
+
+The tenant and priority of calls made in the current context are set with
+as_tenant() (or set_tenant() where the context cannot be scoped, as in a
+Streamlit rerun); worker threads inherit them through tracing.bind().
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from metrics import ADMISSION_REJECTED, ADMISSION_WAIT
+from tracing import current_span
+
+# Chat completions in flight at once, across all users
+ADMISSION_LLM_CONCURRENCY = int(os.environ.get("ADMISSION_LLM_CONCURRENCY", 16))
+# OpenAI tokens per minute (prompt + completion; 0 = unlimited)
+ADMISSION_LLM_TPM = int(os.environ.get("ADMISSION_LLM_TPM", 0))
+# Custom Search requests in flight at once
+ADMISSION_SEARCH_CONCURRENCY = int(os.environ.get("ADMISSION_SEARCH_CONCURRENCY", 4))
+# Custom Search requests per minute (0 = unlimited)
+ADMISSION_SEARCH_PER_MINUTE = int(os.environ.get("ADMISSION_SEARCH_PER_MINUTE", 100))
+# Queued calls beyond which new requests are turned away
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 64))
+# Requests one tenant may have running at once
+ADMISSION_MAX_PER_TENANT = int(os.environ.get("ADMISSION_MAX_PER_TENANT", 4))
+
+PRIORITIES = ("high", "normal", "low")
+
+# Completion tokens assumed for calls that set no max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+_tenant: ContextVar[Tuple[str, str]] = ContextVar("admission_tenant", default=("default", "normal"))
+
+
+class QueueTimeout(TimeoutError):
+    """A call waited its whole timeout at a gate; the backend was never called."""
+
+
+class Overloaded(Exception):
+    """A new request was turned away; retry after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ============================================================================
+# TENANT CONTEXT
+# ============================================================================
+
+def current_tenant() -> Tuple[str, str]:
+    """(tenant, priority) calls in this context are queued under."""
+    return _tenant.get()
+
+
+def set_tenant(tenant: str, priority: str = "normal"):
+    """Queue this context's calls under tenant at priority, until changed."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority {priority!r}; use one of {', '.join(PRIORITIES)}")
+    _tenant.set((tenant, priority))
+
+
+@contextmanager
+def as_tenant(tenant: str, priority: str = "normal"):
+    """Queue the calls made inside the block under tenant at priority."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority {priority!r}; use one of {', '.join(PRIORITIES)}")
+    token = _tenant.set((tenant, priority))
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def estimate_tokens(kwargs: Dict) -> int:
+    """Rough prompt + completion tokens of a chat completion call (4 characters per token)."""
+    prompt = json.dumps(kwargs.get("messages", []), ensure_ascii=False, default=str)
+    if kwargs.get("tools"):
+        prompt += json.dumps(kwargs["tools"], default=str)
+    return len(prompt) // 4 + (kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+# ============================================================================
+# GATE
+# ============================================================================
+
+class _Waiter:
+    __slots__ = ('tenant', 'cost', 'granted')
+
+    def __init__(self, tenant: str, cost: float):
+        self.tenant = tenant
+        self.cost = cost
+        self.granted = False
+
+
+class Permit:
+    """A granted call; release it (or leave the with block) when the call is done."""
+
+    __slots__ = ('gate', 'cost', 'waited', 'started', 'actual_cost', '_released')
+
+    def __init__(self, gate: "Gate", cost: float, waited: float, started: float):
+        self.gate = gate
+        self.cost = cost
+        self.waited = waited
+        self.started = started
+        # Set to what the call really used to correct the budget on release
+        self.actual_cost: Optional[float] = None
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.gate._release(self)
+
+    def __enter__(self) -> "Permit":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Gate:
+    """Concurrency and per-minute budget for one backend, with fair queuing."""
+
+    def __init__(self, name: str, concurrency: int, per_minute: float = 0, clock=time.monotonic):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.per_minute = per_minute
+        self._clock = clock
+        self._cond = threading.Condition()
+        # One queue per priority: tenant -> its waiters, in round-robin order
+        self._queues = [OrderedDict() for _ in PRIORITIES]
+        self._waiting = 0
+        self.in_flight = 0
+        self._budget = float(per_minute)
+        self._refilled = clock()
+        # Smoothed seconds a call holds its slot, for retry-after estimates
+        self._avg_hold = 1.0
+
+    def waiting(self) -> int:
+        with self._cond:
+            return self._waiting
+
+    def estimated_wait(self) -> float:
+        """Seconds until a call queued now would likely start."""
+        with self._cond:
+            return (self._waiting + 1) / self.concurrency * self._avg_hold
+
+    def acquire(self, cost: float = 1, timeout: Optional[float] = None) -> Permit:
+        """
+        Wait for a slot and budget for a call of this cost.
+
+        Raises:
+            QueueTimeout: none was free within timeout seconds
+        """
+        tenant, priority = current_tenant()
+        queue = self._queues[PRIORITIES.index(priority)]
+        waiter = _Waiter(tenant, cost)
+        start = self._clock()
+        with self._cond:
+            queue.setdefault(tenant, deque()).append(waiter)
+            self._waiting += 1
+            self._dispatch()
+            while not waiter.granted:
+                remaining = None if timeout is None else start + timeout - self._clock()
+                if remaining is not None and remaining <= 0:
+                    self._withdraw(queue, waiter)
+                    raise QueueTimeout(f"No {self.name} capacity within {timeout:.0f}s")
+                delays = [d for d in (remaining, self._refill_delay()) if d is not None]
+                self._cond.wait(min(delays) if delays else None)
+                self._dispatch()
+        waited = self._clock() - start
+        ADMISSION_WAIT.observe(waited, gate=self.name)
+        if waited > 0.01:
+            current_span().set(f"{self.name}_queue_wait", round(waited, 3))
+        return Permit(self, cost, waited, self._clock())
+
+    def _release(self, permit: Permit):
+        with self._cond:
+            self.in_flight -= 1
+            if permit.actual_cost is not None and self.per_minute:
+                self._budget -= permit.actual_cost - permit.cost
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * (self._clock() - permit.started)
+            self._dispatch()
+
+    # ------------------------------------------------------------------
+    # Queue (callers hold self._cond)
+    # ------------------------------------------------------------------
+
+    def _refill(self):
+        now = self._clock()
+        if self.per_minute:
+            self._budget = min(self.per_minute, self._budget + (now - self._refilled) * self.per_minute / 60)
+        self._refilled = now
+
+    def _head(self):
+        for queue in self._queues:
+            if queue:
+                tenant, waiters = next(iter(queue.items()))
+                return queue, tenant, waiters
+        return None
+
+    def _affordable(self, cost: float) -> bool:
+        # A call larger than the whole budget may start once the budget is full
+        return not self.per_minute or self._budget >= min(cost, self.per_minute)
+
+    def _refill_delay(self) -> Optional[float]:
+        """Seconds until the next waiter can afford its call, if budget is what holds it."""
+        head = self._head()
+        if head is None or not self.per_minute or self.in_flight >= self.concurrency:
+            return None
+        shortfall = min(head[2][0].cost, self.per_minute) - self._budget
+        return max(shortfall * 60 / self.per_minute, 0.001)
+
+    def _dispatch(self):
+        self._refill()
+        granted = False
+        while self.in_flight < self.concurrency:
+            head = self._head()
+            if head is None:
+                break
+            queue, tenant, waiters = head
+            waiter = waiters[0]
+            # The head waits for budget rather than letting cheaper calls overtake it
+            if not self._affordable(waiter.cost):
+                break
+            waiters.popleft()
+            # Round robin: the tenant moves to the back of its priority
+            del queue[tenant]
+            if waiters:
+                queue[tenant] = waiters
+            self._waiting -= 1
+            self.in_flight += 1
+            self._budget -= waiter.cost
+            waiter.granted = True
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _withdraw(self, queue, waiter: _Waiter):
+        waiters = queue[waiter.tenant]
+        waiters.remove(waiter)
+        if not waiters:
+            del queue[waiter.tenant]
+        self._waiting -= 1
+        self._dispatch()
+
+
+# ============================================================================
+# CONTROLLER
+# ============================================================================
+
+class Ticket:
+    """An admitted request; release it when the request is finished."""
+
+    __slots__ = ('tenant', 'position', '_controller', '_released')
+
+    def __init__(self, controller: "AdmissionController", tenant: str, position: int):
+        self.tenant = tenant
+        # Calls queued ahead when the request was admitted
+        self.position = position
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self.tenant)
+
+    def __enter__(self) -> "Ticket":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """The LLM and search gates plus request-level backpressure."""
+
+    def __init__(self, llm_concurrency: int = ADMISSION_LLM_CONCURRENCY, llm_tpm: int = ADMISSION_LLM_TPM,
+                 search_concurrency: int = ADMISSION_SEARCH_CONCURRENCY,
+                 search_per_minute: int = ADMISSION_SEARCH_PER_MINUTE,
+                 max_queue: int = ADMISSION_MAX_QUEUE, max_per_tenant: int = ADMISSION_MAX_PER_TENANT):
+        self.llm = Gate("llm", llm_concurrency, llm_tpm)
+        self.search = Gate("search", search_concurrency, search_per_minute)
+        self.max_queue = max_queue
+        self.max_per_tenant = max_per_tenant
+        self._lock = threading.Lock()
+        self._active: Dict[str, int] = {}
+
+    def admit(self, tenant: str) -> Ticket:
+        """
+        Admit a new request from tenant.
+
+        Raises:
+            Overloaded: the queues are full or the tenant is at its limit
+        """
+        waiting = self.llm.waiting() + self.search.waiting()
+        with self._lock:
+            if waiting >= self.max_queue:
+                reason, message = "queue_full", f"{waiting} calls are already queued"
+            elif self._active.get(tenant, 0) >= self.max_per_tenant:
+                reason, message = "tenant_limit", f"{tenant} already has {self.max_per_tenant} requests running"
+            else:
+                self._active[tenant] = self._active.get(tenant, 0) + 1
+                return Ticket(self, tenant, waiting)
+        ADMISSION_REJECTED.inc(reason=reason)
+        retry_after = max(self.llm.estimated_wait(), self.search.estimated_wait())
+        raise Overloaded(f"Busy: {message}", retry_after=math.ceil(retry_after))
+
+    def _release(self, tenant: str):
+        with self._lock:
+            left = self._active.get(tenant, 0) - 1
+            if left > 0:
+                self._active[tenant] = left
+            else:
+                self._active.pop(tenant, None)
+
+    def active(self, tenant: str) -> int:
+        with self._lock:
+            return self._active.get(tenant, 0)
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    """Process-wide controller shared by every surface."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
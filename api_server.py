@@ -0,0 +1,561 @@
+"""
+api_server.py
+Headless HTTP API for the compliance pipeline.
+
+An asyncio server (standard library only) accepts requests from any number
+of clients; the blocking pipeline steps run on one shared pool of
+API_WORKERS threads, so a slow search never holds up other requests. Every
+route except /v1/health needs a per-client key, sent as
+"Authorization: Bearer KEY" or "X-API-Key: KEY". API_KEYS maps client names
+to keys ("crm:k1,billing:k2"), and clients only see their own jobs. Each
+client is an admission control tenant: when the shared quota is saturated
+new requests get 429 with Retry-After instead of a slow failure, and jobs
+report how many calls were queued ahead of them.
+
+Routes:
+    GET  /v1/health
+    POST /v1/validate   {"description"}                               -> {"valid", "error"}
+    POST /v1/interpret  {"description"}                               -> interpretation
+    POST /v1/refine     {"description", "interpretation", "answers"}  -> interpretation
+    POST /v1/search     {"interpretation"}                            -> {"regulations", "search_metadata"}
+    POST /v1/jobs       {"description", "answers"?, "interpretation"?, "priority"?}
+                                                                      -> 202 {"job_id", "status", "queue_position"}
+    GET  /v1/jobs/ID                                                  -> status, plus the result once done
+    GET  /v1/jobs/ID/regulations                                      -> event stream
+
+/v1/search and /v1/jobs/ID/regulations stream when the request sends
+"Accept: application/x-ndjson" (one JSON event per line) or
+"Accept: text/event-stream" (SSE): "status" heartbeats while the search
+runs, one "regulation" event per regulation, then "done" with the search
+metadata, or "error".
+
+Usage:
+    API_KEYS=crm:secret python api_server.py --port 8080
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+# Load .env before the pipeline modules (and this one) read their settings
+from clients import load_environment
+load_environment()
+
+from admission import PRIORITIES, Overloaded, Ticket, as_tenant, get_admission
+from batch import _default_search, process_item
+from metrics import API_REQUESTS
+from security import SecurityValidator, log_security_event
+from tracing import span
+
+# Client keys as comma-separated "client:key" pairs
+API_KEYS = os.environ.get("API_KEYS", "")
+# Threads running pipeline steps for all clients
+API_WORKERS = int(os.environ.get("API_WORKERS", 8))
+# Largest request body accepted, in bytes
+API_MAX_BODY = int(os.environ.get("API_MAX_BODY", 65536))
+# Minutes a finished job's result can still be fetched
+API_JOB_TTL_MINUTES = float(os.environ.get("API_JOB_TTL_MINUTES", 60))
+# Seconds between status events while a streamed search runs
+API_HEARTBEAT_SECONDS = float(os.environ.get("API_HEARTBEAT_SECONDS", 15))
+
+# Seconds an idle keep-alive connection stays open
+IDLE_TIMEOUT = 30
+
+STATUS_TEXT = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 422: "Unprocessable Entity", 429: "Too Many Requests",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 502: "Bad Gateway",
+}
+
+STREAM_TYPES = ("application/x-ndjson", "text/event-stream")
+
+# (method, path pattern, handler name); groups in the pattern are handler arguments
+ROUTES = [
+    ("GET", re.compile(r"/v1/health"), "health"),
+    ("POST", re.compile(r"/v1/validate"), "validate"),
+    ("POST", re.compile(r"/v1/interpret"), "interpret"),
+    ("POST", re.compile(r"/v1/refine"), "refine"),
+    ("POST", re.compile(r"/v1/search"), "search"),
+    ("POST", re.compile(r"/v1/jobs"), "submit_job"),
+    ("GET", re.compile(r"/v1/jobs/([0-9a-f]{32})"), "job"),
+    ("GET", re.compile(r"/v1/jobs/([0-9a-f]{32})/regulations"), "job_regulations"),
+]
+
+
+def parse_keys(spec: str) -> Dict[str, str]:
+    """{key: client} from "client:key,client:key"."""
+    keys = {}
+    for pair in spec.split(","):
+        client, sep, key = pair.partition(":")
+        if sep and client.strip() and key.strip():
+            keys[key.strip()] = client.strip()
+    return keys
+
+
+class ApiError(Exception):
+    """Ends a request with an error status and {"error": message}."""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _interpret(description):
+    from interpretation import interpret_business_context
+    return interpret_business_context(description)
+
+
+def _refine(description, interpretation, answers):
+    from interpretation import refine_interpretation_with_answers
+    return refine_interpretation_with_answers(description, interpretation, answers)
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+class Request:
+    __slots__ = ('method', 'path', 'headers', 'body')
+
+    def __init__(self, method: str, path: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+    def stream_type(self) -> Optional[str]:
+        accept = self.headers.get("accept", "")
+        return next((kind for kind in STREAM_TYPES if kind in accept), None)
+
+    def json(self) -> Dict:
+        try:
+            body = json.loads(self.body or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ApiError(400, "Body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        return body
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    try:
+        return await reader.readline()
+    except ValueError:
+        # A line longer than the stream limit (LimitOverrunError surfaces as ValueError)
+        raise ApiError(431, "Request line or header too long")
+
+
+async def read_request(reader: asyncio.StreamReader, max_body: int) -> Optional[Request]:
+    """The next HTTP/1.1 request on the connection, or None once it closes."""
+    line = await _read_line(reader)
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise ApiError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await _read_line(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise ApiError(400, "Malformed Content-Length")
+    if length > max_body:
+        raise ApiError(413, f"Body larger than {max_body} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target.split("?", 1)[0].rstrip("/"), headers, body)
+
+
+def _head(status: int, content_type: str, extra: str) -> bytes:
+    return (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n{extra}\r\n").encode("latin-1")
+
+
+# ============================================================================
+# JOBS
+# ============================================================================
+
+class Job:
+    """One queued pipeline run, visible only to the client that submitted it."""
+
+    __slots__ = ('id', 'client', 'created_at', 'finished_at', 'future')
+
+    def __init__(self, job_id: str, client: str, future: Future):
+        self.id = job_id
+        self.client = client
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.future = future
+        future.add_done_callback(self._finished)
+
+    def _finished(self, future):
+        self.finished_at = time.time()
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        if self.future.exception() is not None:
+            return "error"
+        return self.future.result()["status"]
+
+    def to_dict(self) -> Dict:
+        job = {"job_id": self.id, "status": self.status, "created_at": self.created_at}
+        if self.future.done():
+            if self.future.exception() is not None:
+                job["error"] = str(self.future.exception())
+            else:
+                result = self.future.result()
+                job.update({k: v for k, v in result.items() if k not in ("id", "description", "status")})
+        return job
+
+
+# ============================================================================
+# SERVER
+# ============================================================================
+
+class APIServer:
+    """Routes API requests onto a shared worker pool."""
+
+    def __init__(self, keys: Optional[Dict[str, str]] = None, host: str = "127.0.0.1", port: int = 0,
+                 workers: int = API_WORKERS, interpret_fn: Callable = _interpret,
+                 refine_fn: Callable = _refine, search_fn: Callable = _default_search,
+                 job_ttl_minutes: float = API_JOB_TTL_MINUTES, heartbeat: float = API_HEARTBEAT_SECONDS,
+                 max_body: int = API_MAX_BODY, admission=None):
+        self.keys = parse_keys(API_KEYS) if keys is None else keys
+        if not self.keys:
+            raise ValueError("No API keys configured; set API_KEYS=client:key,...")
+        self.host = host
+        self.port = port
+        self.url = ""
+        self.interpret_fn = interpret_fn
+        self.refine_fn = refine_fn
+        self.search_fn = search_fn
+        self.job_ttl = job_ttl_minutes * 60
+        self.heartbeat = heartbeat
+        self.max_body = max_body
+        self.admission = admission or get_admission()
+        self._security = SecurityValidator()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="api")
+        self._jobs: Dict[str, Job] = {}
+        self._jobs_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread = None
+
+    def start(self) -> "APIServer":
+        """Serve in a background thread; returns once the port is bound."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            server = self._loop.run_until_complete(
+                asyncio.start_server(self._serve_connection, self.host, self.port))
+            self.port = server.sockets[0].getsockname()[1]
+            self.url = f"http://{self.host}:{self.port}"
+            ready.set()
+            try:
+                self._loop.run_forever()
+            finally:
+                server.close()
+                tasks = asyncio.all_tasks(self._loop)
+                for task in tasks:
+                    task.cancel()
+                self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True, name="api-server")
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader, self.max_body), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except ApiError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None or not await self._respond(request, writer):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """Answer one request; False when the connection must close afterwards."""
+        name, status = "unknown", 500
+        try:
+            name, args = self._route(request)
+            client = self._authenticate(request) if name != "health" else ""
+            outcome = await getattr(self, f"_{name}")(client, request, *args)
+            if isinstance(outcome, tuple):
+                status, body = outcome
+                await self._send_json(writer, status, body, request.keep_alive)
+                return request.keep_alive
+            status = 200
+            await self._send_stream(writer, outcome, request.stream_type())
+            return False
+        except ApiError as e:
+            status = e.status
+            await self._send_json(writer, status, {"error": str(e)}, request.keep_alive, e.headers)
+            return request.keep_alive
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            log_security_event("API_ERROR", f"{request.method} {request.path}: {e}")
+            await self._send_json(writer, 500, {"error": "Internal error"}, False)
+            return False
+        finally:
+            API_REQUESTS.inc(route=name, status=str(status))
+
+    def _route(self, request: Request) -> Tuple[str, Tuple[str, ...]]:
+        allowed = False
+        for method, pattern, name in ROUTES:
+            match = pattern.fullmatch(request.path)
+            if match:
+                if method == request.method:
+                    return name, match.groups()
+                allowed = True
+        raise ApiError(405 if allowed else 404, "Method not allowed" if allowed else "Not found")
+
+    def _authenticate(self, request: Request) -> str:
+        key = request.headers.get("x-api-key", "")
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            key = authorization[7:].strip()
+        if key:
+            for known, client in self.keys.items():
+                if hmac.compare_digest(key.encode(), known.encode()):
+                    return client
+        log_security_event("API_AUTH_FAILED", f"{request.method} {request.path}")
+        raise ApiError(401, "Missing or unknown API key")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, body: Dict, keep_alive: bool,
+                         headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        extra = f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        extra += "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        writer.write(_head(status, "application/json", extra) + data)
+        await writer.drain()
+
+    async def _send_stream(self, writer: asyncio.StreamWriter, events: AsyncIterator[Dict], stream_type: str):
+        # Unframed body that ends when the connection closes
+        writer.write(_head(200, stream_type, "Cache-Control: no-cache\r\nConnection: close\r\n"))
+        await writer.drain()
+        async for event in events:
+            data = json.dumps(event, ensure_ascii=False)
+            if stream_type == "text/event-stream":
+                data = f"event: {event['type']}\ndata: {data}\n"
+            writer.write((data + "\n").encode("utf-8"))
+            await writer.drain()
+
+    # ------------------------------------------------------------------
+    # Pipeline
+    # ------------------------------------------------------------------
+
+    def _admit(self, client: str) -> Ticket:
+        try:
+            return self.admission.admit(client)
+        except Overloaded as e:
+            raise ApiError(429, str(e), {"Retry-After": str(int(e.retry_after))})
+
+    def _submit(self, ticket: Ticket, route: str, fn: Callable, *args, priority: str = "high") -> Future:
+        """Run fn on the shared pool as the ticket's tenant; the ticket is released when it finishes."""
+        client = ticket.tenant
+
+        def run():
+            from search_module import quiet_output
+            with quiet_output(), as_tenant(client, priority), \
+                    span("compliance_request", {"surface": "api", "client": client, "route": route}, new_trace=True):
+                return fn(*args)
+        future = self._pool.submit(run)
+        future.add_done_callback(lambda _: ticket.release())
+        return future
+
+    async def _call(self, client: str, route: str, fn: Callable, *args):
+        try:
+            return await asyncio.wrap_future(self._submit(self._admit(client), route, fn, *args))
+        except Exception as e:
+            log_security_event("API_ERROR", f"{route} for {client}: {e}")
+            raise ApiError(502, f"{route} failed: {e}")
+
+    def _description(self, body: Dict) -> str:
+        description = body.get("description")
+        if not isinstance(description, str):
+            raise ApiError(422, "description must be a string")
+        is_valid, error_msg = self._security.validate_business_description(description)
+        if not is_valid:
+            raise ApiError(422, error_msg)
+        return self._security.sanitize_input(description)
+
+    def _interpretation(self, value, status: int = 422) -> Dict:
+        if not isinstance(value, dict) or not all(
+                isinstance(value.get(field), list) for field in ("regulation_types", "suggested_countries")):
+            raise ApiError(status, "interpretation must be an object with regulation_types and suggested_countries")
+        is_valid, error_msg = self._security.validate_interpretation(value)
+        if not is_valid:
+            raise ApiError(status, error_msg)
+        return value
+
+    def _answers(self, value) -> Dict[str, str]:
+        if not isinstance(value, dict):
+            raise ApiError(422, "answers must be an object of question: answer")
+        answers = {}
+        for question, answer in value.items():
+            answer = str(answer).strip()
+            is_valid, error_msg = self._security.validate_answer(answer)
+            if not is_valid:
+                raise ApiError(422, f"{question}: {error_msg}")
+            answers[str(question)] = self._security.sanitize_input(answer)
+        return answers
+
+    async def _events(self, future: Future) -> AsyncIterator[Dict]:
+        """Heartbeats until the future is done, then its regulations and a closing event."""
+        waiting = asyncio.wrap_future(future)
+        while not (await asyncio.wait({waiting}, timeout=self.heartbeat))[0]:
+            yield {"type": "status", "status": "running" if future.running() else "queued"}
+        try:
+            result = waiting.result()
+        except Exception as e:
+            yield {"type": "error", "error": str(e)}
+            return
+        if result.get("status") in ("rejected", "error"):
+            yield {"type": "error", "status": result["status"], "error": result.get("error", "")}
+            return
+        for regulation in result.get("regulations", []):
+            yield {"type": "regulation", "regulation": regulation}
+        yield {"type": "done", "search_metadata": result.get("search_metadata", {})}
+
+    # ------------------------------------------------------------------
+    # Routes
+    # ------------------------------------------------------------------
+
+    async def _health(self, client, request):
+        return 200, {"status": "ok", "jobs": len(self._jobs)}
+
+    async def _validate(self, client, request):
+        body = request.json()
+        if not isinstance(body.get("description"), str):
+            raise ApiError(422, "description must be a string")
+        is_valid, error_msg = self._security.validate_business_description(body["description"])
+        return 200, {"valid": is_valid, "error": error_msg or None}
+
+    async def _interpret(self, client, request):
+        description = self._description(request.json())
+        interpretation = await self._call(client, "interpret", self.interpret_fn, description)
+        return 200, self._interpretation(interpretation, status=502)
+
+    async def _refine(self, client, request):
+        body = request.json()
+        description = self._description(body)
+        interpretation = self._interpretation(body.get("interpretation"))
+        answers = self._answers(body.get("answers", {}))
+        refined = await self._call(client, "refine", self.refine_fn, description, interpretation, answers)
+        return 200, self._interpretation(refined, status=502)
+
+    async def _search(self, client, request):
+        interpretation = self._interpretation(request.json().get("interpretation"))
+        if request.stream_type():
+            return self._events(self._submit(self._admit(client), "search", self.search_fn, interpretation))
+        result = await self._call(client, "search", self.search_fn, interpretation)
+        return 200, {"regulations": result.get("regulations", []),
+                     "search_metadata": result.get("search_metadata", {})}
+
+    async def _submit_job(self, client, request):
+        body = request.json()
+        item = {"description": body.get("description"), "answers": body.get("answers") or {}}
+        if not isinstance(item["description"], str) or not isinstance(item["answers"], dict):
+            raise ApiError(422, "description must be a string and answers an object")
+        given = body.get("interpretation")
+        if given is not None:
+            given = self._interpretation(given)
+        priority = body.get("priority", "normal")
+        if priority not in PRIORITIES:
+            raise ApiError(422, f"priority must be one of {', '.join(PRIORITIES)}")
+
+        def interpret(description, answers):
+            interpretation = given or self.interpret_fn(description)
+            if answers:
+                interpretation = self.refine_fn(description, interpretation, answers)
+            return interpretation
+
+        ticket = self._admit(client)
+        item["id"] = uuid.uuid4().hex
+        job = Job(item["id"], client, self._submit(ticket, "job", process_item, item, interpret, self.search_fn,
+                                                   priority=priority))
+        with self._jobs_lock:
+            self._purge_jobs()
+            self._jobs[job.id] = job
+        return 202, {"job_id": job.id, "status": job.status, "queue_position": ticket.position}
+
+    def _purge_jobs(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _job_for(self, client: str, job_id: str) -> Job:
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.client != client:
+            raise ApiError(404, "No such job")
+        return job
+
+    async def _job(self, client, request, job_id):
+        return 200, self._job_for(client, job_id).to_dict()
+
+    async def _job_regulations(self, client, request, job_id):
+        job = self._job_for(client, job_id)
+        if not request.stream_type():
+            raise ApiError(400, f"Send Accept: {' or '.join(STREAM_TYPES)}")
+        return self._events(job.future)
+
+
+if __name__ == "__main__":
+    from metrics import start_metrics_server
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="Shared pipeline worker threads")
+    args = parser.parse_args()
+    start_metrics_server()
+    server = APIServer(host=args.host, port=args.port, workers=args.workers).start()
+    print(f"🌐 Compliance API on {server.url} ({len(server.keys)} clients, {args.workers} workers)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+        print("\n👋 API stopped")
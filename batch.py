@@ -0,0 +1,264 @@
+"""
+batch.py
+Non-interactive screening of many businesses with bounded concurrency.
+
+Input is JSONL or CSV, one business per line/row:
+    {"id": "acme", "description": "...", "answers": {"question": "answer"}}
+    id,description            (CSV; "answers" may hold a JSON object)
+
+Each result is appended to the output JSONL as soon as it finishes, and its
+id is recorded in a checkpoint file. Re-running the same command skips every
+id in the checkpoint, so an interrupted run resumes without repeating paid
+work. Items that fail with an error are written but not checkpointed, so the
+next run retries them; the last line per id is the current result.
+
+Usage:
+    python main.py --batch businesses.jsonl --output results.jsonl --concurrency 4
+"""
+
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from admission import as_tenant
+from security import SecurityValidator, log_security_event
+from tracing import span
+
+# Businesses screened at the same time
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))
+
+
+# ============================================================================
+# INPUT
+# ============================================================================
+
+def item_id(item: Dict) -> str:
+    """Explicit id, or one derived from the description."""
+    if item.get("id"):
+        return str(item["id"])
+    digest = hashlib.sha1(item.get("description", "").strip().encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+def _parse_answers(value) -> Dict:
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value.strip():
+        try:
+            parsed = json.loads(value)
+        except json.JSONDecodeError:
+            return {}
+        return parsed if isinstance(parsed, dict) else {}
+    return {}
+
+
+def read_items(path: str) -> Iterator[Dict]:
+    """Yield {id, description, answers} from a .jsonl or .csv file."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            item = {
+                "description": (row.get("description") or "").strip(),
+                "answers": _parse_answers(row.get("answers")),
+            }
+            item["id"] = item_id(dict(item, id=row.get("id")))
+            yield item
+
+
+# ============================================================================
+# CHECKPOINT AND OUTPUT
+# ============================================================================
+
+class Checkpoint:
+    """Append-only list of finished ids, one per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self.done
+
+    def mark(self, id_: str):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(id_ + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.add(id_)
+
+
+class ResultWriter:
+    """Appends one JSON line per result, flushed before it is checkpointed."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, result: Dict):
+        line = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def _default_interpret(description, answers):
+    from interpretation import interpret_business_context, refine_interpretation_with_answers
+    interpretation = interpret_business_context(description)
+    if answers:
+        interpretation = refine_interpretation_with_answers(description, interpretation, answers)
+    return interpretation
+
+
+def _default_search(interpretation):
+    from search_module import search_regulations_with_function_calling
+    return search_regulations_with_function_calling(
+        detected_domain=interpretation['detected_domain'],
+        regulation_types=interpretation['regulation_types'],
+        countries=interpretation['suggested_countries'],
+    )
+
+
+def process_item(item: Dict, interpret_fn: Callable = _default_interpret,
+                 search_fn: Callable = _default_search) -> Dict:
+    """
+    Validate, interpret and search one business.
+
+    Returns:
+        {"id", "status", ...} where status is "ok", "rejected" (input or
+        interpretation failed validation) or "error" (exception, retried on resume)
+    """
+    security = SecurityValidator()
+    start = time.perf_counter()
+    result = {"id": item["id"], "description": item["description"]}
+
+    is_valid, error_msg = security.validate_business_description(item["description"])
+    if not is_valid:
+        log_security_event("INVALID_INPUT", f"Batch item {item['id']} rejected: {error_msg[:100]}")
+        return dict(result, status="rejected", error=error_msg)
+    description = security.sanitize_input(item["description"])
+
+    answers = {}
+    for question, answer in item.get("answers", {}).items():
+        answer = str(answer).strip()
+        if answer and security.validate_answer(answer)[0]:
+            answers[question] = security.sanitize_input(answer)
+
+    try:
+        interpretation = interpret_fn(description, answers)
+        is_valid, error_msg = security.validate_interpretation(interpretation)
+        if not is_valid:
+            log_security_event("INVALID_INTERPRETATION", f"Batch item {item['id']}: {error_msg}")
+            return dict(result, status="rejected", error=error_msg)
+
+        regulations = search_fn(interpretation)
+    except Exception as e:
+        log_security_event("BATCH_ERROR", f"Batch item {item['id']}: {e}")
+        return dict(result, status="error", error=str(e), elapsed=round(time.perf_counter() - start, 2))
+
+    meta = regulations.get('search_metadata', {})
+    status = "error" if 'error' in meta else "ok"
+    return dict(
+        result,
+        status=status,
+        interpretation=interpretation,
+        regulations=regulations.get('regulations', []),
+        search_metadata=meta,
+        elapsed=round(time.perf_counter() - start, 2),
+    )
+
+
+def run_batch(input_path: str, output_path: str, concurrency: int = BATCH_CONCURRENCY,
+              checkpoint_path: Optional[str] = None, process: Callable[[Dict], Dict] = process_item) -> Dict:
+    """
+    Screen every pending item in input_path, at most `concurrency` at a time.
+
+    Returns:
+        Counts per status for this run plus the number of skipped items
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from search_module import quiet_output
+
+    checkpoint = Checkpoint(checkpoint_path or output_path + ".checkpoint")
+    items: List[Dict] = []
+    seen: Set[str] = set()
+    skipped = 0
+    for item in read_items(input_path):
+        if item["id"] in checkpoint or item["id"] in seen:
+            skipped += 1
+            continue
+        seen.add(item["id"])
+        items.append(item)
+
+    print(f"📦 {len(items)} to screen, {skipped} already done (concurrency {concurrency})")
+    counts = {"ok": 0, "rejected": 0, "error": 0, "skipped": skipped}
+    if not items:
+        return counts
+
+    def run_quietly(item):
+        # Worker threads do not inherit the caller's context; silence search progress here
+        # and queue behind interactive users
+        with quiet_output(), as_tenant("batch", "low"), \
+                span("compliance_request", {"batch_item": item["id"]}, new_trace=True) as request:
+            result = process(item)
+            request.set("status", result["status"])
+            return result
+
+    writer = ResultWriter(output_path)
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+    futures = {pool.submit(run_quietly, item): item for item in items}
+    recorded = set()
+
+    def record(future):
+        item = futures[future]
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"id": item["id"], "description": item["description"], "status": "error", "error": str(e)}
+        recorded.add(future)
+        writer.write(result)
+        if result["status"] != "error":
+            checkpoint.mark(item["id"])
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        icon = {"ok": "✓", "rejected": "⚠️ ", "error": "✗"}.get(result["status"], "•")
+        print(f"  {icon} [{len(recorded)}/{len(items)}] {item['id']}: {result['status']}")
+
+    try:
+        try:
+            for future in as_completed(futures):
+                record(future)
+        except KeyboardInterrupt:
+            # Queued items are left for the next run; running ones are already paid for, so keep their results
+            running = [f for f in futures if f not in recorded and not f.cancel()]
+            print(f"⏹️  Interrupted: finishing {len(running)} running item(s), "
+                  f"{len(items) - len(recorded) - len(running)} left for the next run")
+            for future in as_completed(running):
+                if future not in recorded:
+                    record(future)
+            raise
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        writer.close()
+
+    print(f"✓ Batch complete: {counts['ok']} ok, {counts['rejected']} rejected, "
+          f"{counts['error']} errors, {skipped} skipped")
+    return counts
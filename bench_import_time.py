@@ -0,0 +1,143 @@
+"""
+bench_import_time.py
+Import-time benchmark for the pipeline modules (python -X importtime).
+
+Usage:
+    python bench_import_time.py
+    python bench_import_time.py --repeat 7 --output import_times.json
+    python bench_import_time.py --baseline import_times.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+DEFAULT_MODULES = [
+    "security",
+    "records",
+    "session_store",
+    "clients",
+    "search_module",
+    "prefetch",
+    "main",
+]
+
+# Flag modules whose import got this much slower than the baseline
+REGRESSION_THRESHOLD = 0.20
+# ...ignoring sub-millisecond noise
+REGRESSION_MIN_MS = 2.0
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Parse `-X importtime` lines into {name, depth, self_us, cumulative_us}."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_part, cumulative_part, raw_name = line.split(":", 1)[1].split("|", 2)
+            self_us, cumulative_us = int(self_part), int(cumulative_part)
+        except ValueError:
+            continue
+        # Nesting is shown as two extra spaces per level after "| "
+        depth = (len(raw_name) - len(raw_name.lstrip(" ")) - 1) // 2
+        entries.append({
+            "name": raw_name.strip(),
+            "depth": depth,
+            "self_us": self_us,
+            "cumulative_us": cumulative_us,
+        })
+    return entries
+
+
+def measure_module(module: str, repeat: int) -> Dict:
+    """Import a module in fresh interpreters and report median timings."""
+    cumulative, own, heaviest = [], [], {}
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, env=env,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if proc.returncode != 0:
+            return {"module": module, "error": proc.stderr.strip().splitlines()[-1]}
+
+        entries = parse_importtime(proc.stderr)
+        index = next((i for i, e in enumerate(entries) if e["name"] == module and e["depth"] == 0), None)
+        if index is None:
+            continue
+        cumulative.append(entries[index]["cumulative_us"])
+        own.append(entries[index]["self_us"])
+
+        # Children are listed before their parent; walk back to the previous top-level import
+        for entry in reversed(entries[:index]):
+            if entry["depth"] == 0:
+                break
+            if entry["depth"] == 1:
+                heaviest.setdefault(entry["name"], []).append(entry["cumulative_us"])
+
+    top = sorted(
+        ((name, statistics.median(values)) for name, values in heaviest.items()),
+        key=lambda item: item[1], reverse=True,
+    )[:5]
+    return {
+        "module": module,
+        "cumulative_ms": round(statistics.median(cumulative) / 1000, 2) if cumulative else None,
+        "self_ms": round(statistics.median(own) / 1000, 2) if own else None,
+        "heaviest_imports": [{"name": n, "cumulative_ms": round(v / 1000, 2)} for n, v in top],
+    }
+
+
+def compare(results: List[Dict], baseline: List[Dict]) -> List[str]:
+    previous = {r["module"]: r.get("cumulative_ms") for r in baseline}
+    regressions = []
+    for result in results:
+        before, after = previous.get(result["module"]), result.get("cumulative_ms")
+        if before and after and after - before > REGRESSION_MIN_MS and (after - before) / before > REGRESSION_THRESHOLD:
+            regressions.append(f"{result['module']}: {before:.1f} ms → {after:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time per module")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare against a previous JSON result")
+    args = parser.parse_args()
+
+    results = [measure_module(m, args.repeat) for m in args.modules]
+
+    print("\n" + "="*70)
+    print("⏱️  IMPORT TIME (median of {} runs)".format(args.repeat))
+    print("="*70)
+    for result in results:
+        if "error" in result:
+            print(f"  {result['module']:20s} │ ERROR: {result['error']}")
+            continue
+        heaviest = ", ".join(f"{h['name']} {h['cumulative_ms']:.1f}" for h in result["heaviest_imports"][:3])
+        print(f"  {result['module']:20s} │ {result['cumulative_ms']:8.1f} ms │ {heaviest}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print("\n⚠️  Import time regressions:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("\n✓ No import time regressions")
+
+
+if __name__ == "__main__":
+    main()
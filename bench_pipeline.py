@@ -0,0 +1,229 @@
+"""
+bench_pipeline.py
+End-to-end latency benchmark of validate → interpret → refine → search.
+
+Runs the real pipeline modules against mock_api_server.py (started in-process
+unless --mock-url is given) at several concurrency levels and reports
+p50/p95/p99 per stage and for the whole request.
+
+Usage:
+    python bench_pipeline.py
+    python bench_pipeline.py --concurrency 1 4 16 --requests 40 --output pipeline_baseline.json
+    python bench_pipeline.py --baseline pipeline_baseline.json --failure-rate 0.05
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+from mock_api_server import MockAPIServer, add_mock_arguments, config_from_args
+
+DESCRIPTIONS = [
+    "We build expense management software for B2B clients in Germany and France.",
+    "Food delivery app connecting restaurants and couriers in Spain and Italy.",
+    "Payroll SaaS for small companies in the Netherlands and Belgium.",
+    "Telehealth platform storing patient records for clinics in Sweden.",
+    "Online marketplace for second-hand electronics across the EU.",
+]
+
+STAGES = ("validate", "interpret", "refine", "search", "total")
+
+# Flag stages whose p95 got this much slower than the baseline
+REGRESSION_THRESHOLD = 0.20
+# ...ignoring differences below this many milliseconds
+REGRESSION_MIN_MS = 50.0
+
+
+def configure_environment(mock_url: str):
+    """Point the pipeline at the mock server and switch off every local shortcut."""
+    os.environ.update({
+        "OPENAI_API_KEY": "mock-key",
+        "OPENAI_BASE_URL": f"{mock_url}/v1",
+        "GOOGLE_API_KEY": "mock-key",
+        "GOOGLE_CSE_ID": "mock-cse",
+        "GOOGLE_SEARCH_ENDPOINT": mock_url,
+        # Each request must do the full work, not reuse earlier results
+        "KNOWLEDGE_BASE_MODE": "off",
+        "SNIPPET_INDEX": "0",
+        "SOURCE_FETCH": "0",
+        "CASSETTE_MODE": "off",
+    })
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(samples: List[float]) -> Dict:
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+        "mean_ms": round(statistics.mean(ms), 1) if ms else 0.0,
+    }
+
+
+def run_flow(description: str) -> Dict[str, float]:
+    """One request through the same steps as main.py, timed per stage."""
+    from interpretation import interpret_business_context, refine_interpretation_with_answers
+    from search_module import quiet_output, search_regulations_with_function_calling
+    from security import SecurityValidator
+
+    timings = {}
+    start = time.perf_counter()
+    with quiet_output():
+        security = SecurityValidator()
+        is_valid, error_msg = security.validate_business_description(description)
+        if not is_valid:
+            raise ValueError(error_msg)
+        description = security.sanitize_input(description)
+        timings["validate"] = time.perf_counter() - start
+
+        mark = time.perf_counter()
+        interpretation = interpret_business_context(description)
+        timings["interpret"] = time.perf_counter() - mark
+
+        questions = interpretation.get('clarifying_questions') or []
+        if questions:
+            mark = time.perf_counter()
+            answers = {q: "Yes, for clients in the EU." for q in questions}
+            interpretation = refine_interpretation_with_answers(description, interpretation, answers)
+            timings["refine"] = time.perf_counter() - mark
+
+        mark = time.perf_counter()
+        regulations = search_regulations_with_function_calling(
+            detected_domain=interpretation['detected_domain'],
+            regulation_types=interpretation['regulation_types'],
+            countries=interpretation['suggested_countries'],
+        )
+        timings["search"] = time.perf_counter() - mark
+
+    error = regulations.get('search_metadata', {}).get('error')
+    if error:
+        raise RuntimeError(error)
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+
+def run_level(concurrency: int, requests: int) -> Dict:
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    samples = {stage: [] for stage in STAGES}
+    errors: Dict[str, int] = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        futures = [pool.submit(run_flow, DESCRIPTIONS[i % len(DESCRIPTIONS)]) for i in range(requests)]
+        for future in as_completed(futures):
+            try:
+                timings = future.result()
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            for stage, seconds in timings.items():
+                samples[stage].append(seconds)
+    wall = time.perf_counter() - start
+    completed = len(samples["total"])
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "completed": completed,
+        "errors": errors,
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(completed / wall, 3) if wall else 0.0,
+        "stages": {stage: summarize(values) for stage, values in samples.items() if values},
+    }
+
+
+def compare(runs: List[Dict], baseline: Dict) -> List[str]:
+    previous = {run["concurrency"]: run for run in baseline.get("runs", [])}
+    regressions = []
+    for run in runs:
+        before_run = previous.get(run["concurrency"])
+        if before_run is None:
+            continue
+        for stage, stats in run["stages"].items():
+            before = before_run["stages"].get(stage, {}).get("p95_ms")
+            after = stats["p95_ms"]
+            if before and after - before > REGRESSION_MIN_MS and (after - before) / before > REGRESSION_THRESHOLD:
+                regressions.append(f"c={run['concurrency']} {stage} p95: {before:.0f} ms → {after:.0f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a mock API")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=20, help="Requests per concurrency level")
+    parser.add_argument("--mock-url", help="Use an already running mock_api_server.py")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare p95 per stage against a previous JSON result")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    if args.mock_url:
+        mock_url = args.mock_url.rstrip("/")
+    else:
+        server = MockAPIServer(config_from_args(args)).start()
+        mock_url = server.url
+    configure_environment(mock_url)
+
+    try:
+        runs = [run_level(c, args.requests) for c in args.concurrency]
+    finally:
+        if server is not None:
+            server.stop()
+
+    print("\n" + "="*70)
+    print("⏱️  PIPELINE LATENCY (mock API)")
+    print("="*70)
+    for run in runs:
+        errors = sum(run["errors"].values())
+        print(f"\nConcurrency {run['concurrency']} │ {run['completed']}/{run['requests']} ok │ "
+              f"{errors} errors │ {run['throughput_rps']:.2f} req/s")
+        for stage in STAGES:
+            stats = run["stages"].get(stage)
+            if stats:
+                print(f"  {stage:10s} │ p50 {stats['p50_ms']:8.0f} ms │ p95 {stats['p95_ms']:8.0f} ms │ "
+                      f"p99 {stats['p99_ms']:8.0f} ms")
+
+    result = {
+        "config": {
+            "requests": args.requests,
+            "chat_latency": args.chat_latency,
+            "search_latency": args.search_latency,
+            "failure_rate": args.failure_rate,
+            "mock_url": args.mock_url,
+        },
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(runs, json.load(f))
+        if regressions:
+            print("\n⚠️  Latency regressions:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("\n✓ No latency regressions")
+
+
+if __name__ == "__main__":
+    main()
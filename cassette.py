@@ -0,0 +1,203 @@
+"""
+cassette.py
+Record and replay of chat completions and search_web_tool calls.
+
+    CASSETTE_MODE=record CASSETTE_PATH=slow_search.jsonl python main.py
+    CASSETTE_MODE=replay CASSETTE_PATH=slow_search.jsonl python main.py
+
+Recording writes one JSON line per interaction with its request, response
+and latency. Replay serves responses by request key, falling back to the
+next unused interaction of the same kind (prompts embed today's date, so
+keys drift between days), and sleeps for the recorded latency times
+CASSETTE_LATENCY_SCALE. Nothing reaches the network during replay; source
+page fetching is switched off so runs stay deterministic.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+# "record", "replay" or "off"
+CASSETTE_MODE = os.environ.get("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.environ.get("CASSETTE_PATH", "cassette.jsonl")
+# Replay sleeps recorded latency times this (0 = no delay, 1 = original timing)
+CASSETTE_LATENCY_SCALE = float(os.environ.get("CASSETTE_LATENCY_SCALE", 1.0))
+# Set CASSETTE_STRICT=1 to fail on any request that was not recorded exactly
+CASSETTE_STRICT = os.environ.get("CASSETTE_STRICT", "0") == "1"
+
+# Request fields that identify a chat completion (timeouts are excluded)
+CHAT_KEY_FIELDS = ("model", "messages", "tools", "tool_choice", "response_format", "temperature")
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded interaction for a request."""
+
+
+def to_jsonable(value):
+    """Plain JSON data from SDK models, namespaces and containers."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {k: to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if hasattr(value, "__dict__"):
+        return {k: to_jsonable(v) for k, v in vars(value).items() if not k.startswith("_")}
+    return value
+
+
+def request_key(kind: str, request: Dict) -> str:
+    canonical = json.dumps(to_jsonable(request), sort_keys=True, ensure_ascii=False, default=str)
+    return f"{kind}:{hashlib.sha1(canonical.encode('utf-8')).hexdigest()}"
+
+
+def _chat_request(kwargs: Dict) -> Dict:
+    return {field: kwargs[field] for field in CHAT_KEY_FIELDS if field in kwargs}
+
+
+def _load_chat_completion(data: Dict):
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate(data)
+
+
+class Cassette:
+    """One JSONL file of recorded interactions, in record or replay mode."""
+
+    def __init__(self, path: str, mode: str, latency_scale: float = CASSETTE_LATENCY_SCALE,
+                 strict: bool = CASSETTE_STRICT, sleep=time.sleep):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.misses = 0
+        self.key_mismatches = 0
+        self._by_key: Dict[str, deque] = {}
+        self._by_kind: Dict[str, deque] = {}
+        self._used = set()
+        self._file = None
+
+        if mode == "record":
+            # A recording always starts a fresh cassette
+            self._file = open(path, "w", encoding="utf-8")
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                for number, line in enumerate(f):
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    entry["_n"] = number
+                    self._by_key.setdefault(entry["key"], deque()).append(entry)
+                    self._by_kind.setdefault(entry["kind"], deque()).append(entry)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def _record(self, kind: str, request: Dict, call: Callable[[], object],
+                dump: Callable[[object], Dict] = to_jsonable):
+        start = time.perf_counter()
+        error = None
+        try:
+            response = call()
+        except Exception as e:
+            error = e
+        entry = {
+            "kind": kind,
+            "key": request_key(kind, request),
+            "request": to_jsonable(request),
+            "latency": round(time.perf_counter() - start, 4),
+        }
+        if error is not None:
+            entry["error"] = {"type": type(error).__name__, "message": str(error)}
+        else:
+            entry["response"] = dump(response)
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+        if error is not None:
+            raise error
+        return response
+
+    # ------------------------------------------------------------------
+    # Replay
+    # ------------------------------------------------------------------
+
+    def _next(self, kind: str, key: str) -> Dict:
+        with self._lock:
+            for entry in self._by_key.get(key, ()):
+                if entry["_n"] not in self._used:
+                    self._used.add(entry["_n"])
+                    return entry
+            if not self.strict:
+                for entry in self._by_kind.get(kind, ()):
+                    if entry["_n"] not in self._used:
+                        self._used.add(entry["_n"])
+                        self.key_mismatches += 1
+                        return entry
+            self.misses += 1
+        raise CassetteMiss(f"No recorded {kind} interaction left for {key} in {self.path}")
+
+    def _replay(self, kind: str, request: Dict, load: Callable[[Dict], object] = lambda data: data):
+        entry = self._next(kind, request_key(kind, request))
+        if self.latency_scale > 0:
+            self._sleep(entry["latency"] * self.latency_scale)
+        if "error" in entry:
+            raise RuntimeError(f"Recorded {entry['error']['type']}: {entry['error']['message']}")
+        return load(entry["response"])
+
+    # ------------------------------------------------------------------
+    # Interactions
+    # ------------------------------------------------------------------
+
+    def chat(self, kwargs: Dict, call: Callable[[], object]):
+        """A chat completion: recorded around call(), or served from the cassette."""
+        request = _chat_request(kwargs)
+        if self.mode == "record":
+            return self._record("chat", request, call, dump=lambda r: r.model_dump())
+        return self._replay("chat", request, load=_load_chat_completion)
+
+    def search(self, query: str, num_results: int, call: Callable[[], Dict]) -> Dict:
+        """A search_web_tool result: recorded around call(), or served from the cassette."""
+        request = {"query": query, "num_results": num_results}
+        if self.mode == "record":
+            return self._record("search", request, call)
+        return self._replay("search", request)
+
+    def unused(self) -> List[Dict]:
+        """Recorded interactions replay never asked for."""
+        with self._lock:
+            return [entry for entries in self._by_kind.values() for entry in entries
+                    if entry["_n"] not in self._used]
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Process-wide cassette, or None when CASSETTE_MODE is off."""
+    global _cassette
+    if CASSETTE_MODE == "off":
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE)
+        return _cassette
+
+
+def replaying() -> bool:
+    return CASSETTE_MODE == "replay"
@@ -0,0 +1,103 @@
+"""
+circuit_breaker.py
+Per-backend circuit breakers, so an outage fails fast instead of being retried.
+
+A breaker opens after BREAKER_FAILURES consecutive failures and rejects
+calls for BREAKER_COOLDOWN_SECONDS. Then one probe call is let through
+(half-open): its success closes the circuit, its failure opens it for
+another cool-down. Only outages count as failures (5xx, timeouts,
+connection errors); rate limits and bad requests say the backend is up.
+
+While the Google breaker is open, search_web_tool serves earlier results
+from the snippet index, marked stale, and searches those queries again in
+the background once Google answers. An open OpenAI breaker makes the
+gateway raise CircuitOpenError at once.
+"""
+
+import os
+import threading
+import time
+from typing import Dict
+
+from metrics import BREAKER_TRANSITIONS
+
+# Consecutive failures that open a circuit
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", 5))
+# Seconds an open circuit rejects calls before letting a probe through
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get("BREAKER_COOLDOWN_SECONDS", 30))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """The backend's circuit is open; the call was not made."""
+
+
+class CircuitBreaker:
+    """Closed, open or half-open state for one backend."""
+
+    __slots__ = ('name', 'failure_threshold', 'cooldown', 'state', 'failures', 'opened_at',
+                 'probe_started', '_clock', '_lock')
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES,
+                 cooldown: float = BREAKER_COOLDOWN_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go to the backend now (claims the probe when half-open)."""
+        now = self._clock()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if now - self.opened_at < self.cooldown:
+                    return False
+                self._move(HALF_OPEN)
+                self.probe_started = now
+                return True
+            # Half-open: one probe at a time, another if it never reported back
+            if now - self.probe_started >= self.cooldown:
+                self.probe_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                self._move(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = self._clock()
+                self._move(OPEN)
+
+    def _move(self, state: str):
+        self.state = state
+        BREAKER_TRANSITIONS.inc(backend=self.name, state=state)
+        if state != HALF_OPEN:
+            icon = "🔴" if state == OPEN else "🟢"
+            print(f"{icon} Circuit for {self.name} {state}")
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker for a backend ("google_search", "openai")."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
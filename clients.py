@@ -0,0 +1,83 @@
+"""
+clients.py
+Lazy accessors for environment, OpenAI client and Google search service.
+
+Nothing heavy is imported or created until a caller actually needs it,
+so importing the pipeline modules stays cheap. Their settings are read at
+import, so entry points call load_environment() before importing them.
+"""
+
+import os
+import threading
+
+_env_loaded = False
+_lock = threading.Lock()
+_openai_client = None
+_search_local = threading.local()
+
+
+def load_environment():
+    """Load .env once, on first use."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+
+def get_env(name, default=None):
+    load_environment()
+    return os.environ.get(name, default)
+
+
+def get_openai_client():
+    """
+    Shared OpenAI client over a keep-alive connection pool, created on first use.
+    Retries are left to llm_gateway so deadlines cover them.
+    """
+    global _openai_client
+    if _openai_client is None:
+        load_environment()
+        with _lock:
+            if _openai_client is None:
+                import httpx
+                from openai import OpenAI
+                # Keep-alive pool shared by every OpenAI call in the process
+                pool_connections = int(os.environ.get("OPENAI_POOL_CONNECTIONS", 20))
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=pool_connections,
+                        max_keepalive_connections=pool_connections,
+                    ),
+                )
+                _openai_client = OpenAI(
+                    api_key=os.environ.get("OPENAI_API_KEY"),
+                    http_client=http_client,
+                    max_retries=0,
+                )
+    return _openai_client
+
+
+def get_google_credentials():
+    """(api_key, cse_id) for Google Custom Search."""
+    return get_env("GOOGLE_API_KEY"), get_env("GOOGLE_CSE_ID")
+
+
+def get_search_service():
+    """
+    Google Custom Search service, built once per thread.
+    httplib2 connections are not thread-safe, so threads don't share one.
+    """
+    service = getattr(_search_local, "service", None)
+    if service is None:
+        from googleapiclient.discovery import build
+        api_key, _ = get_google_credentials()
+        # GOOGLE_SEARCH_ENDPOINT points searches at a stand-in server (see mock_api_server.py)
+        endpoint = get_env("GOOGLE_SEARCH_ENDPOINT")
+        service = build("customsearch", "v1", developerKey=api_key,
+                        client_options={"api_endpoint": endpoint} if endpoint else None)
+        _search_local.service = service
+    return service
@@ -0,0 +1,144 @@
+"""
+compare_models.py
+Side-by-side latency, cost and agreement of models on recorded inputs.
+
+Input is JSONL, one business per line:
+    {"description": "...", "answers": {"question": "answer"}}
+
+Usage:
+    python compare_models.py inputs.jsonl --models gpt-4o-mini gpt-4o
+    python compare_models.py inputs.jsonl --models gpt-4o-mini gpt-4o --reference gpt-4o --output comparison.json
+"""
+
+import argparse
+import json
+import statistics
+from typing import Dict, List
+
+# Load .env before the pipeline modules read their settings at import
+from clients import load_environment
+load_environment()
+
+from interpretation import interpret_business_context, refine_interpretation_with_answers
+from llm_gateway import get_gateway
+from model_router import estimate_cost
+from security import SecurityValidator
+
+
+def _overlap(a, b) -> float:
+    a = {str(v).strip().lower() for v in a or []}
+    b = {str(v).strip().lower() for v in b or []}
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def agreement(result: Dict, reference: Dict) -> float:
+    """Mean overlap of regulation types and countries with the reference model."""
+    if not result or not reference:
+        return 0.0
+    return (_overlap(result.get('regulation_types'), reference.get('regulation_types')) +
+            _overlap(result.get('suggested_countries'), reference.get('suggested_countries'))) / 2
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(round(q * (len(values) - 1))), len(values) - 1)]
+
+
+def run_stage(stage: str, model: str, call) -> Dict:
+    """Run one call with a forced model and collect its accounting."""
+    gateway = get_gateway()
+    validator = SecurityValidator()
+    try:
+        result = call(model)
+        is_valid, _ = validator.validate_interpretation(result)
+    except Exception as e:
+        result, is_valid = None, False
+        print(f"   ✗ {stage} on {model}: {e}")
+    record = gateway.records[-1]
+    return {
+        "result": result,
+        "valid": is_valid,
+        "latency": record.latency,
+        "tokens": record.prompt_tokens + record.completion_tokens,
+        "cost": estimate_cost(record.model, record.prompt_tokens, record.completion_tokens, record.cached_tokens),
+    }
+
+
+def compare(inputs: List[Dict], models: List[str], reference: str) -> Dict:
+    runs = {}   # (stage, model) -> list of run dicts
+    for i, item in enumerate(inputs, 1):
+        description = item["description"]
+        print(f"[{i}/{len(inputs)}] {description[:60]}")
+        interpretations = {}
+        for model in models:
+            run = run_stage("interpret", model, lambda m: interpret_business_context(description, model=m))
+            interpretations[model] = run["result"]
+            runs.setdefault(("interpret", model), []).append(run)
+        for model in models:
+            runs[("interpret", model)][-1]["agreement"] = agreement(interpretations[model], interpretations[reference])
+
+        answers = item.get("answers")
+        base = interpretations[reference]
+        if not answers or not base:
+            continue
+        refinements = {}
+        for model in models:
+            run = run_stage("refine", model, lambda m: refine_interpretation_with_answers(description, base, answers, model=m))
+            refinements[model] = run["result"]
+            runs.setdefault(("refine", model), []).append(run)
+        for model in models:
+            runs[("refine", model)][-1]["agreement"] = agreement(refinements[model], refinements[reference])
+
+    summary = {}
+    for (stage, model), items in runs.items():
+        latencies = [r["latency"] for r in items]
+        summary.setdefault(stage, {})[model] = {
+            "calls": len(items),
+            "valid_rate": sum(r["valid"] for r in items) / len(items),
+            "latency_p50": statistics.median(latencies),
+            "latency_p95": _percentile(latencies, 0.95),
+            "avg_tokens": statistics.mean(r["tokens"] for r in items),
+            "total_cost_usd": sum(r["cost"] for r in items),
+            "agreement_with_reference": statistics.mean(r.get("agreement", 0.0) for r in items),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare models per pipeline stage on recorded inputs")
+    parser.add_argument("inputs", help="JSONL file of recorded inputs")
+    parser.add_argument("--models", nargs="+", default=["gpt-4o-mini", "gpt-4o"])
+    parser.add_argument("--reference", help="Model whose output counts as ground truth (default: last model)")
+    parser.add_argument("--output", help="Write the summary as JSON")
+    args = parser.parse_args()
+
+    with open(args.inputs, "r", encoding="utf-8") as f:
+        inputs = [json.loads(line) for line in f if line.strip()]
+    reference = args.reference or args.models[-1]
+    if reference not in args.models:
+        args.models.append(reference)
+
+    summary = compare(inputs, args.models, reference)
+
+    print("\n" + "="*90)
+    print(f"📊 MODEL COMPARISON ({len(inputs)} inputs, reference: {reference})")
+    print("="*90)
+    print(f"  {'stage':10s} │ {'model':14s} │ {'valid':>6s} │ {'p50 s':>6s} │ {'p95 s':>6s} │ {'tokens':>7s} │ {'cost $':>8s} │ {'agree':>6s}")
+    for stage, by_model in summary.items():
+        for model, row in by_model.items():
+            print(f"  {stage:10s} │ {model:14s} │ {row['valid_rate']:6.0%} │ {row['latency_p50']:6.2f} │ "
+                  f"{row['latency_p95']:6.2f} │ {row['avg_tokens']:7.0f} │ {row['total_cost_usd']:8.4f} │ "
+                  f"{row['agreement_with_reference']:6.0%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\n✓ Summary written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
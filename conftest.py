@@ -0,0 +1,13 @@
+"""
+conftest.py
+Shared pytest setup: tests never write to the real security log.
+"""
+
+import pytest
+
+import security
+
+
+@pytest.fixture(autouse=True)
+def isolated_security_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(security, "SECURITY_LOG_PATH", str(tmp_path / "security_log.txt"))
@@ -0,0 +1,56 @@
+"""
+instrumentation.py
+One context manager to instrument a pipeline stage.
+
+    with stage("interpret") as s:
+        ...
+        s.fail()   # count a handled error without raising
+
+Every stage is also a trace span (see tracing.py), and stages named in
+PROFILE_STAGES are profiled (see profiling.py).
+"""
+
+import time
+from contextlib import contextmanager
+
+from metrics import STAGE_ERRORS, STAGE_LATENCY
+from profiling import start_stage_profile
+from tracing import span
+
+
+class Stage:
+    """Handle for the stage currently being measured."""
+
+    __slots__ = ('name', 'attributes', 'failed', 'start')
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.failed = False
+        self.start = time.perf_counter()
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def fail(self):
+        self.failed = True
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """Time, trace and count errors of a stage (raised or marked with fail())."""
+    current = Stage(name, attributes)
+    with span(name, current.attributes) as trace_span:
+        profile = start_stage_profile(name)
+        try:
+            yield current
+        except Exception:
+            current.failed = True
+            raise
+        finally:
+            if profile is not None:
+                profile.end(current.attributes)
+            STAGE_LATENCY.observe(time.perf_counter() - current.start, stage=name)
+            if current.failed:
+                STAGE_ERRORS.inc(stage=name)
+                trace_span.fail()
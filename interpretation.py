@@ -0,0 +1,110 @@
+"""
+interpretation.py
+Business interpretation and refinement shared by the CLI and the web app.
+"""
+
+import json
+
+from instrumentation import stage
+from llm_gateway import get_gateway
+from metrics import REFINEMENTS
+from model_router import get_router
+from prompts import (
+    INTERPRET_SYSTEM_PROMPT,
+    INTERPRET_TEMPLATE,
+    REFINE_DELTA_TEMPLATE,
+    REFINE_SYSTEM_PROMPT,
+    REFINE_TEMPLATE,
+    format_json,
+)
+from refinement import REFINE_DELTA, answer_delta, apply_patch, compact_interpretation
+from security import SecurityValidator
+
+
+def _validate(interpretation):
+    return SecurityValidator().validate_interpretation(interpretation)
+
+
+def interpret_business_context(user_description, model=None):
+    """
+    Takes user's free-text description and extracts structured information.
+    Uses the routed model, falling back to a larger one if the result is
+    invalid; pass model to force a specific one.
+    """
+    with stage("interpret"):
+        prompt = INTERPRET_TEMPLATE.render(user_description=f'"{user_description}"')
+
+        def call(model_name):
+            response = get_gateway().chat(
+                stage="interpret",
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": INTERPRET_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                response_format={"type": "json_object"}
+            )
+            return json.loads(response.choices[0].message.content)
+
+        if model:
+            return call(model)
+        return get_router().call_with_fallback("interpret", call, validate=_validate)
+
+
+def refine_interpretation_with_answers(original_description, interpretation, answers_dict, model=None):
+    """
+    Takes original description, initial interpretation, and user's answers
+    to clarifying questions, then returns refined interpretation.
+
+    With REFINE_DELTA (the default) answers that cannot change anything are
+    dropped first (see refinement.py). If none are left the model is not
+    called; otherwise it gets only the remaining answers and returns the
+    changed fields, which are merged onto the interpretation.
+    """
+    with stage("refine") as refine_stage:
+        if REFINE_DELTA:
+            answers_dict = answer_delta(original_description, interpretation, answers_dict)
+            if not answers_dict:
+                refine_stage.set("mode", "skipped")
+                REFINEMENTS.inc(mode="skipped")
+                return apply_patch(interpretation, {})
+
+        # Build the context
+        clarifying_qa = "\n".join([
+            f"Q: {q}\nA: {a}" 
+            for q, a in answers_dict.items()
+        ])
+
+        if REFINE_DELTA:
+            prompt = REFINE_DELTA_TEMPLATE.render(
+                interpretation=compact_interpretation(interpretation),
+                clarifications=clarifying_qa,
+            )
+        else:
+            prompt = REFINE_TEMPLATE.render(
+                original_description=f'"{original_description}"',
+                interpretation=format_json(interpretation),
+                clarifications=clarifying_qa,
+            )
+        mode = "delta" if REFINE_DELTA else "full"
+        refine_stage.set("mode", mode)
+        REFINEMENTS.inc(mode=mode)
+
+        def call(model_name):
+            response = get_gateway().chat(
+                stage="refine",
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": REFINE_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                response_format={"type": "json_object"}
+            )
+            result = json.loads(response.choices[0].message.content)
+            return apply_patch(interpretation, result) if REFINE_DELTA else result
+
+        if model:
+            return call(model)
+        return get_router().call_with_fallback("refine", call, validate=_validate)
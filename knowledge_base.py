@@ -0,0 +1,275 @@
+"""
+knowledge_base.py
+Local SQLite knowledge base of regulations found by past searches.
+
+Every validated regulation is upserted, deduplicated by normalized name and
+jurisdiction, and tagged with the domain, regulation type and country it was
+searched for. A search whose (type, country) slices were all covered recently
+for a similar domain can be answered from here; otherwise the known entries
+seed the search so only the missing slices are looked up.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from prefetch import DOMAIN_SIMILARITY_THRESHOLD, domain_similarity
+from records import Regulation
+
+# SQLite file for the knowledge base
+KNOWLEDGE_BASE_PATH = os.environ.get("KNOWLEDGE_BASE_PATH", "knowledge_base.db")
+# "answer": reply from the knowledge base when fully covered, else search only the missing slices
+# "seed": always search every slice, listing known regulations so the model skips them
+# "off": neither read nor write
+KNOWLEDGE_BASE_MODE = os.environ.get("KNOWLEDGE_BASE_MODE", "answer").lower()
+# Coverage older than this is searched again
+KNOWLEDGE_BASE_MAX_AGE_DAYS = float(os.environ.get("KNOWLEDGE_BASE_MAX_AGE_DAYS", 30))
+
+# Only these confidence levels are stored
+STORED_CONFIDENCE = ("verified", "likely")
+
+_JURISDICTION_ALIASES = {
+    "eu": "european union",
+    "uk": "united kingdom",
+    "great britain": "united kingdom",
+    "us": "united states",
+    "usa": "united states",
+    "united states of america": "united states",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS regulations (
+    key TEXT PRIMARY KEY,
+    name_norm TEXT NOT NULL,
+    jurisdiction TEXT NOT NULL,
+    effective_date TEXT,
+    data TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    times_seen INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_regulations_jurisdiction ON regulations (jurisdiction);
+CREATE INDEX IF NOT EXISTS idx_regulations_date ON regulations (effective_date);
+
+CREATE TABLE IF NOT EXISTS regulation_tags (
+    regulation_key TEXT NOT NULL REFERENCES regulations (key) ON DELETE CASCADE,
+    domain TEXT NOT NULL,
+    regulation_type TEXT NOT NULL,
+    country TEXT NOT NULL,
+    PRIMARY KEY (regulation_key, domain, regulation_type, country)
+);
+CREATE INDEX IF NOT EXISTS idx_tags_country_type ON regulation_tags (country, regulation_type);
+
+CREATE TABLE IF NOT EXISTS coverage (
+    domain TEXT NOT NULL,
+    regulation_type TEXT NOT NULL,
+    country TEXT NOT NULL,
+    searched_at REAL NOT NULL,
+    PRIMARY KEY (domain, regulation_type, country)
+);
+CREATE INDEX IF NOT EXISTS idx_coverage_country_type ON coverage (country, regulation_type);
+"""
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", (name or "").lower()))
+
+
+def normalize_jurisdiction(value: str) -> str:
+    value = " ".join((value or "").lower().split())
+    return _JURISDICTION_ALIASES.get(value, value)
+
+
+def _normalize_type(value: str) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def regulation_key(reg: Dict) -> str:
+    return f"{normalize_name(reg.get('regulation_name'))}|{normalize_jurisdiction(reg.get('country_region'))}"
+
+
+def is_storable(reg: Dict) -> bool:
+    """Named, placed, sourced and not merely estimated."""
+    return bool(
+        normalize_name(reg.get('regulation_name'))
+        and normalize_jurisdiction(reg.get('country_region'))
+        and reg.get('source')
+        and reg.get('confidence') in STORED_CONFIDENCE
+    )
+
+
+class KnowledgeBase:
+    """Upserts and looks up regulations in one SQLite file."""
+
+    def __init__(self, path: str = KNOWLEDGE_BASE_PATH, max_age_days: float = KNOWLEDGE_BASE_MAX_AGE_DAYS,
+                 clock=time.time):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def upsert(self, regulations: Iterable[Dict], domain: str,
+               regulation_types: Sequence[str], countries: Sequence[str]) -> int:
+        """
+        Store validated regulations and tag them with the search they came from.
+
+        A regulation placed in one of the searched countries is tagged with that
+        country only; regional ones (e.g. EU) are tagged with every searched country.
+
+        Returns:
+            Number of regulations stored or refreshed
+        """
+        now = self._clock()
+        countries = [normalize_jurisdiction(c) for c in countries]
+        types = [_normalize_type(t) for t in regulation_types]
+        stored = 0
+        with self._lock, self._conn:
+            for reg in regulations:
+                if not is_storable(reg):
+                    continue
+                record = Regulation.from_dict(reg)
+                key = regulation_key(reg)
+                jurisdiction = normalize_jurisdiction(record.country_region)
+                self._conn.execute(
+                    """INSERT INTO regulations (key, name_norm, jurisdiction, effective_date, data,
+                                                first_seen, last_seen)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (key) DO UPDATE SET
+                           effective_date = excluded.effective_date,
+                           data = excluded.data,
+                           last_seen = excluded.last_seen,
+                           times_seen = times_seen + 1""",
+                    (key, normalize_name(record.regulation_name), jurisdiction, record.effective_date,
+                     json.dumps(record.to_dict(), ensure_ascii=False), now, now),
+                )
+                tag_countries = [jurisdiction] if jurisdiction in countries else countries
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO regulation_tags VALUES (?, ?, ?, ?)",
+                    [(key, domain, t, c) for t in types for c in tag_countries],
+                )
+                stored += 1
+        return stored
+
+    def mark_covered(self, domain: str, regulation_types: Sequence[str], countries: Sequence[str]):
+        """Record that a complete search covered these slices for this domain."""
+        now = self._clock()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?)",
+                [(domain, _normalize_type(t), normalize_jurisdiction(c), now)
+                 for t in regulation_types for c in countries],
+            )
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def query(self, countries: Sequence[str] = (), regulation_types: Sequence[str] = (),
+              effective_after: Optional[str] = None, effective_before: Optional[str] = None,
+              domain: Optional[str] = None, seen_within: Optional[float] = None) -> List[Dict]:
+        """
+        Regulations tagged with any of the countries/types, optionally within dates,
+        near a domain and found by a search in the last seen_within seconds.
+        """
+        sql = ["SELECT DISTINCT r.key, r.data, t.domain FROM regulations r",
+               "JOIN regulation_tags t ON t.regulation_key = r.key WHERE 1 = 1"]
+        params: List = []
+        if countries:
+            sql.append(f"AND t.country IN ({','.join('?' * len(countries))})")
+            params += [normalize_jurisdiction(c) for c in countries]
+        if regulation_types:
+            sql.append(f"AND t.regulation_type IN ({','.join('?' * len(regulation_types))})")
+            params += [_normalize_type(t) for t in regulation_types]
+        if effective_after:
+            sql.append("AND r.effective_date >= ?")
+            params.append(effective_after)
+        if effective_before:
+            sql.append("AND r.effective_date <= ?")
+            params.append(effective_before)
+        if seen_within is not None:
+            sql.append("AND r.last_seen >= ?")
+            params.append(self._clock() - seen_within)
+        sql.append("ORDER BY r.effective_date")
+
+        with self._lock:
+            rows = self._conn.execute(" ".join(sql), params).fetchall()
+        results, seen = [], set()
+        for key, data, tag_domain in rows:
+            if key in seen:
+                continue
+            if domain is not None and domain_similarity(domain, tag_domain) < DOMAIN_SIMILARITY_THRESHOLD:
+                continue
+            seen.add(key)
+            results.append(json.loads(data))
+        return results
+
+    def covered_slices(self, domain: str, regulation_types: Sequence[str],
+                       countries: Sequence[str], max_age: Optional[float] = None) -> Set[Tuple[str, str]]:
+        """(type, country) pairs searched within max_age seconds (default: the base's) for a similar domain."""
+        types = [_normalize_type(t) for t in regulation_types]
+        countries = [normalize_jurisdiction(c) for c in countries]
+        if not types or not countries:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT domain, regulation_type, country FROM coverage
+                    WHERE country IN ({','.join('?' * len(countries))})
+                      AND regulation_type IN ({','.join('?' * len(types))})
+                      AND searched_at >= ?""",
+                countries + types + [self._clock() - (self.max_age if max_age is None else max_age)],
+            ).fetchall()
+        return {(t, c) for d, t, c in rows if domain_similarity(domain, d) >= DOMAIN_SIMILARITY_THRESHOLD}
+
+    def lookup(self, domain: str, regulation_types: Sequence[str], countries: Sequence[str],
+               max_age: Optional[float] = None) -> Tuple[List[Dict], List[Tuple[str, str]]]:
+        """
+        Known regulations and covered slices are both limited to max_age seconds
+        (default: the base's), so a regulation no search has found since then is
+        neither served nor kept out of a new search.
+
+        Returns:
+            (known regulations for the request, (type, country) pairs still to search)
+        """
+        max_age = self.max_age if max_age is None else max_age
+        covered = self.covered_slices(domain, regulation_types, countries, max_age)
+        missing = [(t, c) for t in regulation_types for c in countries
+                   if (_normalize_type(t), normalize_jurisdiction(c)) not in covered]
+        known = self.query(countries=countries, regulation_types=regulation_types, domain=domain,
+                           seen_within=max_age)
+        return known, missing
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM regulations").fetchone()[0]
+
+
+_knowledge_base: Optional[KnowledgeBase] = None
+_kb_lock = threading.Lock()
+
+
+def get_knowledge_base() -> Optional[KnowledgeBase]:
+    """Process-wide knowledge base, or None when KNOWLEDGE_BASE_MODE is off."""
+    global _knowledge_base
+    if KNOWLEDGE_BASE_MODE == "off":
+        return None
+    with _kb_lock:
+        if _knowledge_base is None:
+            _knowledge_base = KnowledgeBase()
+        return _knowledge_base
@@ -0,0 +1,300 @@
+"""
+llm_gateway.py
+Single entry point for all chat completion calls.
+
+Provides per-call deadlines, retries with jittered backoff on 429/5xx,
+optional hedged duplicate requests, and latency/token accounting. Every
+request to the API first waits for admission control's LLM gate, and
+fails fast with CircuitOpenError while the OpenAI circuit is open.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from admission import estimate_tokens, get_admission
+from cassette import get_cassette
+from circuit_breaker import CircuitOpenError, get_breaker
+from clients import get_openai_client
+from metrics import record_llm_call
+from tracing import bind, span
+
+# Total seconds a single logical call may take, including retries
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 90))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+# Send a duplicate request if the first has not answered after this many seconds (0 = off)
+LLM_HEDGE_AFTER = float(os.environ.get("LLM_HEDGE_AFTER", 0))
+
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Keep this many recent call records for inspection
+CALL_HISTORY = 500
+
+
+class CallRecord:
+    """Accounting for one logical chat completion call."""
+
+    __slots__ = ('stage', 'model', 'latency', 'prompt_tokens', 'completion_tokens',
+                 'cached_tokens', 'attempts', 'hedged', 'error')
+
+    def __init__(self, stage: str, model: str):
+        self.stage = stage
+        self.model = model
+        self.latency = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.attempts = 0
+        self.hedged = False
+        self.error = None
+
+    def to_dict(self) -> Dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+def cached_prompt_tokens(usage) -> int:
+    """Prompt tokens the provider served from its prefix cache."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is None:
+        return 0
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+def is_retryable(error: Exception) -> bool:
+    """429, 5xx, timeouts and connection errors are worth retrying."""
+    import openai
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+def is_outage(error: Exception) -> bool:
+    """5xx, timeouts and connection errors count against the circuit; 429 and 4xx do not."""
+    import openai
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def _deadline_error(error: Exception, record: "CallRecord") -> Exception:
+    """A client-side request timeout, as the built-in TimeoutError callers catch for deadlines."""
+    import openai
+    if isinstance(error, openai.APITimeoutError):
+        timeout = TimeoutError(f"LLM call '{record.stage}' exceeded its deadline")
+        timeout.__cause__ = error
+        return timeout
+    return error
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """Wraps the shared OpenAI client with deadlines, retries and hedging."""
+
+    def __init__(self, client=None, timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 hedge_after: float = LLM_HEDGE_AFTER, clock=time.monotonic, sleep=time.sleep, admission=None,
+                 breaker=None):
+        self._client = client
+        self._admission = admission
+        self._breaker = breaker
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._executor = None
+        self.records = deque(maxlen=CALL_HISTORY)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_openai_client()
+        return self._client
+
+    @property
+    def admission(self):
+        return self._admission or get_admission()
+
+    @property
+    def breaker(self):
+        return self._breaker or get_breaker("openai")
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+        return self._executor
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    def chat(self, stage: str, timeout: Optional[float] = None, hedge: Optional[bool] = None, **kwargs):
+        """
+        Call chat.completions.create with gateway policies applied.
+
+        Args:
+            stage: Pipeline stage name used for accounting
+            timeout: Overall deadline in seconds (defaults to LLM_TIMEOUT)
+            hedge: Send a duplicate request for slow calls (defaults to LLM_HEDGE_AFTER > 0)
+            **kwargs: Passed through to chat.completions.create
+        """
+        record = CallRecord(stage, kwargs.get("model", ""))
+        start = self._clock()
+        deadline = start + (timeout or self.timeout)
+        hedge = self.hedge_after > 0 if hedge is None else hedge
+
+        with span("llm_call") as call_span:
+            try:
+                response = self._call_with_retries(record, deadline, hedge, kwargs)
+            except Exception as e:
+                record.error = type(e).__name__
+                self._finish(record, start, call_span)
+                raise
+
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                record.prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+                record.completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+                record.cached_tokens = cached_prompt_tokens(usage)
+            self._finish(record, start, call_span)
+            return response
+
+    def _finish(self, record: CallRecord, start: float, call_span):
+        record.latency = self._clock() - start
+        self.records.append(record)
+        record_llm_call(record)
+        call_span.update(record.to_dict())
+
+    def _call_with_retries(self, record: CallRecord, deadline: float, hedge: bool, kwargs: Dict):
+        attempt = 0
+        while True:
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                raise TimeoutError(f"LLM call '{record.stage}' exceeded its deadline")
+            attempt += 1
+            record.attempts = attempt
+            try:
+                if hedge:
+                    return self._hedged_call(record, remaining, kwargs)
+                return self._single_call(remaining, kwargs)
+            except Exception as e:
+                if attempt > self.max_retries or not is_retryable(e):
+                    raise _deadline_error(e, record)
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+                delay = max(delay, _retry_after(e) or 0)
+                if self._clock() + delay >= deadline:
+                    raise _deadline_error(e, record)
+                self._sleep(delay)
+
+    def _single_call(self, timeout: float, kwargs: Dict):
+        cassette = get_cassette()
+        if cassette is not None:
+            return cassette.chat(kwargs, lambda: self._admitted_call(timeout, kwargs))
+        return self._admitted_call(timeout, kwargs)
+
+    def _admitted_call(self, timeout: float, kwargs: Dict):
+        """One API request, sent once the LLM gate has a slot and token budget for it."""
+        breaker = self.breaker
+        if not breaker.allow():
+            raise CircuitOpenError("OpenAI is failing; not calling it until the circuit closes")
+        with self.admission.llm.acquire(estimate_tokens(kwargs), timeout) as permit:
+            try:
+                response = self.client.chat.completions.create(timeout=max(timeout - permit.waited, 0.1), **kwargs)
+            except Exception as e:
+                # A 429 or 4xx still shows the API is up
+                if is_outage(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                raise
+            breaker.record_success()
+            usage = getattr(response, "usage", None)
+            if getattr(usage, "total_tokens", None):
+                permit.actual_cost = usage.total_tokens
+            return response
+
+    def _hedged_call(self, record: CallRecord, timeout: float, kwargs: Dict):
+        from concurrent.futures import FIRST_COMPLETED, wait
+        executor = self._get_executor()
+        # Keep the caller's trace and admission tenant in the worker threads
+        call = bind(self._single_call)
+        primary = executor.submit(call, timeout, kwargs)
+        done, _ = wait([primary], timeout=min(self.hedge_after, timeout))
+        if done:
+            return primary.result()
+
+        record.hedged = True
+        backup = executor.submit(call, max(timeout - self.hedge_after, 0.1), kwargs)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+        raise error
+
+    # ------------------------------------------------------------------
+    # Accounting
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-stage totals over the recent call history."""
+        summary: Dict[str, Dict] = {}
+        for record in list(self.records):
+            stage = summary.setdefault(record.stage, {
+                "calls": 0, "errors": 0, "retries": 0, "hedged": 0,
+                "latency_total": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+                "cached_tokens": 0,
+            })
+            stage["calls"] += 1
+            stage["errors"] += 1 if record.error else 0
+            stage["retries"] += max(record.attempts - 1, 0)
+            stage["hedged"] += 1 if record.hedged else 0
+            stage["latency_total"] += record.latency
+            stage["prompt_tokens"] += record.prompt_tokens
+            stage["completion_tokens"] += record.completion_tokens
+            stage["cached_tokens"] += record.cached_tokens
+        for stage in summary.values():
+            stage["latency_avg"] = stage["latency_total"] / stage["calls"]
+            stage["cache_hit_ratio"] = (
+                stage["cached_tokens"] / stage["prompt_tokens"] if stage["prompt_tokens"] else 0.0
+            )
+        return summary
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Process-wide gateway shared by the CLI, the app and the search loop."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
@@ -0,0 +1,309 @@
+"""
+metrics.py
+In-process metrics for the compliance pipeline.
+
+Counters, gauges and histograms with labels, exported as Prometheus text
+(HTTP endpoint or file) and as a JSON snapshot.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Serve /metrics and /metrics.json on this port (0 = off)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+# Write metrics.prom and metrics.json here when write_metrics_files() is called
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self._header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{"labels": dict(zip(self.label_names, k)), "value": v} for k, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the (unlabelled) value at collection time."""
+        self._function = function
+
+    def _collect(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception:
+                pass
+
+    def render(self) -> list:
+        self._collect()
+        return super().render()
+
+    def snapshot(self):
+        self._collect()
+        return super().snapshot()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, dict(v, counts=list(v["counts"]))) for k, v in self._values.items())
+        lines = self._header()
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            items = sorted(self._values.items())
+            return [{
+                "labels": dict(zip(self.label_names, key)),
+                "count": state["count"],
+                "sum": state["sum"],
+                "buckets": {_format_number(b): c for b, c in zip(self.buckets, state["counts"])},
+            } for key, state in items]
+
+
+class Registry:
+    """Holds every metric; get-or-create so modules can share names."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labels, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            "timestamp": time.time(),
+            "metrics": {m.name: {"type": m.type, "help": m.help, "values": m.snapshot()} for m in metrics},
+        }
+
+
+REGISTRY = Registry()
+
+
+# ============================================================================
+# PIPELINE METRICS
+# ============================================================================
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "compliance_stage_latency_seconds", "Wall-clock time per pipeline stage", ["stage"])
+STAGE_ERRORS = REGISTRY.counter(
+    "compliance_stage_errors_total", "Exceptions raised per pipeline stage", ["stage"])
+LLM_LATENCY = REGISTRY.histogram(
+    "compliance_llm_call_latency_seconds", "Latency of each LLM call including retries", ["stage", "model"])
+LLM_TOKENS = REGISTRY.histogram(
+    "compliance_llm_tokens", "Tokens per LLM call", ["stage", "kind"], buckets=TOKEN_BUCKETS)
+LLM_RETRIES = REGISTRY.counter(
+    "compliance_llm_retries_total", "LLM call retries", ["stage"])
+TOOL_CALLS_PER_SEARCH = REGISTRY.histogram(
+    "compliance_tool_calls_per_search", "search_web_tool calls per regulation search", buckets=COUNT_BUCKETS)
+SEARCH_TIER = REGISTRY.counter(
+    "compliance_search_tier_total", "search_web_tool queries by the tier that answered", ["tier"])
+RESULTS_DROPPED = REGISTRY.counter(
+    "compliance_search_results_dropped_total", "Search results not shown to the model after ranking", ["reason"])
+MODEL_FALLBACKS = REGISTRY.counter(
+    "compliance_model_fallbacks_total", "Calls moved to the next model after a failed result", ["stage", "model"])
+PARTIAL_RESULTS = REGISTRY.counter(
+    "compliance_partial_results_total", "Searches cut short by their budget", ["reason"])
+CACHE_HITS = REGISTRY.counter(
+    "compliance_cache_hits_total", "Work avoided by a cache", ["cache"])
+REFINEMENTS = REGISTRY.counter(
+    "compliance_refinements_total", "Refinements by how they were done (skipped, delta, full)", ["mode"])
+MONITOR_CHANGES = REGISTRY.counter(
+    "compliance_monitor_changes_total", "Regulation changes written to the monitoring feed", ["change"])
+ADMISSION_WAIT = REGISTRY.histogram(
+    "compliance_admission_wait_seconds", "Time calls queued for an LLM or search slot", ["gate"])
+ADMISSION_REJECTED = REGISTRY.counter(
+    "compliance_admission_rejected_total", "Requests turned away by admission control", ["reason"])
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    "compliance_breaker_transitions_total", "Circuit breaker state changes per backend", ["backend", "state"])
+API_REQUESTS = REGISTRY.counter(
+    "compliance_api_requests_total", "HTTP API requests by route and status", ["route", "status"])
+SANITIZED_INPUTS = REGISTRY.counter(
+    "compliance_sanitized_inputs_total", "Texts passed through sanitize_input, by whether it changed them",
+    ["changed"])
+
+
+def record_llm_call(record):
+    """Record a llm_gateway.CallRecord."""
+    LLM_LATENCY.observe(record.latency, stage=record.stage, model=record.model)
+    if record.attempts > 1:
+        LLM_RETRIES.inc(record.attempts - 1, stage=record.stage)
+    if record.error:
+        STAGE_ERRORS.inc(stage=f"llm_{record.stage}")
+        return
+    LLM_TOKENS.observe(record.prompt_tokens, stage=record.stage, kind="prompt")
+    LLM_TOKENS.observe(record.completion_tokens, stage=record.stage, kind="completion")
+    LLM_TOKENS.observe(record.cached_tokens, stage=record.stage, kind="cached")
+    if record.cached_tokens:
+        CACHE_HITS.inc(cache="prompt_prefix")
+
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+
+def write_metrics_files(directory: str = METRICS_DIR):
+    """Write metrics.prom and metrics.json for local scraping."""
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "metrics.prom"), "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render_prometheus())
+    with open(os.path.join(directory, "metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(REGISTRY.snapshot(), f, indent=2)
+
+
+_server = None
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve /metrics (Prometheus text) and /metrics.json in a daemon thread."""
+    global _server
+    if not port or _server is not None:
+        return _server
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = REGISTRY.render_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body = json.dumps(REGISTRY.snapshot()).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    _server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+    return _server
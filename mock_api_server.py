@@ -0,0 +1,301 @@
+"""
+mock_api_server.py
+Local stand-in for the OpenAI chat completions and Google Custom Search APIs.
+
+Point the pipeline at it with OPENAI_BASE_URL=<url>/v1 and
+GOOGLE_SEARCH_ENDPOINT=<url>. Latency per route is drawn from a
+distribution, searches follow a tool-call script, and a share of
+requests can fail with an injected status. It also stands in for an
+OTLP/HTTP trace collector (TRACE_EXPORT=http TRACE_ENDPOINT=<url>/v1/traces),
+keeping the exported spans in .spans.
+
+Usage:
+    python mock_api_server.py --port 8900 --chat-latency lognormal:-1.2,0.5 --failure-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Latency distribution in seconds from a spec string:
+        const:0.2   uniform:0.1,0.5   lognormal:MU,SIGMA (of ln seconds)
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] if params else []
+    if kind == "const":
+        return lambda rng: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+DEFAULT_INTERPRETATION = {
+    "detected_domain": "Expense management software for B2B clients",
+    "regulation_types": ["tax", "data protection"],
+    "detected_regions": ["EU"],
+    "suggested_countries": ["Germany", "France"],
+    "confidence": "medium",
+    "clarifying_questions": ["Do you store receipts on behalf of clients?",
+                             "Do you process payments?"],
+}
+
+# Tool calls the model makes before it answers: one list of queries per turn
+DEFAULT_SCRIPT = [
+    ["e-invoicing mandate {country} B2B timeline", "VAT digital reporting {country}"],
+    ["GoBD receipt retention {country}"],
+]
+
+
+def _regulation(i: int, country: str) -> Dict:
+    return {
+        "regulation_name": f"Mock Regulation {i}",
+        "full_name": f"Mock Regulation {i} on electronic invoicing",
+        "effective_date": f"{2025 + i % 3}-01-01",
+        "country_region": country,
+        "description": "Structured e-invoices for domestic B2B transactions.",
+        "impact_level": ("high", "medium", "low")[i % 3],
+        "key_requirements": ["issue structured e-invoices", "retain records for 10 years"],
+        "deadline_type": "upcoming" if i % 2 else "enacted",
+        "source": f"https://www.finance.gov.example/regulation-{i}",
+        "source_type": "official_government",
+        "confidence": "likely",
+    }
+
+
+class MockConfig:
+    """Latency, scripting and failure settings for the mock server."""
+
+    __slots__ = ('chat_latency', 'search_latency', 'failure_rate', 'failure_status',
+                 'tool_script', 'interpretation', 'regulations_per_answer', 'seed')
+
+    def __init__(self, chat_latency: str = "const:0", search_latency: str = "const:0",
+                 failure_rate: float = 0.0, failure_status: int = 429,
+                 tool_script: Optional[List[List[str]]] = None, interpretation: Optional[Dict] = None,
+                 regulations_per_answer: int = 8, seed: int = 0):
+        self.chat_latency = parse_latency(chat_latency)
+        self.search_latency = parse_latency(search_latency)
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.tool_script = DEFAULT_SCRIPT if tool_script is None else tool_script
+        self.interpretation = interpretation or DEFAULT_INTERPRETATION
+        self.regulations_per_answer = regulations_per_answer
+        self.seed = seed
+
+
+class MockAPIServer:
+    """Threaded HTTP server answering chat completions and custom search."""
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.counts = {"chat": 0, "search": 0, "failures": 0}
+        self.spans: List[Dict] = []
+        self._completion_id = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.url = f"http://{host}:{self._httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self) -> "MockAPIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name="mock-api")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    # ------------------------------------------------------------------
+    # Randomness (shared RNG, so guarded)
+    # ------------------------------------------------------------------
+
+    def _draw(self, distribution) -> float:
+        with self._lock:
+            return max(distribution(self._rng), 0.0)
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            fail = self._rng.random() < self.config.failure_rate
+            if fail:
+                self.counts["failures"] += 1
+            return fail
+
+    # ------------------------------------------------------------------
+    # Responses
+    # ------------------------------------------------------------------
+
+    def chat_completion(self, request: Dict) -> Dict:
+        """A completion for the interpret, refine or search stage of the pipeline."""
+        messages = request.get("messages", [])
+        last_user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        message: Dict = {"role": "assistant", "content": None}
+
+        if request.get("tools"):
+            tool_turns = sum(1 for m in messages if m.get("role") == "assistant" and m.get("tool_calls"))
+            countries = re.search(r"Countries: (.*)", messages[1].get("content") or "") if len(messages) > 1 else None
+            country = (countries.group(1).split(",")[0].strip() if countries else "") or "Germany"
+            if request.get("tool_choice") != "none" and tool_turns < len(self.config.tool_script):
+                message["tool_calls"] = [{
+                    "id": f"call_{tool_turns}_{i}",
+                    "type": "function",
+                    "function": {"name": "search_web_tool",
+                                 "arguments": json.dumps({"query": query.format(country=country)})},
+                } for i, query in enumerate(self.config.tool_script[tool_turns])]
+                finish_reason = "tool_calls"
+            else:
+                searches = sum(1 for m in messages if m.get("role") == "tool")
+                message["content"] = json.dumps({
+                    "regulations": [_regulation(i, country) for i in range(self.config.regulations_per_answer)],
+                    "search_metadata": {"searches_performed": searches, "official_sources_found": searches,
+                                        "search_date": time.strftime("%Y-%m-%d")},
+                })
+                finish_reason = "stop"
+        else:
+            interpretation = dict(self.config.interpretation)
+            if "clarifications" in last_user:
+                interpretation["clarifying_questions"] = []
+                interpretation["confidence"] = "high"
+            message["content"] = json.dumps(interpretation)
+            finish_reason = "stop"
+
+        with self._lock:
+            self._completion_id += 1
+            completion_id = self._completion_id
+        prompt_tokens = sum(len(json.dumps(m)) for m in messages) // 4
+        completion_tokens = len(json.dumps(message)) // 4
+        return {
+            "id": f"chatcmpl-mock-{completion_id}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def search_results(self, query: str, num: int) -> Dict:
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-")
+        return {"items": [{
+            "title": f"{query} - result {i + 1}",
+            "link": f"https://www.example.org/{slug}/{i + 1}",
+            "snippet": f"Official guidance on {query}, including effective dates and requirements.",
+            "displayLink": "www.example.org",
+        } for i in range(num)]}
+
+    def collect_spans(self, request: Dict):
+        """Keep the spans of an OTLP/JSON ExportTraceServiceRequest."""
+        spans = [span for resource in request.get("resourceSpans", [])
+                 for scope in resource.get("scopeSpans", []) for span in scope.get("spans", [])]
+        with self._lock:
+            self.spans.extend(spans)
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status: int, body: Dict, headers: Optional[Dict] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _fail(self):
+                status = server.config.failure_status
+                self._send(status, {"error": {"message": "Injected failure", "type": "mock_error",
+                                              "code": str(status)}}, {"Retry-After": "0"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.rstrip("/").endswith("/v1/traces"):
+                    server.collect_spans(request)
+                    self._send(200, {})
+                    return
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "Not found"}})
+                    return
+                with server._lock:
+                    server.counts["chat"] += 1
+                time.sleep(server._draw(server.config.chat_latency))
+                if server._should_fail():
+                    self._fail()
+                    return
+                self._send(200, server.chat_completion(request))
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if not url.path.rstrip("/").endswith("/customsearch/v1"):
+                    self._send(404, {"error": {"message": "Not found"}})
+                    return
+                params = parse_qs(url.query)
+                with server._lock:
+                    server.counts["search"] += 1
+                time.sleep(server._draw(server.config.search_latency))
+                if server._should_fail():
+                    self._fail()
+                    return
+                self._send(200, server.search_results(params.get("q", [""])[0],
+                                                      int(params.get("num", ["5"])[0])))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--chat-latency", default="lognormal:-1.0,0.4",
+                        help="Chat latency distribution: const:S, uniform:A,B or lognormal:MU,SIGMA")
+    parser.add_argument("--search-latency", default="uniform:0.1,0.4", help="Search latency distribution")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests that fail")
+    parser.add_argument("--failure-status", type=int, default=429, help="HTTP status of injected failures")
+    parser.add_argument("--script", help="JSON file with a list of tool-call turns (lists of queries)")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args) -> MockConfig:
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    return MockConfig(chat_latency=args.chat_latency, search_latency=args.search_latency,
+                      failure_rate=args.failure_rate, failure_status=args.failure_status,
+                      tool_script=script, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    server = MockAPIServer(config_from_args(args), port=args.port).start()
+    print(f"🧪 Mock API on {server.url}")
+    print(f"   OPENAI_BASE_URL={server.url}/v1 GOOGLE_SEARCH_ENDPOINT={server.url}")
+    print(f"   TRACE_EXPORT=http TRACE_ENDPOINT={server.url}/v1/traces")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
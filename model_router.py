@@ -0,0 +1,107 @@
+"""
+model_router.py
+Chooses the model for each pipeline stage, with fallback to larger models.
+
+Routes come from DEFAULT_ROUTES, overridden by the MODEL_ROUTES environment
+variable (JSON, or a path to a JSON file), e.g.
+
+    MODEL_ROUTES='{"interpret": {"model": "gpt-4o-mini", "fallback": ["gpt-4o"]}}'
+"""
+
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import MODEL_FALLBACKS
+
+DEFAULT_ROUTES = {
+    # Field extraction from a short description
+    "interpret": {"model": "gpt-4o-mini", "fallback": ["gpt-4o"]},
+    "refine": {"model": "gpt-4o-mini", "fallback": ["gpt-4o"]},
+    # Multi-step tool use and synthesis
+    "search_iteration": {"model": "gpt-4o", "fallback": []},
+    "search_synthesis": {"model": "gpt-4o", "fallback": []},
+}
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+}
+
+
+def _load_overrides() -> Dict:
+    raw = os.environ.get("MODEL_ROUTES", "").strip()
+    if not raw:
+        return {}
+    if not raw.startswith("{"):
+        with open(raw, "r", encoding="utf-8") as f:
+            raw = f.read()
+    return json.loads(raw)
+
+
+class ModelRouter:
+    """Maps pipeline stages to an ordered list of models to try."""
+
+    def __init__(self, routes: Optional[Dict] = None):
+        self.routes = {stage: dict(route) for stage, route in DEFAULT_ROUTES.items()}
+        for stage, route in (routes if routes is not None else _load_overrides()).items():
+            # Allow the short form {"interpret": "gpt-4o"}
+            if not isinstance(route, dict):
+                route = {"model": route}
+            self.routes.setdefault(stage, {"fallback": []}).update(route)
+
+    def model_for(self, stage: str) -> str:
+        return self.models_for(stage)[0]
+
+    def models_for(self, stage: str) -> List[str]:
+        route = self.routes.get(stage, {"model": "gpt-4o"})
+        models = [route["model"]]
+        models += [m for m in route.get("fallback", []) if m not in models]
+        return models
+
+    def call_with_fallback(self, stage: str, call: Callable[[str], object],
+                           validate: Optional[Callable[[object], Tuple[bool, str]]] = None):
+        """
+        Run call(model) for each model in the route until one succeeds and
+        passes validation. Errors from the last model are raised.
+        """
+        models = self.models_for(stage)
+        for i, model in enumerate(models):
+            last = i == len(models) - 1
+            try:
+                result = call(model)
+            except (json.JSONDecodeError, KeyError, TypeError):
+                if last:
+                    raise
+                MODEL_FALLBACKS.inc(stage=stage, model=model)
+                continue
+            if validate is None or last:
+                return result
+            is_valid, _ = validate(result)
+            if is_valid:
+                return result
+            MODEL_FALLBACKS.inc(stage=stage, model=model)
+        return result
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """USD cost of one call, or 0.0 for models without pricing."""
+    pricing = MODEL_PRICING.get(model)
+    if pricing is None:
+        return 0.0
+    input_price, cached_price, output_price = pricing
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        _router = ModelRouter()
+    return _router
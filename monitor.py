@@ -0,0 +1,332 @@
+"""
+monitor.py
+Scheduled refresh of saved business profiles with a feed of what changed.
+
+Profiles (an id, the description and its interpretation) are saved in
+SQLite. Each is searched again every MONITOR_INTERVAL_HOURS, at most
+MONITOR_CONCURRENCY at a time. Knowledge base slices that any profile
+searched within MONITOR_FRESH_HOURS for a similar domain are reused instead
+of being searched again.
+
+The new regulations are compared with the profile's previous snapshot and
+only the differences are appended to the feed (JSONL), one line per change:
+    {"profile_id", "change": "new" | "date_changed" | "removed", "regulation", ...}
+The first refresh of a profile is its baseline and writes nothing. Only
+regulations the knowledge base would store (named, placed, sourced, not
+merely estimated) are compared, so unsourced guesses that come and go
+between searches do not show up as changes. Partial or failed searches keep
+the previous snapshot and are retried after MONITOR_RETRY_MINUTES.
+
+Usage:
+    python main.py --monitor-add profiles.jsonl    # save (and interpret) profiles
+    python main.py --monitor                       # refresh due profiles forever
+    python main.py --monitor --once                # one pass, e.g. from cron
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from admission import as_tenant
+from batch import ResultWriter, _default_interpret, read_items
+from knowledge_base import is_storable, regulation_key
+from metrics import MONITOR_CHANGES
+from security import SecurityValidator, log_security_event
+from tracing import span
+
+# SQLite file with the saved profiles and their snapshots
+MONITOR_DB = os.environ.get("MONITOR_DB", "monitor.db")
+# JSONL file changes are appended to
+MONITOR_FEED = os.environ.get("MONITOR_FEED", "monitor_feed.jsonl")
+# Hours between refreshes of one profile
+MONITOR_INTERVAL_HOURS = float(os.environ.get("MONITOR_INTERVAL_HOURS", 24))
+# Profiles refreshed at the same time
+MONITOR_CONCURRENCY = int(os.environ.get("MONITOR_CONCURRENCY", 4))
+# Knowledge base slices searched within this many hours are reused
+MONITOR_FRESH_HOURS = float(os.environ.get("MONITOR_FRESH_HOURS", 12))
+# Minutes before a failed or partial refresh is tried again
+MONITOR_RETRY_MINUTES = float(os.environ.get("MONITOR_RETRY_MINUTES", 30))
+# Seconds between checks for due profiles when running continuously
+MONITOR_POLL_SECONDS = float(os.environ.get("MONITOR_POLL_SECONDS", 60))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    interpretation TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    next_run REAL NOT NULL,
+    last_run REAL,
+    last_status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_profiles_next_run ON profiles (next_run);
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    profile_id TEXT PRIMARY KEY REFERENCES profiles (id) ON DELETE CASCADE,
+    regulations TEXT NOT NULL,
+    taken_at REAL NOT NULL
+);
+"""
+
+
+def _default_search(interpretation):
+    from search_module import search_regulations_with_function_calling
+    return search_regulations_with_function_calling(
+        detected_domain=interpretation['detected_domain'],
+        regulation_types=interpretation['regulation_types'],
+        countries=interpretation['suggested_countries'],
+        knowledge_base_max_age=MONITOR_FRESH_HOURS * 3600,
+    )
+
+
+# ============================================================================
+# DIFF
+# ============================================================================
+
+def diff_regulations(previous: List[Dict], current: List[Dict]) -> List[Dict]:
+    """
+    Changes from one snapshot to the next, keyed by normalized name and jurisdiction.
+
+    Returns:
+        [{"change": "new" | "date_changed" | "removed", "regulation": {...}}, ...];
+        date changes also carry "previous_effective_date"
+    """
+    before = {regulation_key(r): r for r in previous if is_storable(r)}
+    after = {regulation_key(r): r for r in current if is_storable(r)}
+    changes = []
+    for key, reg in after.items():
+        old = before.get(key)
+        if old is None:
+            changes.append({"change": "new", "regulation": reg})
+        elif (old.get('effective_date') or "") != (reg.get('effective_date') or ""):
+            changes.append({"change": "date_changed", "regulation": reg,
+                            "previous_effective_date": old.get('effective_date')})
+    for key, reg in before.items():
+        if key not in after:
+            changes.append({"change": "removed", "regulation": reg})
+    return changes
+
+
+# ============================================================================
+# MONITOR
+# ============================================================================
+
+class Monitor:
+    """Saved profiles, their latest snapshots and the refresh schedule."""
+
+    def __init__(self, path: str = MONITOR_DB, feed_path: str = MONITOR_FEED,
+                 interval_hours: float = MONITOR_INTERVAL_HOURS, retry_minutes: float = MONITOR_RETRY_MINUTES,
+                 search_fn: Callable[[Dict], Dict] = _default_search, clock=time.time):
+        self.path = path
+        self.feed_path = feed_path
+        self.interval = interval_hours * 3600
+        self.retry = retry_minutes * 60
+        self.search_fn = search_fn
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Profiles
+    # ------------------------------------------------------------------
+
+    def add_profile(self, profile_id: str, description: str, interpretation: Dict):
+        """Save or replace a profile; it is due at once and keeps its snapshot."""
+        now = self._clock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO profiles (id, description, interpretation, added_at, next_run)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (id) DO UPDATE SET description = excluded.description,
+                       interpretation = excluded.interpretation, next_run = excluded.next_run""",
+                (profile_id, description, json.dumps(interpretation, ensure_ascii=False), now, now),
+            )
+
+    def remove_profile(self, profile_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM profiles WHERE id = ?", (profile_id,))
+
+    def import_profiles(self, path: str, interpret_fn: Callable = _default_interpret) -> Dict:
+        """
+        Validate, interpret and save every new profile in a batch input file.
+
+        Ids already saved are skipped, so re-importing a list only pays for
+        the additions.
+
+        Returns:
+            Counts of "added", "rejected", "skipped" and "errors" (interpretation
+            raised; not saved, so the next import tries again) profiles
+        """
+        security = SecurityValidator()
+        saved = set(self.profile_ids())
+        counts = {"added": 0, "rejected": 0, "skipped": 0, "errors": 0}
+        for item in read_items(path):
+            if item["id"] in saved:
+                counts["skipped"] += 1
+                continue
+            is_valid, error_msg = security.validate_business_description(item["description"])
+            if not is_valid:
+                log_security_event("INVALID_INPUT", f"Monitor profile {item['id']} rejected: {error_msg[:100]}")
+                counts["rejected"] += 1
+                continue
+            description = security.sanitize_input(item["description"])
+            answers = {q: security.sanitize_input(str(a).strip()) for q, a in item["answers"].items()
+                       if str(a).strip() and security.validate_answer(str(a).strip())[0]}
+
+            try:
+                interpretation = interpret_fn(description, answers)
+                is_valid, error_msg = security.validate_interpretation(interpretation)
+            except Exception as e:
+                log_security_event("MONITOR_ERROR", f"Monitor profile {item['id']}: {e}")
+                counts["errors"] += 1
+                continue
+            if not is_valid:
+                log_security_event("INVALID_INTERPRETATION", f"Monitor profile {item['id']}: {error_msg}")
+                counts["rejected"] += 1
+                continue
+            self.add_profile(item["id"], description, interpretation)
+            saved.add(item["id"])
+            counts["added"] += 1
+            print(f"  ✓ Saved profile {item['id']}: {interpretation.get('detected_domain', '')}")
+        return counts
+
+    def profile_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT id FROM profiles ORDER BY id")]
+
+    def due(self, now: Optional[float] = None) -> List[Dict]:
+        """Profiles whose next refresh is at or before now, most overdue first."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, description, interpretation FROM profiles WHERE next_run <= ? ORDER BY next_run",
+                (now,),
+            ).fetchall()
+        return [{"id": id_, "description": description, "interpretation": json.loads(interpretation)}
+                for id_, description, interpretation in rows]
+
+    def snapshot(self, profile_id: str) -> Optional[List[Dict]]:
+        """The regulations from the profile's last complete refresh, or None before its baseline."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT regulations FROM snapshots WHERE profile_id = ?", (profile_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    def refresh(self, profile: Dict, feed: ResultWriter) -> Dict:
+        """
+        Search one profile again and write its changes to the feed.
+
+        Returns:
+            {"id", "status", "changes"} where status is "baseline", "ok",
+            "partial" or "error" (the last two keep the old snapshot)
+        """
+        profile_id = profile["id"]
+        try:
+            result = self.search_fn(profile["interpretation"])
+        except Exception as e:
+            log_security_event("MONITOR_ERROR", f"Monitor profile {profile_id}: {e}")
+            return self._finish(profile_id, "error", None)
+
+        meta = result.get('search_metadata', {})
+        if 'error' in meta:
+            return self._finish(profile_id, "error", None)
+        if meta.get('partial'):
+            # A cut-short search would report everything it missed as removed
+            return self._finish(profile_id, "partial", None)
+
+        regulations = result.get('regulations', [])
+        previous = self.snapshot(profile_id)
+        if previous is None:
+            return self._finish(profile_id, "baseline", regulations)
+
+        changes = diff_regulations(previous, regulations)
+        detected_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self._clock()))
+        for change in changes:
+            # Written before the snapshot moves on, so a crash repeats rather than loses a change
+            feed.write(dict(change, profile_id=profile_id,
+                            detected_domain=profile["interpretation"].get('detected_domain', ''),
+                            detected_at=detected_at))
+            MONITOR_CHANGES.inc(change=change["change"])
+        return self._finish(profile_id, "ok", regulations, len(changes))
+
+    def _finish(self, profile_id, status, regulations, changes=0):
+        now = self._clock()
+        next_run = now + (self.interval if regulations is not None else min(self.retry, self.interval))
+        with self._lock, self._conn:
+            if regulations is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+                    (profile_id, json.dumps(regulations, ensure_ascii=False), now),
+                )
+            self._conn.execute(
+                "UPDATE profiles SET last_run = ?, last_status = ?, next_run = ? WHERE id = ?",
+                (now, status, next_run, profile_id),
+            )
+        return {"id": profile_id, "status": status, "changes": changes}
+
+    def run_once(self, concurrency: int = MONITOR_CONCURRENCY) -> Dict:
+        """
+        Refresh every due profile, at most `concurrency` at a time.
+
+        Returns:
+            Counts per status plus the number of changes written
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from search_module import quiet_output
+
+        profiles = self.due()
+        counts = {"baseline": 0, "ok": 0, "partial": 0, "error": 0, "changes": 0}
+        if not profiles:
+            return counts
+        print(f"🔁 Refreshing {len(profiles)} profiles (concurrency {concurrency})")
+
+        def run_quietly(profile):
+            with quiet_output(), as_tenant("monitor", "low"), \
+                    span("monitor_refresh", {"profile_id": profile["id"]}, new_trace=True) as request:
+                outcome = self.refresh(profile, feed)
+                request.set("status", outcome["status"])
+                request.set("changes", outcome["changes"])
+                return outcome
+
+        feed = ResultWriter(self.feed_path)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="monitor") as pool:
+                futures = {pool.submit(run_quietly, profile): profile for profile in profiles}
+                for done, future in enumerate(as_completed(futures), 1):
+                    outcome = future.result()
+                    counts[outcome["status"]] += 1
+                    counts["changes"] += outcome["changes"]
+                    icon = {"ok": "✓", "baseline": "•", "partial": "⚠️ ", "error": "✗"}[outcome["status"]]
+                    suffix = f" ({outcome['changes']} changes)" if outcome["changes"] else ""
+                    print(f"  {icon} [{done}/{len(profiles)}] {outcome['id']}: {outcome['status']}{suffix}")
+        finally:
+            feed.close()
+
+        print(f"✓ Refresh complete: {counts['ok'] + counts['baseline']} refreshed, {counts['changes']} changes, "
+              f"{counts['partial']} partial, {counts['error']} errors")
+        return counts
+
+    def run_forever(self, concurrency: int = MONITOR_CONCURRENCY, poll_seconds: float = MONITOR_POLL_SECONDS):
+        """Refresh due profiles until interrupted."""
+        print(f"👀 Monitoring {len(self.profile_ids())} profiles every {self.interval / 3600:g}h")
+        try:
+            while True:
+                self.run_once(concurrency)
+                time.sleep(poll_seconds)
+        except KeyboardInterrupt:
+            print("\n👋 Monitoring stopped")
@@ -0,0 +1,245 @@
+"""
+prefetch.py
+Speculative regulation search started while the user answers clarifying questions.
+"""
+
+import os
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Tuple
+
+from metrics import CACHE_HITS
+from tracing import bind
+
+# Set SPECULATIVE_SEARCH=0 to disable background prefetching
+SPECULATIVE_SEARCH = os.environ.get("SPECULATIVE_SEARCH", "1") != "0"
+SPECULATIVE_WORKERS = int(os.environ.get("SPECULATIVE_WORKERS", 4))
+
+# Below this word overlap the refined domain is treated as a different business
+DOMAIN_SIMILARITY_THRESHOLD = 0.5
+
+# Searches only look at the first few suggested countries
+SEARCHED_COUNTRIES = 5
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix="prefetch")
+        return _executor
+
+
+# Set when the speculative search running in this context has been discarded
+_cancelled = ContextVar("search_cancelled", default=None)
+
+
+class SearchCancelled(Exception):
+    """The search was discarded by its caller before it finished."""
+
+
+@contextmanager
+def cancellable(event: threading.Event):
+    """Let searches run in the current context stop once event is set."""
+    token = _cancelled.set(event)
+    try:
+        yield
+    finally:
+        _cancelled.reset(token)
+
+
+def cancelled() -> bool:
+    event = _cancelled.get()
+    return event is not None and event.is_set()
+
+
+def check_cancelled():
+    """Raise SearchCancelled if the search in this context was discarded."""
+    if cancelled():
+        raise SearchCancelled("Search cancelled")
+
+
+def _default_search(detected_domain, regulation_types, countries):
+    from search_module import search_regulations_with_function_calling
+    return search_regulations_with_function_calling(
+        detected_domain=detected_domain,
+        regulation_types=regulation_types,
+        countries=countries,
+    )
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def _normalized(values) -> List[str]:
+    return [v.strip().lower() for v in (values or []) if v and v.strip()]
+
+
+def domain_similarity(a: str, b: str) -> float:
+    """Jaccard overlap of the words in two domain descriptions."""
+    words_a, words_b = _words(a), _words(b)
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+# ============================================================================
+# REUSE PLANNING
+# ============================================================================
+
+def plan_reuse(initial: Dict, refined: Dict) -> Tuple[str, Dict]:
+    """
+    Decide what to do with a speculative result after refinement.
+
+    Returns:
+        (action, delta) where action is "reuse", "partial" or "discard" and
+        delta lists the added types/countries and the removed countries
+    """
+    if domain_similarity(initial.get('detected_domain', ''), refined.get('detected_domain', '')) < DOMAIN_SIMILARITY_THRESHOLD:
+        return "discard", {}
+
+    old_types = set(_normalized(initial.get('regulation_types')))
+    new_types = refined.get('regulation_types', [])
+    added_types = [t for t in new_types if t.strip().lower() not in old_types]
+
+    # Mostly new categories means the old evidence is mostly irrelevant
+    if new_types and len(added_types) * 2 > len(new_types):
+        return "discard", {}
+
+    old_countries = initial.get('suggested_countries', [])[:SEARCHED_COUNTRIES]
+    new_countries = refined.get('suggested_countries', [])[:SEARCHED_COUNTRIES]
+    old_lower = set(_normalized(old_countries))
+    new_lower = set(_normalized(new_countries))
+    added_countries = [c for c in new_countries if c.strip().lower() not in old_lower]
+    removed_countries = [c for c in old_countries if c.strip().lower() not in new_lower]
+
+    if new_countries and len(added_countries) == len(new_countries):
+        return "discard", {}
+
+    delta = {
+        "added_types": added_types,
+        "added_countries": added_countries,
+        "removed_countries": removed_countries,
+    }
+    if added_types or added_countries:
+        return "partial", delta
+    return "reuse", delta
+
+
+def merge_results(base: Dict, extra: Dict, removed_countries=()) -> Dict:
+    """Merge regulation results, dropping removed countries and duplicates."""
+    removed = set(_normalized(removed_countries))
+    merged, seen = [], set()
+    for reg in base.get('regulations', []) + extra.get('regulations', []):
+        if (reg.get('country_region') or '').strip().lower() in removed:
+            continue
+        key = ((reg.get('regulation_name') or '').strip().lower(),
+               (reg.get('country_region') or '').strip().lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(reg)
+
+    meta = dict(base.get('search_metadata', {}))
+    extra_meta = extra.get('search_metadata', {})
+    for field in ('searches_performed', 'official_sources_found'):
+        meta[field] = (meta.get(field) or 0) + (extra_meta.get(field) or 0)
+    if extra_meta.get('search_date'):
+        meta['search_date'] = extra_meta['search_date']
+    return {"regulations": merged, "search_metadata": meta}
+
+
+# ============================================================================
+# SPECULATIVE SEARCH
+# ============================================================================
+
+class SpeculativeSearch:
+    """Runs the search for an initial interpretation in the background."""
+
+    def __init__(self, interpretation: Dict, search_fn=None):
+        self.interpretation = dict(interpretation)
+        self._search_fn = search_fn or _default_search
+        self._future = None
+        self._cancelled = threading.Event()
+
+    def _run_quietly(self, detected_domain, regulation_types, countries):
+        from search_module import quiet_output
+        with quiet_output(), cancellable(self._cancelled):
+            return self._search_fn(detected_domain, regulation_types, countries)
+
+    def start(self) -> "SpeculativeSearch":
+        interp = self.interpretation
+        # The search belongs to the request that started it
+        self._future = _get_executor().submit(
+            bind(self._run_quietly),
+            interp['detected_domain'],
+            interp['regulation_types'],
+            interp['suggested_countries'],
+        )
+        return self
+
+    def _speculative_result(self):
+        try:
+            return self._future.result()
+        except Exception:
+            return None
+
+    def resolve(self, interpretation: Dict) -> Dict:
+        """
+        Return results for the (possibly refined) interpretation, reusing,
+        extending or discarding the speculative search as appropriate.
+        """
+        domain = interpretation['detected_domain']
+        types = interpretation['regulation_types']
+        countries = interpretation['suggested_countries']
+
+        action, delta = plan_reuse(self.interpretation, interpretation)
+        if action == "discard":
+            # A search already running stops at its next model or tool call
+            self._cancelled.set()
+            self._future.cancel()
+            result = self._search_fn(domain, types, countries)
+        else:
+            speculative = self._speculative_result()
+            if speculative is None or not speculative.get('regulations'):
+                action = "discard"
+                result = self._search_fn(domain, types, countries)
+            elif action == "reuse":
+                result = merge_results(speculative, {}, delta['removed_countries'])
+            else:
+                result = self._search_delta(speculative, domain, types, countries, delta)
+
+        result.setdefault('search_metadata', {})['speculative'] = action
+        if action != "discard":
+            CACHE_HITS.inc(cache="speculative_search")
+        return result
+
+    def _search_delta(self, speculative, domain, types, countries, delta) -> Dict:
+        searches = []
+        added_countries = delta['added_countries']
+        added_types = delta['added_types']
+        if added_countries:
+            searches.append((domain, types, added_countries))
+        kept = [c for c in countries[:SEARCHED_COUNTRIES] if c not in added_countries]
+        if added_types and kept:
+            searches.append((domain, added_types, kept))
+
+        result = merge_results(speculative, {}, delta['removed_countries'])
+        futures = [_get_executor().submit(bind(self._search_fn), *args) for args in searches]
+        for future in futures:
+            result = merge_results(result, future.result())
+        return result
+
+
+def start_speculative_search(interpretation: Dict, search_fn=None):
+    """Start a background search, or return None when prefetching is disabled."""
+    if not SPECULATIVE_SEARCH:
+        return None
+    return SpeculativeSearch(interpretation, search_fn).start()
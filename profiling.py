@@ -0,0 +1,255 @@
+"""
+profiling.py
+Opt-in cProfile and tracemalloc profiling of pipeline stages.
+
+    PROFILE_STAGES=all python main.py
+    PROFILE_STAGES=search_web_tool,parse python main.py
+    python main.py --profile
+
+Every profiled stage (see instrumentation.stage) appends its stacks to
+PROFILE_DIR/<stage>.collapsed in the collapsed-stack format read by
+flamegraph.pl and speedscope (weights are microseconds), and one line with
+its duration and peak traced memory to PROFILE_DIR/stage_memory.jsonl.
+
+Nested stages profile their own time only: the enclosing stage's profiler
+is paused while a nested stage runs. Peak memory comes from tracemalloc,
+which traces the whole process, so concurrent stages share their peaks.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# "all", a comma-separated list of stage names, or empty to disable
+PROFILE_STAGES = os.environ.get("PROFILE_STAGES", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+# Set PROFILE_MEMORY=0 to skip tracemalloc (it slows allocation-heavy code)
+PROFILE_MEMORY = os.environ.get("PROFILE_MEMORY", "1") != "0"
+
+# Deepest stack written to the collapsed files
+MAX_STACK_DEPTH = 64
+# Branches below this share of the stage's time are folded into their caller
+MIN_BRANCH_SHARE = 0.002
+# Upper bound on stack paths visited per stage run
+MAX_STACK_NODES = 50000
+
+_stages = set()
+_all_stages = False
+_directory = PROFILE_DIR
+_local = threading.local()
+_lock = threading.Lock()
+_active: List["StageProfile"] = []
+_summary: Dict[str, Dict] = {}
+_started_tracemalloc = False
+
+
+def configure(stages: str = PROFILE_STAGES, directory: str = PROFILE_DIR):
+    """Choose which stages to profile ("all", "a,b", or "" for none)."""
+    global _all_stages, _directory
+    names = {s.strip() for s in (stages or "").split(",") if s.strip()}
+    _all_stages = "all" in names
+    _stages.clear()
+    _stages.update(names - {"all"})
+    _directory = directory
+    if not names:
+        _stop_tracing()
+
+
+def _stop_tracing():
+    global _started_tracemalloc
+    if _started_tracemalloc:
+        import tracemalloc
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def enabled(name: str) -> bool:
+    return _all_stages or name in _stages
+
+
+configure()
+
+
+# ============================================================================
+# COLLAPSED STACKS FROM cProfile
+# ============================================================================
+
+def _label(func) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def collapsed_stacks(stats: Dict, root: str) -> Dict[str, int]:
+    """
+    Approximate call stacks from pstats caller/callee edges.
+
+    cProfile records edges, not whole stacks, so each function's time is
+    split across its callers in proportion to the time along each edge.
+    Paths through a call graph multiply quickly, so branches below
+    MIN_BRANCH_SHARE of the stage's time are charged to their caller.
+
+    Returns:
+        {"root;caller;callee": microseconds}
+    """
+    children = defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            children[caller][func] = edge[3]
+    roots = [func for func, entry in stats.items() if not any(c in stats for c in entry[4])]
+
+    stacks: Dict[str, int] = defaultdict(int)
+    min_seconds = sum(stats[func][3] for func in roots) * MIN_BRANCH_SHARE
+    visited = [0]
+
+    def walk(func, path, seconds):
+        visited[0] += 1
+        _, _, own, cumulative, _ = stats[func]
+        scale = seconds / cumulative if cumulative else 0.0
+        key = ";".join(path)
+        if len(path) > MAX_STACK_DEPTH or visited[0] > MAX_STACK_NODES:
+            stacks[key] += int(seconds * 1e6)
+            return
+        stacks[key] += int(own * scale * 1e6)
+        for child, edge_seconds in children.get(func, {}).items():
+            label = _label(child)
+            child_seconds = edge_seconds * scale
+            if label in path or child_seconds < min_seconds:
+                # Recursion or a negligible branch: charge the time here
+                stacks[key] += int(child_seconds * 1e6)
+                continue
+            walk(child, path + [label], child_seconds)
+
+    for func in roots:
+        walk(func, [root, _label(func)], stats[func][3])
+    return {stack: us for stack, us in stacks.items() if us > 0}
+
+
+# ============================================================================
+# STAGE PROFILES
+# ============================================================================
+
+def _bump_peaks():
+    """Fold the current tracemalloc peak into every active stage, then reset it."""
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+        return
+    _, peak = tracemalloc.get_traced_memory()
+    for profile in _active:
+        profile.peak = max(profile.peak, peak)
+    tracemalloc.reset_peak()
+
+
+class StageProfile:
+    """cProfile and tracemalloc state for one run of one stage."""
+
+    __slots__ = ('name', 'profile', 'start', 'start_memory', 'peak')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.profile = None
+        self.start = time.perf_counter()
+        self.start_memory = 0
+        self.peak = 0
+
+    def begin(self):
+        global _started_tracemalloc
+        import cProfile
+        if PROFILE_MEMORY:
+            import tracemalloc
+            with _lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _started_tracemalloc = True
+                _bump_peaks()
+                self.start_memory = tracemalloc.get_traced_memory()[0]
+                _active.append(self)
+
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        if stack and stack[-1].profile is not None:
+            stack[-1].profile.disable()
+        self.profile = cProfile.Profile()
+        try:
+            self.profile.enable()
+        except ValueError:
+            # Another thread's profiler holds the interpreter-wide hook (Python 3.12+)
+            self.profile = None
+        stack.append(self)
+
+    def end(self, attributes: Optional[Dict] = None) -> Dict:
+        if self.profile is not None:
+            self.profile.disable()
+        stack = _local.stack
+        stack.pop()
+        if stack and stack[-1].profile is not None:
+            try:
+                stack[-1].profile.enable()
+            except ValueError:
+                stack[-1].profile = None
+        seconds = time.perf_counter() - self.start
+
+        if PROFILE_MEMORY:
+            with _lock:
+                _bump_peaks()
+                _active.remove(self)
+        peak_bytes = max(self.peak - self.start_memory, 0)
+
+        entry = {
+            "stage": self.name,
+            "timestamp": time.time(),
+            "seconds": round(seconds, 4),
+            "peak_bytes": peak_bytes if PROFILE_MEMORY else None,
+            "attributes": {k: v for k, v in (attributes or {}).items() if isinstance(v, (str, int, float, bool))},
+        }
+        self._write(entry)
+        return entry
+
+    def _write(self, entry: Dict):
+        stacks = {}
+        if self.profile is not None:
+            import pstats
+            stacks = collapsed_stacks(pstats.Stats(self.profile).stats, f"stage:{self.name}")
+        with _lock:
+            os.makedirs(_directory, exist_ok=True)
+            if stacks:
+                with open(os.path.join(_directory, f"{self.name}.collapsed"), "a", encoding="utf-8") as f:
+                    f.writelines(f"{stack} {us}\n" for stack, us in stacks.items())
+            with open(os.path.join(_directory, "stage_memory.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            summary = _summary.setdefault(self.name, {"runs": 0, "seconds": 0.0, "peak_bytes": 0})
+            summary["runs"] += 1
+            summary["seconds"] += entry["seconds"]
+            summary["peak_bytes"] = max(summary["peak_bytes"], entry["peak_bytes"] or 0)
+
+
+def start_stage_profile(name: str) -> Optional[StageProfile]:
+    """A running profile for this stage, or None when it is not profiled."""
+    if not enabled(name):
+        return None
+    profile = StageProfile(name)
+    profile.begin()
+    return profile
+
+
+def summary() -> Dict[str, Dict]:
+    """Runs, total seconds and largest peak memory per profiled stage."""
+    with _lock:
+        return {name: dict(values) for name, values in _summary.items()}
+
+
+def print_summary():
+    stages = summary()
+    if not stages:
+        return
+    print("\n" + "="*70)
+    print(f"🔬 STAGE PROFILES (written to {_directory}/)")
+    print("="*70)
+    for name, values in sorted(stages.items(), key=lambda item: item[1]["seconds"], reverse=True):
+        print(f"  {name:18s} │ {values['runs']:3d} runs │ {values['seconds']:8.2f} s │ "
+              f"peak {values['peak_bytes'] / 1024 / 1024:7.1f} MiB")
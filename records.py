@@ -0,0 +1,227 @@
+"""
+records.py
+Compact, slotted records for interpretations and regulation results.
+"""
+
+import sys
+import threading
+from typing import Dict, Iterable, Tuple
+
+
+def _text(value) -> str:
+    """Intern short repeated strings (countries, categories, levels)."""
+    if value is None:
+        return ""
+    value = str(value)
+    return sys.intern(value) if len(value) <= 64 else value
+
+
+def _texts(values: Iterable) -> Tuple[str, ...]:
+    if not values:
+        return ()
+    if isinstance(values, str):
+        values = [values]
+    return tuple(_text(v) for v in values)
+
+
+_reported: set = set()
+_reported_lock = threading.Lock()
+
+
+def _report_unknown(cls, data: Dict, known: Iterable[str]):
+    """Print the keys from_dict drops, once per record type and set of keys, so schema drift shows up."""
+    unknown = tuple(sorted(str(key) for key in data if key not in known))
+    if not unknown:
+        return
+    with _reported_lock:
+        if (cls, unknown) in _reported:
+            return
+        _reported.add((cls, unknown))
+    print(f"⚠️  {cls.__name__}: ignoring unknown field(s) {', '.join(unknown)}")
+
+
+# ============================================================================
+# INTERPRETATION
+# ============================================================================
+
+class Interpretation:
+    """Structured reading of a business description."""
+
+    __slots__ = (
+        'detected_domain', 'regulation_types', 'detected_regions',
+        'suggested_countries', 'confidence', 'clarifying_questions',
+        '__weakref__',
+    )
+
+    FIELDS = (
+        'detected_domain', 'regulation_types', 'detected_regions',
+        'suggested_countries', 'confidence', 'clarifying_questions',
+    )
+
+    def __init__(self, detected_domain="", regulation_types=(), detected_regions=(),
+                 suggested_countries=(), confidence="", clarifying_questions=()):
+        self.detected_domain = str(detected_domain or "")
+        self.regulation_types = _texts(regulation_types)
+        self.detected_regions = _texts(detected_regions)
+        self.suggested_countries = _texts(suggested_countries)
+        self.confidence = _text(confidence)
+        self.clarifying_questions = tuple(str(q) for q in (clarifying_questions or ()))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Interpretation":
+        _report_unknown(cls, data, cls.FIELDS)
+        return cls(**{field: data.get(field) for field in cls.FIELDS})
+
+    def to_dict(self) -> Dict:
+        return {
+            'detected_domain': self.detected_domain,
+            'regulation_types': list(self.regulation_types),
+            'detected_regions': list(self.detected_regions),
+            'suggested_countries': list(self.suggested_countries),
+            'confidence': self.confidence,
+            'clarifying_questions': list(self.clarifying_questions),
+        }
+
+    def key(self) -> Tuple:
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+
+# ============================================================================
+# REGULATIONS
+# ============================================================================
+
+class Regulation:
+    """A single regulation as documented in the search prompt."""
+
+    __slots__ = (
+        'regulation_name', 'full_name', 'effective_date', 'country_region',
+        'description', 'impact_level', 'key_requirements', 'deadline_type',
+        'source', 'source_type', 'confidence', '__weakref__',
+    )
+
+    FIELDS = (
+        'regulation_name', 'full_name', 'effective_date', 'country_region',
+        'description', 'impact_level', 'key_requirements', 'deadline_type',
+        'source', 'source_type', 'confidence',
+    )
+
+    def __init__(self, regulation_name="", full_name="", effective_date="", country_region="",
+                 description="", impact_level="", key_requirements=(), deadline_type="",
+                 source="", source_type="", confidence=""):
+        self.regulation_name = str(regulation_name or "")
+        self.full_name = str(full_name or "")
+        self.effective_date = _text(effective_date)
+        self.country_region = _text(country_region)
+        self.description = str(description or "")
+        self.impact_level = _text(impact_level)
+        self.key_requirements = tuple(str(r) for r in (key_requirements or ()))
+        self.deadline_type = _text(deadline_type)
+        self.source = str(source or "")
+        self.source_type = _text(source_type)
+        self.confidence = _text(confidence)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Regulation":
+        _report_unknown(cls, data, cls.FIELDS)
+        return cls(**{field: data.get(field) for field in cls.FIELDS})
+
+    def to_dict(self) -> Dict:
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['key_requirements'] = list(self.key_requirements)
+        return data
+
+    def key(self) -> Tuple:
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+
+class RegulationSet:
+    """Regulations found by one search plus its metadata."""
+
+    __slots__ = ('regulations', 'search_metadata', '__weakref__')
+
+    def __init__(self, regulations: Tuple[Regulation, ...] = (), search_metadata: Tuple = ()):
+        self.regulations = tuple(regulations)
+        # Metadata is small and flat; keep it as sorted (key, value) pairs.
+        self.search_metadata = tuple(search_metadata)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RegulationSet":
+        _report_unknown(cls, data, ('regulations', 'search_metadata'))
+        regulations = tuple(
+            Regulation.from_dict(r) for r in data.get('regulations', []) if isinstance(r, dict)
+        )
+        metadata = tuple(sorted(
+            (_text(k), v) for k, v in (data.get('search_metadata') or {}).items()
+        ))
+        return cls(regulations, metadata)
+
+    def to_dict(self) -> Dict:
+        return {
+            'regulations': [r.to_dict() for r in self.regulations],
+            'search_metadata': dict(self.search_metadata),
+        }
+
+    def key(self) -> Tuple:
+        return (tuple(r.key() for r in self.regulations), self.search_metadata)
+
+
+# ============================================================================
+# RESPONSE SCHEMA
+# ============================================================================
+
+def _string(description, enum=None):
+    schema = {"type": "string", "description": description}
+    if enum:
+        schema["enum"] = list(enum)
+    return schema
+
+
+REGULATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "regulation_name": _string("Short official name"),
+        "full_name": _string("Complete official title"),
+        "effective_date": _string("YYYY-MM-DD or TBD"),
+        "country_region": _string("Specific jurisdiction"),
+        "description": _string("2-3 sentences with current status and how it affects this business"),
+        "impact_level": _string("Impact on this business", ["high", "medium", "low"]),
+        "key_requirements": {"type": "array", "items": {"type": "string"}},
+        "deadline_type": _string("Whether it is in force or upcoming", ["enacted", "upcoming"]),
+        "source": _string("URL from search results"),
+        "source_type": _string("Kind of source", [
+            "official_government", "regulatory_authority", "legal_analysis", "news",
+        ]),
+        "confidence": _string("How well the source supports it", ["verified", "likely", "estimated"]),
+    },
+    "required": list(Regulation.FIELDS),
+    "additionalProperties": False,
+}
+
+REGULATIONS_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "regulations": {"type": "array", "items": REGULATION_SCHEMA},
+        "search_metadata": {
+            "type": "object",
+            "properties": {
+                "searches_performed": {"type": "integer"},
+                "official_sources_found": {"type": "integer"},
+                "search_date": _string("YYYY-MM-DD"),
+            },
+            "required": ["searches_performed", "official_sources_found", "search_date"],
+            "additionalProperties": False,
+        },
+    },
+    "required": ["regulations", "search_metadata"],
+    "additionalProperties": False,
+}
+
+# Strict structured output: the API guarantees the reply matches the schema
+REGULATIONS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "regulations_response",
+        "strict": True,
+        "schema": REGULATIONS_RESPONSE_SCHEMA,
+    },
+}
@@ -0,0 +1,132 @@
+"""
+refinement.py
+Works out locally what clarifying answers can change before asking the model.
+
+Answers that are empty, non-committal ("not sure", "n/a") or only confirm
+what the interpretation already says are dropped. When nothing is left the
+refine call is skipped; otherwise the model sees a compact copy of the
+interpretation and just the remaining answers, and returns only the fields
+that change, which are merged onto the interpretation as a patch.
+"""
+
+import os
+import re
+from typing import Dict, Set
+
+from prompts import format_json
+
+# Set REFINE_DELTA=0 to always send the full refine prompt
+REFINE_DELTA = os.environ.get("REFINE_DELTA", "1") != "0"
+
+# Fields the model may change; clarifying_questions is always cleared
+PATCH_FIELDS = {
+    "detected_domain": str,
+    "regulation_types": list,
+    "detected_regions": list,
+    "suggested_countries": list,
+    "confidence": str,
+}
+
+# Answers that say nothing about the business
+NON_ANSWERS = {
+    "", "-", "?", "n/a", "na", "skip", "pass", "not sure", "unsure", "maybe", "idk",
+    "i don't know", "i do not know", "don't know", "dont know", "no idea", "not applicable",
+    "no comment", "same", "same as above", "as above", "see above",
+}
+
+# Answers starting like this rule something out
+NEGATIONS = ("no", "nope", "not", "never", "none", "nothing", "we don't", "we do not", "we dont", "we won't")
+
+# Words that carry no business information (questions are full of them)
+STOPWORDS = {
+    "the", "and", "for", "are", "you", "your", "our", "any", "all", "with", "from", "that", "this",
+    "these", "those", "what", "which", "who", "whom", "how", "when", "where", "why", "does", "did",
+    "have", "has", "had", "will", "would", "could", "should", "can", "may", "might", "must", "also",
+    "yes", "yeah", "yep", "correct", "right", "exactly", "sure", "indeed", "only", "just", "some",
+    "plan", "planning", "currently", "business", "company", "companies", "customer", "customers",
+    "there", "their", "them", "they", "its", "about", "into", "over", "than", "then", "other",
+    "use", "using", "used", "been", "being", "was", "were", "well", "both", "each", "more", "most",
+    "offer", "provide", "operate", "operating", "work", "within", "such", "like", "etc", "not",
+    "don't", "dont", "won't", "never", "nope", "none", "nothing",
+}
+
+
+def _terms(text: str) -> Set[str]:
+    """Content words, lower-cased and crudely singularised; short codes like EU or UK are kept."""
+    terms = set()
+    for word in re.findall(r"[A-Za-z0-9][A-Za-z0-9'-]*", text or ""):
+        if word.isupper() and len(word) <= 3:
+            terms.add(word.lower())
+            continue
+        word = word.lower()
+        if len(word) <= 2 or word in STOPWORDS:
+            continue
+        terms.add(word[:-1] if len(word) > 4 and word.endswith("s") and not word.endswith("ss") else word)
+    return terms
+
+
+def known_terms(description: str, interpretation: Dict) -> Set[str]:
+    """Everything the description and interpretation already say."""
+    parts = [description, interpretation.get("detected_domain", "")]
+    for field in ("regulation_types", "detected_regions", "suggested_countries"):
+        parts.extend(str(v) for v in interpretation.get(field) or [])
+    return _terms(" ".join(parts))
+
+
+def is_non_answer(answer: str) -> bool:
+    return re.sub(r"[.!,;]+$", "", (answer or "").strip().lower()) in NON_ANSWERS
+
+
+def is_negative(answer: str) -> bool:
+    text = (answer or "").strip().lower()
+    return any(text == n or text.startswith((n + " ", n + ",", n + ".")) for n in NEGATIONS)
+
+
+def answer_delta(description: str, interpretation: Dict, answers: Dict[str, str]) -> Dict[str, str]:
+    """
+    The answers that could change the interpretation.
+
+    An affirmative answer matters when it (or the question it confirms)
+    brings in something the interpretation does not mention yet. A negative
+    one matters when it rules out something the interpretation relies on,
+    or adds new detail of its own.
+    """
+    known = known_terms(description, interpretation)
+    relevant = {}
+    for question, answer in answers.items():
+        answer = (answer or "").strip()
+        if is_non_answer(answer):
+            continue
+        new_in_answer = _terms(answer) - known
+        if is_negative(answer):
+            if new_in_answer or _terms(question) & known:
+                relevant[question] = answer
+        elif new_in_answer or _terms(question) - known:
+            relevant[question] = answer
+    return relevant
+
+
+def compact_interpretation(interpretation: Dict) -> str:
+    """The patchable fields only, as compact JSON."""
+    return format_json({field: interpretation.get(field) for field in PATCH_FIELDS})
+
+
+def apply_patch(interpretation: Dict, patch: Dict) -> Dict:
+    """
+    The interpretation with the patch's fields replaced and no open questions.
+
+    Raises:
+        TypeError: the patch is not an object or a field has the wrong type
+    """
+    if not isinstance(patch, dict):
+        raise TypeError("Refinement patch must be a JSON object")
+    merged = dict(interpretation)
+    for field, kind in PATCH_FIELDS.items():
+        value = patch.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, kind):
+            raise TypeError(f"Refinement patch field {field} must be a {kind.__name__}")
+        merged[field] = value
+    merged["clarifying_questions"] = []
+    return merged
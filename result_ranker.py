@@ -0,0 +1,174 @@
+"""
+result_ranker.py
+Local re-ranking of search results before they are shown to the model.
+
+Each result is scored by blending its position in Google's order with the
+authority of its host (official legislation, government and regulator
+sites first, user-generated platforms last). Near-duplicate snippets, such
+as syndicated copies of one article, are collapsed with SimHash, keeping
+the better-scored copy, and only the top results are passed on.
+
+The authority table is DEFAULT_AUTHORITY, with entries overridden by the
+DOMAIN_AUTHORITY environment variable (JSON, or a path to a JSON file), e.g.
+
+    DOMAIN_AUTHORITY='{"bafin.de": 1.0, "lexology.com": 0.5}'
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from metrics import RESULTS_DROPPED
+from snippet_index import tokenize
+from source_fetcher import is_official
+
+# Set RESULT_RANKING=0 to pass search results through in Google's order
+RESULT_RANKING = os.environ.get("RESULT_RANKING", "1") != "0"
+# Live results requested per query before ranking (Custom Search returns at most 10)
+RANK_CANDIDATES = int(os.environ.get("RANK_CANDIDATES", 10))
+# Results passed to the model per query
+RANK_TOP_RESULTS = int(os.environ.get("RANK_TOP_RESULTS", 5))
+# Share of the score from host authority; the rest comes from Google's order
+RANK_AUTHORITY_WEIGHT = float(os.environ.get("RANK_AUTHORITY_WEIGHT", 0.6))
+# Snippet fingerprints differing in at most this many of 64 bits are near-duplicates
+RANK_DUPLICATE_BITS = int(os.environ.get("RANK_DUPLICATE_BITS", 10))
+
+# Host (or parent domain) -> authority from 0 to 1; the longest match wins
+DEFAULT_AUTHORITY = {
+    # Legislation and EU institutions
+    "eur-lex.europa.eu": 1.0,
+    "legislation.gov.uk": 1.0,
+    "europa.eu": 0.95,
+    # Regulators outside government domains
+    "ico.org.uk": 0.9,
+    "fca.org.uk": 0.9,
+    "cnil.fr": 0.9,
+    "bafin.de": 0.9,
+    "aepd.es": 0.9,
+    "garanteprivacy.it": 0.9,
+    "dataprotection.ie": 0.9,
+    "autoriteitpersoonsgegevens.nl": 0.9,
+    "pcisecuritystandards.org": 0.9,
+    "fatf-gafi.org": 0.8,
+    "bis.org": 0.8,
+    "oecd.org": 0.8,
+    # Secondary commentary
+    "iapp.org": 0.6,
+    "wikipedia.org": 0.4,
+    # User-generated and social platforms
+    "medium.com": 0.1,
+    "substack.com": 0.1,
+    "blogspot.com": 0.1,
+    "wordpress.com": 0.1,
+    "linkedin.com": 0.1,
+    "youtube.com": 0.1,
+    "reddit.com": 0.05,
+    "quora.com": 0.05,
+    "facebook.com": 0.05,
+    "twitter.com": 0.05,
+    "x.com": 0.05,
+}
+# Government hosts recognised by source_fetcher.is_official but not in the table
+OFFICIAL_AUTHORITY = 0.9
+# Every other host
+DEFAULT_HOST_AUTHORITY = 0.3
+
+# Snippets with fewer terms than this are too short to fingerprint reliably
+MIN_FINGERPRINT_TERMS = 5
+
+
+def _load_overrides() -> Dict:
+    raw = os.environ.get("DOMAIN_AUTHORITY", "").strip()
+    if not raw:
+        return {}
+    if not raw.startswith("{"):
+        with open(raw, "r", encoding="utf-8") as f:
+            raw = f.read()
+    return json.loads(raw)
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over the words and word pairs of text, or None if it is too short."""
+    terms = tokenize(text)
+    if len(terms) < MIN_FINGERPRINT_TERMS:
+        return None
+    weights = [0] * 64
+    for feature in terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if digest >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ResultRanker:
+    """Scores results by host authority and position, dropping near-duplicates."""
+
+    def __init__(self, authority: Optional[Dict[str, float]] = None,
+                 authority_weight: float = RANK_AUTHORITY_WEIGHT, duplicate_bits: int = RANK_DUPLICATE_BITS,
+                 top: int = RANK_TOP_RESULTS):
+        self.authority_table = dict(DEFAULT_AUTHORITY)
+        self.authority_table.update(authority if authority is not None else _load_overrides())
+        self.authority_weight = authority_weight
+        self.duplicate_bits = duplicate_bits
+        self.top = top
+
+    def authority(self, url: str) -> float:
+        host = (urlsplit(url).hostname or "").lower()
+        labels = host.split(".")
+        # Longest suffix first: "eur-lex.europa.eu" before "europa.eu"
+        for start in range(len(labels) - 1):
+            weight = self.authority_table.get(".".join(labels[start:]))
+            if weight is not None:
+                return float(weight)
+        return OFFICIAL_AUTHORITY if is_official(url) else DEFAULT_HOST_AUTHORITY
+
+    def rank(self, results: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+        """The best results, most useful first, at most min(limit, top) of them."""
+        limit = min(limit or self.top, self.top)
+        count = len(results)
+        scored = sorted(
+            ((self.authority_weight * self.authority(result.get('link') or '')
+              + (1 - self.authority_weight) * (1 - position / count), position, result)
+             for position, result in enumerate(results)),
+            key=lambda item: (-item[0], item[1]),
+        )
+        kept: List[Dict] = []
+        fingerprints: List[int] = []
+        duplicates = 0
+        for _, _, result in scored:
+            if len(kept) >= limit:
+                break
+            fingerprint = simhash(result.get('snippet') or result.get('title') or '')
+            if fingerprint is not None:
+                if any(hamming(fingerprint, other) <= self.duplicate_bits for other in fingerprints):
+                    duplicates += 1
+                    continue
+                fingerprints.append(fingerprint)
+            kept.append(result)
+        if duplicates:
+            RESULTS_DROPPED.inc(duplicates, reason="duplicate")
+        if count - duplicates > len(kept):
+            RESULTS_DROPPED.inc(count - duplicates - len(kept), reason="below_top")
+        return kept
+
+
+_ranker: Optional[ResultRanker] = None
+_ranker_lock = threading.Lock()
+
+
+def get_ranker() -> Optional[ResultRanker]:
+    """Process-wide ranker, or None when RESULT_RANKING=0."""
+    global _ranker
+    if not RESULT_RANKING:
+        return None
+    with _ranker_lock:
+        if _ranker is None:
+            _ranker = ResultRanker()
+        return _ranker
@@ -3,9 +3,13 @@ security.py
 Input validation and security controls.
 """
 
+import functools
 import re
 from typing import Dict, Tuple
 
+from metrics import SANITIZED_INPUTS
+from tracing import current_span, span
+
 # Blocked patterns that indicate prompt injection attempts
 INJECTION_PATTERNS = [
     r"ignore\s+(all\s+)?previous\s+instructions?",
@@ -43,12 +47,32 @@ MAX_BUSINESS_DESCRIPTION_LENGTH = 1000
 MAX_ANSWER_LENGTH = 500
 MAX_SEARCHES_PER_SESSION = 20
 
+# File security events are appended to (read by security_dashboard.py)
+SECURITY_LOG_PATH = "security_log.txt"
+
+def _traced_check(method):
+    """Run a check as a "security.<name>" span recording its verdict."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with span(f"security.{method.__name__}") as check:
+            result = method(self, *args, **kwargs)
+            if isinstance(result, tuple):
+                check.set("valid", result[0])
+                if not result[0]:
+                    check.set("reason", result[1])
+            return result
+    return wrapper
+
+
 class SecurityValidator:
     """Validates and sanitizes user inputs."""
     
+    __slots__ = ('search_count',)
+    
     def __init__(self):
         self.search_count = 0
     
+    @_traced_check
     def validate_business_description(self, description: str) -> Tuple[bool, str]:
         """
         Validate business description input.
@@ -93,6 +117,7 @@ class SecurityValidator:
         
         return True, ""
     
+    @_traced_check
     def validate_answer(self, answer: str) -> Tuple[bool, str]:
         """
         Validate clarifying question answers.
@@ -126,6 +151,8 @@ class SecurityValidator:
         """
         Sanitize user input by removing potentially harmful content.
         """
+        # Called per answer, search result and page excerpt: counted, not traced
+        original = text
         # Remove null bytes
         text = text.replace('\x00', '')
         
@@ -138,8 +165,11 @@ class SecurityValidator:
         # Limit consecutive special characters
         text = re.sub(r'([<>{}[\]\\|]){3,}', '', text)
         
-        return text.strip()
+        text = text.strip()
+        SANITIZED_INPUTS.inc(changed=str(text != original).lower())
+        return text
     
+    @_traced_check
     def check_rate_limit(self) -> Tuple[bool, str]:
         """
         Check if user has exceeded search rate limits.
@@ -151,6 +181,7 @@ class SecurityValidator:
         
         return True, ""
     
+    @_traced_check
     def validate_interpretation(self, interpretation: Dict) -> Tuple[bool, str]:
         """
         Validate AI interpretation results to prevent manipulation.
@@ -196,6 +227,7 @@ def log_security_event(event_type: str, details: str):
     """
     import datetime
     timestamp = datetime.datetime.now().isoformat()
+    current_span().add_event(f"security.{event_type}", {"details": details})
     
     # Console output
     print(f"\n⚠️  SECURITY EVENT [{timestamp}]")
@@ -204,7 +236,7 @@ def log_security_event(event_type: str, details: str):
     
     # File logging
     try:
-        with open("security_log.txt", "a", encoding="utf-8") as f:
+        with open(SECURITY_LOG_PATH, "a", encoding="utf-8") as f:
             f.write(f"{timestamp} | {event_type} | {details}\n")
     except Exception as e:
         print(f"Failed to write security log: {e}")
\ No newline at end of file
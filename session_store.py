@@ -0,0 +1,233 @@
+"""
+session_store.py
+Shared, interned store for per-session interpretations and regulations.
+
+Streamlit sessions keep only a session id in st.session_state; the heavy
+data lives here, deduplicated across sessions and evicted when idle.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+from records import Interpretation, RegulationSet
+
+# Seconds of inactivity before a session's data is dropped
+SESSION_IDLE_TIMEOUT = int(os.environ.get("SESSION_IDLE_TIMEOUT", 1800))
+
+# Minimum seconds between eviction sweeps
+EVICTION_INTERVAL = 60
+
+
+def record_id(record) -> str:
+    """Content-derived ID so identical records are shared between sessions."""
+    digest = hashlib.sha1(repr(record.key()).encode("utf-8")).hexdigest()
+    return f"{type(record).__name__[0].lower()}{digest[:16]}"
+
+
+def deep_size(obj, seen=None) -> int:
+    """Approximate memory footprint of an object graph in bytes."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    for slot in getattr(type(obj), '__slots__', ()):
+        if slot != '__weakref__' and hasattr(obj, slot):
+            size += deep_size(getattr(obj, slot), seen)
+    return size
+
+
+class _SessionEntry:
+    __slots__ = ('interpretation', 'regulations', 'slices', 'last_seen')
+
+    def __init__(self, now: float):
+        self.interpretation: Optional[Interpretation] = None
+        self.regulations: Optional[RegulationSet] = None
+        self.slices = None
+        self.last_seen = now
+
+
+class SessionStore:
+    """Holds session data as interned records, evicting idle sessions."""
+
+    def __init__(self, idle_timeout: int = SESSION_IDLE_TIMEOUT, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _SessionEntry] = {}
+        # Records stay alive only while some session references them.
+        self._records = weakref.WeakValueDictionary()
+        self._last_sweep = clock()
+        self.evicted_total = 0
+
+    # ------------------------------------------------------------------
+    # Interning
+    # ------------------------------------------------------------------
+
+    def _intern(self, record):
+        rid = record_id(record)
+        existing = self._records.get(rid)
+        if existing is not None:
+            return existing
+        self._records[rid] = record
+        return record
+
+    def _intern_regulations(self, data: Dict) -> RegulationSet:
+        parsed = RegulationSet.from_dict(data)
+        regulations = tuple(self._intern(r) for r in parsed.regulations)
+        return self._intern(RegulationSet(regulations, parsed.search_metadata))
+
+    # ------------------------------------------------------------------
+    # Session lifecycle
+    # ------------------------------------------------------------------
+
+    def touch(self, session_id: str) -> bool:
+        """
+        Mark a session as active.
+
+        Returns:
+            True if the session already existed, False if it is new or was evicted
+        """
+        with self._lock:
+            now = self._clock()
+            if now - self._last_sweep >= EVICTION_INTERVAL:
+                self._evict_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                self._sessions[session_id] = _SessionEntry(now)
+                return False
+            entry.last_seen = now
+            return True
+
+    def clear(self, session_id: str, keep_slices: bool = False):
+        """Drop a session's data; keep_slices keeps its per-slice search results for a re-search."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if keep_slices and entry is not None and entry.slices is not None:
+                self._entry(session_id).slices = entry.slices
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            return self._evict_idle(self._clock())
+
+    def _evict_idle(self, now: float) -> int:
+        self._last_sweep = now
+        expired = [sid for sid, entry in self._sessions.items()
+                   if now - entry.last_seen > self.idle_timeout]
+        for sid in expired:
+            del self._sessions[sid]
+        self.evicted_total += len(expired)
+        return len(expired)
+
+    def _entry(self, session_id: str) -> _SessionEntry:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[session_id] = _SessionEntry(self._clock())
+        return entry
+
+    # ------------------------------------------------------------------
+    # Data access (dicts in, dicts out)
+    # ------------------------------------------------------------------
+
+    def put_interpretation(self, session_id: str, interpretation: Dict) -> str:
+        with self._lock:
+            record = self._intern(Interpretation.from_dict(interpretation))
+            self._entry(session_id).interpretation = record
+            return record_id(record)
+
+    def get_interpretation(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry.interpretation is None:
+                return None
+            return entry.interpretation.to_dict()
+
+    def put_regulations(self, session_id: str, regulations: Dict) -> str:
+        with self._lock:
+            record = self._intern_regulations(regulations)
+            self._entry(session_id).regulations = record
+            return record_id(record)
+
+    def get_regulations(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry.regulations is None:
+                return None
+            return entry.regulations.to_dict()
+
+    def slice_cache(self, session_id: str):
+        """The session's slice_cache.SliceCache, created on first use."""
+        from slice_cache import SliceCache
+        with self._lock:
+            entry = self._entry(session_id)
+            if entry.slices is None:
+                entry.slices = SliceCache()
+            return entry.slices
+
+    def clear_regulations(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry.regulations = None
+
+    # ------------------------------------------------------------------
+    # Gauge
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by session entries and interned records."""
+        with self._lock:
+            seen = set()
+            total = deep_size(self._sessions, seen)
+            total += sum(deep_size(record, seen) for record in list(self._records.values()))
+            return total
+
+    def gauge(self) -> Dict:
+        memory = self.memory_bytes()
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "interned_records": len(self._records),
+                "evicted_total": self.evicted_total,
+                "memory_bytes": memory,
+            }
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide store shared by all sessions."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore()
+            _register_gauges(_store)
+        return _store
+
+
+def _register_gauges(store: SessionStore):
+    from metrics import REGISTRY
+    REGISTRY.gauge(
+        "compliance_session_state_bytes", "Approximate memory held by session state"
+    ).set_function(store.memory_bytes)
+    REGISTRY.gauge(
+        "compliance_sessions", "Sessions currently held in the session store"
+    ).set_function(lambda: len(store))
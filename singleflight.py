@@ -0,0 +1,119 @@
+"""
+singleflight.py
+Coalesces identical in-flight calls: the first caller runs, duplicates wait for its result.
+
+    result, shared = get_search_flight().do(search_key(query, 5), lambda: live_search(query, 5))
+"""
+
+import re
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import CACHE_HITS
+
+# Operators whose meaning depends on word order or position
+_ORDER_SENSITIVE = re.compile(r'["\'()]|\b(?:OR|AND|NOT|AROUND)\b|(?:^|\s)[-+~]\S|\w+:\S')
+
+
+def normalize_query(query: str) -> str:
+    """
+    Key under which two search queries return the same results.
+
+    Case and whitespace are ignored. Word order is ignored too, unless the
+    query contains phrases, boolean operators, exclusions or site:/filetype:
+    style filters, where order or adjacency changes the results.
+    """
+    text = " ".join((query or "").split())
+    if _ORDER_SENSITIVE.search(text):
+        return text.lower()
+    words = re.findall(r"[\w.§/-]+", text.lower())
+    return " ".join(sorted(words))
+
+
+def search_key(query: str, num_results: int = 5) -> str:
+    return f"{num_results}|{normalize_query(query)}"
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], object]) -> Tuple[object, bool]:
+        """
+        Run fn() unless a call with the same key is in flight, in which case
+        wait for that call instead. Exceptions are shared like results.
+
+        Returns:
+            (result, shared) where shared is True for callers that waited
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            CACHE_HITS.inc(cache=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Forget the key first so later callers start a fresh request
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.executed + self.coalesced
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "saved_ratio": round(self.coalesced / total, 3) if total else 0.0,
+            }
+
+
+_search_flight: Optional[SingleFlight] = None
+_flight_lock = threading.Lock()
+
+
+def get_search_flight() -> SingleFlight:
+    """Process-wide coalescer for search_web_tool, shared by all sessions."""
+    global _search_flight
+    with _flight_lock:
+        if _search_flight is None:
+            _search_flight = SingleFlight("search_singleflight")
+        return _search_flight
@@ -0,0 +1,180 @@
+"""
+slice_cache.py
+Per-session search results kept per (regulation type, country) slice.
+
+When a session searches again with a slightly different interpretation
+(one more country, one more regulation type), only the slices that are new
+or stale are searched; the rest come from the previous results. A changed
+business domain (below the prefetch similarity threshold) starts over.
+
+Regulations are filed under the searched country they belong to. Those that
+match none of the searched countries (EU-wide rules, for instance) are filed
+under every country of that search, and every regulation under every
+searched type, since results do not say which type found them.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from knowledge_base import normalize_jurisdiction
+from metrics import CACHE_HITS
+from prefetch import (
+    DOMAIN_SIMILARITY_THRESHOLD,
+    SEARCHED_COUNTRIES,
+    SPECULATIVE_WORKERS,
+    _default_search,
+    cancelled,
+    domain_similarity,
+    merge_results,
+)
+from tracing import bind
+
+# Slices older than this are searched again
+SLICE_CACHE_MAX_AGE_MINUTES = float(os.environ.get("SLICE_CACHE_MAX_AGE_MINUTES", 60))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Separate from the prefetch pool: speculative searches run this from its workers
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix="slice_search")
+        return _executor
+
+
+def _type_key(value: str) -> str:
+    return " ".join((value or "").lower().split())
+
+
+class SliceCache:
+    """Regulations found for one business, per (type, country) slice."""
+
+    __slots__ = ('domain', 'slices', 'max_age', '_clock', '_lock')
+
+    def __init__(self, max_age_minutes: float = SLICE_CACHE_MAX_AGE_MINUTES, clock=time.time):
+        self.domain = ""
+        # (type, country) -> {"regulations": [...], "searched_at": seconds}
+        self.slices: Dict[Tuple[str, str], Dict] = {}
+        self.max_age = max_age_minutes * 60
+        self._clock = clock
+        # Speculative and delta searches store from worker threads
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.slices)
+
+    def _matches(self, domain: str) -> bool:
+        return bool(self.slices) and domain_similarity(self.domain, domain) >= DOMAIN_SIMILARITY_THRESHOLD
+
+    def store(self, domain: str, regulation_types: Sequence[str], countries: Sequence[str], result: Dict):
+        """File a complete search result under its slices (partial, failed or discarded ones are ignored)."""
+        meta = result.get('search_metadata', {})
+        # A discarded speculative search must not replace the refined domain's slices
+        if meta.get('partial') or 'error' in meta or cancelled():
+            return
+        with self._lock:
+            self._store(domain, regulation_types, countries, result)
+
+    def _store(self, domain, regulation_types, countries, result):
+        if not self._matches(domain):
+            self.slices.clear()
+        self.domain = domain
+
+        countries = list(countries)[:SEARCHED_COUNTRIES]
+        by_country = {normalize_jurisdiction(c): [] for c in countries}
+        shared = []
+        for reg in result.get('regulations', []):
+            bucket = by_country.get(normalize_jurisdiction(reg.get('country_region')))
+            (shared if bucket is None else bucket).append(reg)
+
+        now = self._clock()
+        for country in countries:
+            regulations = by_country[normalize_jurisdiction(country)] + shared
+            for regulation_type in regulation_types:
+                self.slices[(_type_key(regulation_type), normalize_jurisdiction(country))] = {
+                    "regulations": regulations,
+                    "searched_at": now,
+                }
+
+    def plan(self, domain: str, regulation_types: Sequence[str],
+             countries: Sequence[str]) -> Tuple[List[Dict], List[Tuple[List[str], List[str]]], int]:
+        """
+        Split a search into cached regulations and the searches still needed.
+
+        Returns:
+            (cached regulations, [(types, countries), ...] to search, slices reused)
+        """
+        countries = list(countries)[:SEARCHED_COUNTRIES]
+        with self._lock:
+            return self._plan(domain, regulation_types, countries)
+
+    def _plan(self, domain, regulation_types, countries):
+        if not self._matches(domain):
+            return [], [(list(regulation_types), countries)], 0
+
+        now = self._clock()
+        cached, reused = [], 0
+        # Countries missing the same types are searched together
+        missing: Dict[Tuple[str, ...], List[str]] = {}
+        for country in countries:
+            lacking = []
+            for regulation_type in regulation_types:
+                entry = self.slices.get((_type_key(regulation_type), normalize_jurisdiction(country)))
+                if entry is None or now - entry["searched_at"] > self.max_age:
+                    lacking.append(regulation_type)
+                else:
+                    cached.extend(entry["regulations"])
+                    reused += 1
+            if lacking:
+                missing.setdefault(tuple(lacking), []).append(country)
+        return cached, [(list(types), group) for types, group in missing.items()], reused
+
+
+def incremental_search(cache: SliceCache, detected_domain: str, regulation_types: Sequence[str],
+                       countries: Sequence[str], search_fn: Optional[Callable] = None) -> Dict:
+    """
+    Search only the slices the cache lacks and merge them with the cached ones.
+
+    search_metadata.incremental reports {"reused_slices", "searched_slices"}.
+    """
+    search_fn = search_fn or _default_search
+    cached, searches, reused = cache.plan(detected_domain, regulation_types, countries)
+
+    if len(searches) > 1:
+        futures = [_get_executor().submit(bind(search_fn), detected_domain, types, group)
+                   for types, group in searches]
+        found = [future.result() for future in futures]
+    else:
+        found = [search_fn(detected_domain, types, group) for types, group in searches]
+    for (types, group), one in zip(searches, found):
+        cache.store(detected_domain, types, group, one)
+
+    if not reused and len(found) == 1:
+        # Nothing cached: the single full search is the result
+        result = found[0]
+    else:
+        result = {"regulations": [], "search_metadata": {"searches_performed": 0, "official_sources_found": 0}}
+        result = merge_results(result, {"regulations": cached})
+        for one in found:
+            meta = one.get('search_metadata', {})
+            if 'error' in meta:
+                result['search_metadata']['error'] = meta['error']
+            result = merge_results(result, one)
+        result['search_metadata']['partial'] = any(one.get('search_metadata', {}).get('partial') for one in found)
+        result['search_metadata'].setdefault('search_date', time.strftime('%Y-%m-%d'))
+
+    meta = result.setdefault('search_metadata', {})
+    meta['incremental'] = {
+        "reused_slices": reused,
+        "searched_slices": sum(len(types) * len(group) for types, group in searches),
+    }
+    if reused:
+        CACHE_HITS.inc(cache="search_slices")
+    return result
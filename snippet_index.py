@@ -0,0 +1,201 @@
+"""
+snippet_index.py
+Local BM25 index over search results already fetched, used before the live API.
+
+Every live search_web_tool result (title, snippet, link) is added as it
+arrives. A later query is answered locally when enough fresh documents
+match most of its terms; otherwise it falls through to Google.
+
+While Google is unavailable, stale_answer() also serves expired results
+and remembers the query so it can be searched again once Google is back.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Set SNIPPET_INDEX=0 to always search live
+SNIPPET_INDEX = os.environ.get("SNIPPET_INDEX", "1") != "0"
+# Results older than this are not served locally
+SNIPPET_INDEX_MAX_AGE_HOURS = float(os.environ.get("SNIPPET_INDEX_MAX_AGE_HOURS", 72))
+# Fraction of query terms a result must contain to count as a hit
+SNIPPET_INDEX_MIN_COVERAGE = float(os.environ.get("SNIPPET_INDEX_MIN_COVERAGE", 0.75))
+# Local hits needed before the live API is skipped
+SNIPPET_INDEX_MIN_HITS = int(os.environ.get("SNIPPET_INDEX_MIN_HITS", 3))
+# Oldest results are dropped beyond this many documents
+SNIPPET_INDEX_MAX_DOCS = int(os.environ.get("SNIPPET_INDEX_MAX_DOCS", 20000))
+
+# Stale-served queries remembered for revalidation
+MAX_STALE_QUERIES = 200
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or the to with "
+    "what which how new current latest".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9§]+", (text or "").lower()) if t not in _STOPWORDS]
+
+
+class _Document:
+    __slots__ = ('result', 'terms', 'length', 'added')
+
+    def __init__(self, result: Dict, terms: Counter, added: float):
+        self.result = result
+        self.terms = terms
+        self.length = sum(terms.values())
+        self.added = added
+
+
+class SnippetIndex:
+    """Inverted index with BM25 scoring, one document per result link."""
+
+    def __init__(self, max_age_hours: float = SNIPPET_INDEX_MAX_AGE_HOURS,
+                 min_coverage: float = SNIPPET_INDEX_MIN_COVERAGE, min_hits: int = SNIPPET_INDEX_MIN_HITS,
+                 max_docs: int = SNIPPET_INDEX_MAX_DOCS, clock=time.time):
+        self.max_age = max_age_hours * 3600
+        self.min_coverage = min_coverage
+        self.min_hits = min_hits
+        self.max_docs = max_docs
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._docs: "OrderedDict[str, _Document]" = OrderedDict()   # oldest first
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        # (query, num_results) served stale, oldest first
+        self._stale: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # Indexing
+    # ------------------------------------------------------------------
+
+    def add_results(self, results: List[Dict]) -> int:
+        """Index (or refresh) each result by its link."""
+        now = self._clock()
+        added = 0
+        with self._lock:
+            for result in results:
+                link = result.get('link')
+                if not link:
+                    continue
+                terms = Counter(tokenize(f"{result.get('title', '')} {result.get('snippet', '')}"))
+                if not terms:
+                    continue
+                self._remove(link)
+                doc = self._docs[link] = _Document(dict(result), terms, now)
+                self._total_length += doc.length
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[link] = tf
+                added += 1
+            while len(self._docs) > self.max_docs:
+                self._remove(next(iter(self._docs)))
+        return added
+
+    def _remove(self, link: str):
+        doc = self._docs.pop(link, None)
+        if doc is None:
+            return
+        self._total_length -= doc.length
+        for term in doc.terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(link, None)
+                if not posting:
+                    del self._postings[term]
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, limit: int = 5, include_expired: bool = False) -> List[Dict]:
+        """Fresh (or, with include_expired, all) results ranked by BM25, each with its score and query-term coverage."""
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return []
+        cutoff = float("-inf") if include_expired else self._clock() - self.max_age
+        with self._lock:
+            n = len(self._docs)
+            if not n:
+                return []
+            avg_length = self._total_length / n
+            scores: Dict[str, float] = {}
+            matched: Dict[str, int] = {}
+            for term in query_terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for link, tf in posting.items():
+                    doc = self._docs[link]
+                    if doc.added < cutoff:
+                        continue
+                    norm = K1 * (1 - B + B * doc.length / avg_length)
+                    scores[link] = scores.get(link, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+                    matched[link] = matched.get(link, 0) + 1
+            ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+            return [dict(self._docs[link].result,
+                         score=round(scores[link], 3),
+                         coverage=round(matched[link] / len(query_terms), 3))
+                    for link in ranked]
+
+    def answer(self, query: str, num_results: int = 5) -> Optional[List[Dict]]:
+        """Local results good enough to skip the live API, or None."""
+        hits = [r for r in self.search(query, num_results) if r['coverage'] >= self.min_coverage]
+        if len(hits) < min(self.min_hits, num_results):
+            return None
+        return hits
+
+    def stale_answer(self, query: str, num_results: int = 5) -> Optional[List[Dict]]:
+        """
+        Matching results of any age, for when the live API is down, or None.
+
+        The query is remembered until take_stale() hands it out for revalidation.
+        """
+        hits = [r for r in self.search(query, num_results, include_expired=True)
+                if r['coverage'] >= self.min_coverage]
+        if not hits:
+            return None
+        self.mark_stale(query, num_results)
+        return hits
+
+    def mark_stale(self, query: str, num_results: int = 5):
+        """Remember a query whose results need searching again."""
+        with self._lock:
+            self._stale.pop((query, num_results), None)
+            self._stale[(query, num_results)] = None
+            while len(self._stale) > MAX_STALE_QUERIES:
+                self._stale.popitem(last=False)
+
+    def take_stale(self) -> List[Tuple[str, int]]:
+        """The (query, num_results) pairs served stale since the last call, oldest first."""
+        with self._lock:
+            pending = list(self._stale)
+            self._stale.clear()
+        return pending
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+
+_index: Optional[SnippetIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_snippet_index() -> Optional[SnippetIndex]:
+    """Process-wide index shared by all sessions, or None when SNIPPET_INDEX=0."""
+    global _index
+    if not SNIPPET_INDEX:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = SnippetIndex()
+        return _index
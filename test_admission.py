@@ -0,0 +1,99 @@
+"""
+test_admission.py
+Test fair queuing, quota budgets and request backpressure in admission control.
+"""
+
+import threading
+import time
+
+from admission import AdmissionController, Gate, Overloaded, as_tenant
+
+
+def queue_behind(gate, order, name, tenant, priority):
+    """Start a thread whose call queues at the gate; return once it is waiting."""
+    waiting = gate.waiting()
+
+    def call():
+        with as_tenant(tenant, priority), gate.acquire():
+            order.append(name)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    while gate.waiting() == waiting:
+        time.sleep(0.001)
+    return thread
+
+
+def test_priorities_then_round_robin_across_tenants():
+    gate = Gate("llm", concurrency=1)
+    held = gate.acquire()
+    order = []
+    threads = [queue_behind(gate, order, name, tenant, priority) for name, tenant, priority in (
+        ("a1", "heavy", "normal"), ("a2", "heavy", "normal"), ("a3", "heavy", "normal"),
+        ("b1", "light", "normal"), ("batch", "batch", "low"), ("ui", "session", "high"),
+    )]
+    held.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["ui", "a1", "b1", "a2", "a3", "batch"]
+
+
+def test_token_budget_waits_and_is_corrected_by_actual_usage():
+    gate = Gate("llm", concurrency=10, per_minute=60000)   # 1000 tokens a second
+    with gate.acquire(60000) as permit:
+        permit.actual_cost = 30000                          # the call used half its estimate
+    assert gate.acquire(20000).waited < 0.1
+
+    start = time.monotonic()
+    permit = gate.acquire(10500)
+    assert permit.waited >= 0.3 and time.monotonic() - start < 2
+
+
+def test_timeout_leaves_the_queue():
+    gate = Gate("search", concurrency=1)
+    held = gate.acquire()
+    try:
+        gate.acquire(timeout=0.05)
+        assert False, "expected TimeoutError"
+    except TimeoutError:
+        pass
+    assert gate.waiting() == 0
+    held.release()
+    gate.acquire(timeout=0.05).release()
+
+
+def test_new_requests_are_turned_away_when_full():
+    controller = AdmissionController(llm_concurrency=1, max_queue=2, max_per_tenant=2)
+    first, second = controller.admit("crm"), controller.admit("crm")
+    try:
+        controller.admit("crm")
+        assert False, "expected Overloaded"
+    except Overloaded as e:
+        assert e.retry_after >= 1
+    first.release()
+    first.release()
+    assert controller.active("crm") == 1
+    controller.admit("crm").release()
+    second.release()
+
+    held = controller.llm.acquire()
+    order = []
+    threads = [queue_behind(controller.llm, order, f"call{i}", "crm", "normal") for i in range(2)]
+    try:
+        controller.admit("billing")
+        assert False, "expected Overloaded"
+    except Overloaded:
+        pass
+    held.release()
+    for thread in threads:
+        thread.join(5)
+    assert controller.admit("billing").position == 0
+
+
+if __name__ == "__main__":
+    for test in (test_priorities_then_round_robin_across_tenants,
+                 test_token_budget_waits_and_is_corrected_by_actual_usage,
+                 test_timeout_leaves_the_queue,
+                 test_new_requests_are_turned_away_when_full):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
@@ -0,0 +1,130 @@
+"""
+test_api_server.py
+Test the HTTP API: keys, synchronous routes, jobs and streamed results.
+"""
+
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from api_server import APIServer
+
+INTERPRETATION = {
+    "detected_domain": "Expense management software for B2B clients",
+    "regulation_types": ["tax"],
+    "detected_regions": ["EU"],
+    "suggested_countries": ["Germany"],
+    "confidence": "high",
+    "clarifying_questions": [],
+}
+
+DESCRIPTION = "We build expense management software for B2B clients in Germany."
+
+
+def fake_search(release=None):
+    def search(interpretation):
+        if release is not None:
+            release.wait(5)
+        return {"regulations": [{"regulation_name": "GoBD", "country_region": c}
+                                for c in interpretation["suggested_countries"]],
+                "search_metadata": {"searches_performed": 1, "partial": False}}
+    return search
+
+
+def server_with(search, heartbeat=15):
+    return APIServer(keys={"k-crm": "crm", "k-billing": "billing"}, workers=2,
+                     interpret_fn=lambda description: dict(INTERPRETATION),
+                     refine_fn=lambda description, interpretation, answers: dict(interpretation, confidence="high"),
+                     search_fn=search, heartbeat=heartbeat).start()
+
+
+def test_keys_and_synchronous_routes():
+    server = server_with(fake_search())
+    try:
+        with httpx.Client(base_url=server.url) as client:
+            assert client.get("/v1/health").status_code == 200
+            assert client.post("/v1/interpret", json={"description": DESCRIPTION}).status_code == 401
+            assert client.post("/v1/interpret", json={"description": DESCRIPTION},
+                               headers={"X-API-Key": "wrong"}).status_code == 401
+
+            auth = {"Authorization": "Bearer k-crm"}
+            assert client.post("/v1/validate", json={"description": " "}, headers=auth).json()["valid"] is False
+            assert client.post("/v1/interpret", json={"description": " "}, headers=auth).status_code == 422
+            interpretation = client.post("/v1/interpret", json={"description": DESCRIPTION}, headers=auth).json()
+            assert interpretation == INTERPRETATION
+            refined = client.post("/v1/refine", headers=auth, json={
+                "description": DESCRIPTION, "interpretation": interpretation, "answers": {"Payments?": "No"}})
+            assert refined.status_code == 200
+
+            result = client.post("/v1/search", json={"interpretation": interpretation}, headers=auth).json()
+            assert [r["country_region"] for r in result["regulations"]] == ["Germany"]
+            assert client.post("/v1/search", json={"interpretation": {"regulation_types": "tax"}},
+                               headers=auth).status_code == 422
+            assert client.get("/v1/nowhere", headers=auth).status_code == 404
+    finally:
+        server.stop()
+
+
+def test_oversized_header_is_answered_not_dropped():
+    server = server_with(fake_search())
+    try:
+        url = urlsplit(server.url)
+        with socket.create_connection((url.hostname, url.port), timeout=5) as sock:
+            sock.sendall(b"GET /v1/health HTTP/1.1\r\nX-Padding: " + b"a" * 70000 + b"\r\n\r\n")
+            response = b""
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                response += chunk
+        assert response.startswith(b"HTTP/1.1 431 ")
+        assert b"too long" in response
+        with httpx.Client(base_url=server.url) as client:
+            assert client.get("/v1/health").status_code == 200
+    finally:
+        server.stop()
+
+
+def test_jobs_stream_their_regulations_to_their_own_client():
+    release = threading.Event()
+    server = server_with(fake_search(release), heartbeat=0.05)
+    try:
+        with httpx.Client(base_url=server.url, timeout=10) as client:
+            crm, billing = {"X-API-Key": "k-crm"}, {"X-API-Key": "k-billing"}
+            response = client.post("/v1/jobs", json={"description": DESCRIPTION}, headers=crm)
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+            assert client.get(f"/v1/jobs/{job_id}", headers=billing).status_code == 404
+
+            # The server keeps answering while the job's search is blocked
+            assert client.get(f"/v1/jobs/{job_id}", headers=crm).json()["status"] in ("queued", "running")
+            threading.Timer(0.2, release.set).start()
+            with client.stream("GET", f"/v1/jobs/{job_id}/regulations",
+                               headers=dict(crm, Accept="application/x-ndjson")) as stream:
+                events = [json.loads(line) for line in stream.iter_lines() if line]
+            assert events[0]["type"] == "status"
+            assert [e["type"] for e in events if e["type"] != "status"] == ["regulation", "done"]
+
+            deadline = time.time() + 5
+            while client.get(f"/v1/jobs/{job_id}", headers=crm).json()["status"] != "ok" and time.time() < deadline:
+                time.sleep(0.02)
+            job = client.get(f"/v1/jobs/{job_id}", headers=crm).json()
+            assert job["regulations"][0]["regulation_name"] == "GoBD" and job["interpretation"] == INTERPRETATION
+
+            with client.stream("POST", "/v1/search", json={"interpretation": INTERPRETATION},
+                               headers=dict(crm, Accept="text/event-stream")) as stream:
+                body = "".join(stream.iter_text())
+            assert body.startswith("event: regulation\ndata: ") and "event: done" in body
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    for test in (test_keys_and_synchronous_routes, test_oversized_header_is_answered_not_dropped,
+                 test_jobs_stream_their_regulations_to_their_own_client):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
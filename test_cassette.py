@@ -0,0 +1,126 @@
+"""
+test_cassette.py
+Test that a recorded search replays offline with the same result and timing.
+"""
+
+import json
+import os
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+import llm_gateway
+import search_module
+from cassette import Cassette, CassetteMiss
+from llm_gateway import LLMGateway
+from openai.types.chat import ChatCompletion
+
+REPLY = {
+    "regulations": [],
+    "search_metadata": {"searches_performed": 1, "official_sources_found": 0, "search_date": "2026-01-01"},
+}
+
+
+def completion(message):
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 1, "model": "gpt-4o",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": dict(message, role="assistant")}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+    })
+
+
+class ScriptedClient:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.chat = self.completions = self
+
+    def create(self, timeout=None, **kwargs):
+        return self.responses.pop(0)
+
+
+class OfflineClient:
+    """Fails the test if replay reaches the network."""
+
+    @property
+    def chat(self):
+        raise AssertionError("replay called the OpenAI API")
+
+
+@contextmanager
+def patch_attr(module, name, value):
+    saved = getattr(module, name)
+    setattr(module, name, value)
+    try:
+        yield
+    finally:
+        setattr(module, name, saved)
+
+
+def run_search(cassette, client, live_search):
+    gateway = LLMGateway(client=client)
+    with ExitStack() as stack:
+        stack.enter_context(patch_attr(llm_gateway, "get_cassette", lambda: cassette))
+        stack.enter_context(patch_attr(search_module, "get_cassette", lambda: cassette))
+        stack.enter_context(patch_attr(search_module, "get_gateway", lambda: gateway))
+        stack.enter_context(patch_attr(search_module, "get_knowledge_base", lambda: None))
+        stack.enter_context(patch_attr(search_module, "_search_web_tool", live_search))
+        return search_module.search_regulations_with_function_calling("payroll software", ["employment"], ["Germany"])
+
+
+def test_record_then_replay_offline():
+    tool_call = {"content": None, "tool_calls": [{
+        "id": "call_1", "type": "function",
+        "function": {"name": "search_web_tool", "arguments": json.dumps({"query": "minimum wage Germany 2026"})},
+    }]}
+    searches = []
+
+    def live_search(query, num_results):
+        searches.append(query)
+        return {"success": True, "query": query, "results": [], "total_found": 0, "tier": "live"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cassette.jsonl")
+        recorder = Cassette(path, "record")
+        recorded = run_search(recorder, ScriptedClient([completion(tool_call),
+                                                        completion({"content": json.dumps(REPLY)})]), live_search)
+        recorder.close()
+        with open(path, encoding="utf-8") as f:
+            assert [json.loads(line)["kind"] for line in f] == ["chat", "search", "chat"]
+
+        sleeps = []
+        player = Cassette(path, "replay", latency_scale=2.0, sleep=sleeps.append)
+
+        def no_live_search(query, num_results):
+            raise AssertionError("replay called Google")
+
+        replayed = run_search(player, OfflineClient(), no_live_search)
+
+    assert searches == ["minimum wage Germany 2026"]
+    assert replayed["regulations"] == recorded["regulations"]
+    assert replayed["search_metadata"]["search_tiers"] == {"live": 1}
+    assert len(sleeps) == 3 and player.unused() == []
+    assert player.misses == 0 and player.key_mismatches == 0
+
+
+def test_strict_replay_rejects_unrecorded_requests():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cassette.jsonl")
+        recorder = Cassette(path, "record")
+        recorder.search("GDPR fines", 5, lambda: {"success": True, "results": []})
+        recorder.close()
+
+        lenient = Cassette(path, "replay", latency_scale=0)
+        assert lenient.search("GDPR fines 2026", 5, None)["success"] is True
+        assert lenient.key_mismatches == 1
+
+        strict = Cassette(path, "replay", latency_scale=0, strict=True)
+        try:
+            strict.search("GDPR fines 2026", 5, None)
+            assert False, "expected CassetteMiss"
+        except CassetteMiss:
+            pass
+
+
+if __name__ == "__main__":
+    for test in (test_record_then_replay_offline, test_strict_replay_rejects_unrecorded_requests):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
@@ -0,0 +1,175 @@
+"""
+test_circuit_breaker.py
+Test the breaker state machine, gateway fail-fast and stale search results.
+"""
+
+from types import SimpleNamespace
+
+import search_module
+from admission import QueueTimeout
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from llm_gateway import LLMGateway
+from metrics import SEARCH_TIER
+from snippet_index import SnippetIndex
+from test_llm_gateway import FakeClient, status_error
+from test_search_module import ScriptedGateway, content_message, patched, tool_call_message
+
+RESULTS = [
+    {"title": "GDPR enforcement in Germany", "link": "https://a.de/1",
+     "snippet": "Fines under GDPR by German authorities.", "source": "a.de"},
+    {"title": "GDPR fines Germany", "link": "https://b.de/2",
+     "snippet": "Enforcement statistics for Germany.", "source": "b.de"},
+]
+
+
+def test_opens_after_failures_and_probes_after_cooldown():
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold=3, cooldown=30, clock=lambda: now[0])
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()                      # the count is of consecutive failures
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()                    # one probe at a time
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_gateway_fails_fast_while_open_and_ignores_client_errors():
+    breaker = CircuitBreaker("openai", failure_threshold=2, cooldown=60)
+    client = FakeClient([status_error(400), status_error(400), status_error(503), status_error(503)])
+    gateway = LLMGateway(client=client, max_retries=0, sleep=lambda _: None, breaker=breaker)
+    for _ in range(4):
+        try:
+            gateway.chat(stage="interpret", model="gpt-4o", messages=[])
+        except Exception:
+            pass
+    assert breaker.state == "open"
+    try:
+        gateway.chat(stage="interpret", model="gpt-4o", messages=[])
+        assert False, "expected CircuitOpenError"
+    except CircuitOpenError:
+        pass
+    assert client.calls == 4
+
+
+def test_search_serves_stale_results_then_revalidates():
+    now = [0.0]
+    index = SnippetIndex(max_age_hours=1, clock=lambda: now[0])
+    index.add_results(RESULTS)
+    now[0] += 7200                                # everything indexed has expired
+    breaker = CircuitBreaker("google_search", failure_threshold=1, cooldown=0)
+    calls = []
+
+    def google(query, num_results, cse_id):
+        calls.append(query)
+        if len(calls) == 1:
+            breaker.record_failure()
+            return {"success": False, "error": "503 Service Unavailable"}
+        breaker.record_success()
+        return {"success": True, "query": query, "total_found": 1,
+                "results": [dict(RESULTS[0], snippet=f"Fresh results for {query}")]}
+
+    saved = (search_module.get_snippet_index, search_module.get_breaker,
+             search_module.get_google_credentials, search_module._google_search)
+    search_module.get_snippet_index = lambda: index
+    search_module.get_breaker = lambda name: breaker
+    search_module.get_google_credentials = lambda: ("key", "cse")
+    search_module._google_search = google
+    try:
+        stale = search_module.search_web_tool("gdpr germany", num_results=5)
+        assert stale["success"] and stale["stale"] and stale["tier"] == "stale"
+        assert stale["total_found"] == 2
+
+        # Google answers again, which starts revalidating in the background
+        live = search_module.search_web_tool("e-invoicing france", num_results=5)
+        assert live["tier"] == "live"
+        assert search_module._revalidating.acquire(timeout=5)
+        search_module._revalidating.release()
+    finally:
+        (search_module.get_snippet_index, search_module.get_breaker,
+         search_module.get_google_credentials, search_module._google_search) = saved
+    assert calls == ["gdpr germany", "e-invoicing france", "gdpr germany"]
+    assert index.search("gdpr germany")[0]["snippet"] == "Fresh results for gdpr germany"
+    assert index.take_stale() == []
+
+
+def test_open_circuit_without_stale_results_is_not_counted_as_live():
+    breaker = CircuitBreaker("google_search", failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    before = SEARCH_TIER.value(tier="circuit_open"), SEARCH_TIER.value(tier="live")
+    with patched(get_snippet_index=lambda: SnippetIndex(), get_breaker=lambda name: breaker,
+                 get_google_credentials=lambda: ("key", "cse")):
+        result = search_module.search_web_tool("gdpr germany", num_results=5)
+    assert not result["success"] and result["tier"] == "circuit_open"
+    assert (SEARCH_TIER.value(tier="circuit_open"), SEARCH_TIER.value(tier="live")) == (before[0] + 1, before[1])
+
+
+def test_open_circuit_queries_are_searched_after_recovery():
+    index = SnippetIndex()
+    breaker = CircuitBreaker("google_search", failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    calls = []
+
+    def google(query, num_results, cse_id):
+        calls.append(query)
+        breaker.record_success()
+        return {"success": True, "query": query, "total_found": 1,
+                "results": [dict(RESULTS[0], snippet=f"Fresh results for {query}")]}
+
+    with patched(get_snippet_index=lambda: index, get_breaker=lambda name: breaker,
+                 get_google_credentials=lambda: ("key", "cse"), _google_search=google):
+        missed = search_module.search_web_tool("gdpr germany", num_results=5)
+        assert missed["tier"] == "circuit_open" and calls == []
+
+        breaker.record_success()                  # another caller's probe got through
+        search_module.search_web_tool("e-invoicing france", num_results=5)
+        assert search_module._revalidating.acquire(timeout=5)
+        search_module._revalidating.release()
+    assert calls == ["e-invoicing france", "gdpr germany"]
+    assert index.search("gdpr germany")[0]["snippet"] == "Fresh results for gdpr germany"
+
+
+class RecordingGate:
+    """A search gate that never has capacity, recording how long it was asked to wait."""
+
+    def __init__(self):
+        self.timeouts = []
+
+    def acquire(self, timeout=None):
+        self.timeouts.append(timeout)
+        raise QueueTimeout("No search capacity")
+
+
+def test_search_waits_for_admission_only_within_its_budget():
+    gate = RecordingGate()
+    gateway = ScriptedGateway([tool_call_message("gdpr germany"), content_message("done")])
+    with patched(get_gateway=lambda: gateway, get_snippet_index=lambda: None,
+                 get_breaker=lambda name: CircuitBreaker(name), get_google_credentials=lambda: ("key", "cse"),
+                 get_search_service=lambda: None, get_admission=lambda: SimpleNamespace(search=gate)):
+        budget = search_module.SearchBudget(deadline=5)
+        search_module.chat_with_function_calling([], [search_module.SEARCH_TOOL], budget=budget)
+        search_module.search_web_tool("gdpr france")
+    assert 0 < gate.timeouts[0] <= 5
+    assert gate.timeouts[1] == search_module.SEARCH_DEADLINE
+
+
+if __name__ == "__main__":
+    for test in (test_opens_after_failures_and_probes_after_cooldown,
+                 test_gateway_fails_fast_while_open_and_ignores_client_errors,
+                 test_search_serves_stale_results_then_revalidates,
+                 test_open_circuit_without_stale_results_is_not_counted_as_live,
+                 test_open_circuit_queries_are_searched_after_recovery,
+                 test_search_waits_for_admission_only_within_its_budget):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
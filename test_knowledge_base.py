@@ -0,0 +1,64 @@
+"""
+test_knowledge_base.py
+Test upserts, deduplication and indexed lookups in the knowledge base.
+"""
+
+from knowledge_base import KnowledgeBase, regulation_key
+
+GOBD = {
+    "regulation_name": "GoBD",
+    "full_name": "Principles for the proper keeping of books",
+    "effective_date": "2020-01-01",
+    "country_region": "Germany",
+    "description": "Digital bookkeeping rules.",
+    "impact_level": "high",
+    "key_requirements": ["immutable records"],
+    "deadline_type": "enacted",
+    "source": "https://www.bundesfinanzministerium.de",
+    "source_type": "official_government",
+    "confidence": "verified",
+}
+
+
+def test_upsert_deduplicates_by_name_and_jurisdiction():
+    kb = KnowledgeBase(":memory:")
+    assert kb.upsert([GOBD], "bookkeeping software", ["tax"], ["Germany"]) == 1
+    updated = dict(GOBD, regulation_name="GoBD ", description="Updated.")
+    kb.upsert([updated], "bookkeeping software", ["tax"], ["Germany"])
+    assert len(kb) == 1
+    assert regulation_key(GOBD) == regulation_key(dict(GOBD, regulation_name="gobd"))
+    assert kb.query(countries=["germany"])[0]["description"] == "Updated."
+
+    # Estimated or unsourced entries are not stored
+    assert kb.upsert([dict(GOBD, regulation_name="Rumour", confidence="estimated")], "x", ["tax"], ["Germany"]) == 0
+
+
+def test_query_by_country_type_date_and_coverage_expiry():
+    now = [1_000_000.0]
+    kb = KnowledgeBase(":memory:", max_age_days=1, clock=lambda: now[0])
+    eu = dict(GOBD, regulation_name="ViDA", country_region="EU", effective_date="2030-07-01")
+    kb.upsert([GOBD, eu], "bookkeeping software", ["tax"], ["Germany", "France"])
+    kb.mark_covered("bookkeeping software", ["tax"], ["Germany", "France"])
+
+    assert [r["regulation_name"] for r in kb.query(countries=["France"])] == ["ViDA"]
+    assert [r["regulation_name"] for r in kb.query(effective_after="2025-01-01")] == ["ViDA"]
+    assert kb.query(regulation_types=["employment"]) == []
+    assert kb.query(countries=["Germany"], domain="food delivery app") == []
+
+    known, missing = kb.lookup("bookkeeping software", ["tax", "employment"], ["Germany"])
+    assert len(known) == 2 and missing == [("employment", "Germany")]
+
+    # Callers can demand fresher coverage than the base keeps
+    now[0] += 3600
+    assert kb.lookup("bookkeeping software", ["tax"], ["Germany"], max_age=1800)[1] == [("tax", "Germany")]
+    assert kb.lookup("bookkeeping software", ["tax"], ["Germany"])[1] == []
+
+    now[0] += 2 * 86400
+    assert kb.lookup("bookkeeping software", ["tax"], ["Germany"])[1] == [("tax", "Germany")]
+
+
+if __name__ == "__main__":
+    for test in (test_upsert_deduplicates_by_name_and_jurisdiction,
+                 test_query_by_country_type_date_and_coverage_expiry):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
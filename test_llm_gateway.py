@@ -0,0 +1,97 @@
+"""
+test_llm_gateway.py
+Test retries, deadlines and hedging in the LLM gateway.
+"""
+
+import threading
+import time
+
+import httpx
+import openai
+
+from admission import as_tenant, current_tenant
+from llm_gateway import LLMGateway
+
+
+def status_error(status):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status, request=request)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+class Usage:
+    prompt_tokens = 10
+    completion_tokens = 5
+    prompt_tokens_details = {"cached_tokens": 8}
+
+
+class Response:
+    usage = Usage()
+
+
+class FakeClient:
+    """Mimics client.chat.completions.create with scripted outcomes."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.tenants = []
+        self.lock = threading.Lock()
+        self.chat = self
+        self.completions = self
+
+    def create(self, timeout=None, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.tenants.append(current_tenant())
+            outcome = self.outcomes.pop(0) if self.outcomes else Response()
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, (int, float)):
+            time.sleep(outcome)
+            return Response()
+        return outcome
+
+
+def test_retries_on_429_and_5xx():
+    client = FakeClient([status_error(429), status_error(503), Response()])
+    gateway = LLMGateway(client=client, max_retries=3, sleep=lambda _: None)
+    gateway.chat(stage="interpret", model="gpt-4o", messages=[])
+
+    assert client.calls == 3
+    stats = gateway.stats()["interpret"]
+    assert stats["retries"] == 2
+    assert stats["prompt_tokens"] == 10
+    assert stats["cached_tokens"] == 8
+
+
+def test_does_not_retry_client_errors():
+    client = FakeClient([status_error(400)])
+    gateway = LLMGateway(client=client, sleep=lambda _: None)
+    try:
+        gateway.chat(stage="refine", model="gpt-4o", messages=[])
+        assert False, "expected APIStatusError"
+    except openai.APIStatusError:
+        pass
+    assert client.calls == 1
+    assert gateway.stats()["refine"]["errors"] == 1
+
+
+def test_hedged_request_wins_over_slow_primary():
+    client = FakeClient([1.0, Response()])
+    gateway = LLMGateway(client=client, hedge_after=0.05)
+    start = time.monotonic()
+    with as_tenant("crm", "high"):
+        gateway.chat(stage="interpret", model="gpt-4o", messages=[], hedge=True)
+
+    assert time.monotonic() - start < 0.5
+    assert gateway.stats()["interpret"]["hedged"] == 1
+    # Both attempts queue as the caller, not as the default tenant
+    assert client.tenants == [("crm", "high"), ("crm", "high")]
+
+
+if __name__ == "__main__":
+    for test in (test_retries_on_429_and_5xx, test_does_not_retry_client_errors,
+                 test_hedged_request_wins_over_slow_primary):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
@@ -0,0 +1,38 @@
+"""
+test_metrics.py
+Test Prometheus text and JSON snapshot export.
+"""
+
+import json
+
+from metrics import Registry
+
+
+def test_prometheus_exposition():
+    registry = Registry()
+    latency = registry.histogram("stage_latency_seconds", "Stage latency", ["stage"], buckets=(0.1, 1))
+    errors = registry.counter("stage_errors_total", "Stage errors", ["stage"])
+    latency.observe(0.05, stage="interpret")
+    latency.observe(0.5, stage="interpret")
+    errors.inc(stage="search_web_tool")
+
+    text = registry.render_prometheus()
+    assert '# TYPE stage_latency_seconds histogram' in text
+    assert 'stage_latency_seconds_bucket{stage="interpret",le="0.1"} 1' in text
+    assert 'stage_latency_seconds_bucket{stage="interpret",le="+Inf"} 2' in text
+    assert 'stage_latency_seconds_count{stage="interpret"} 2' in text
+    assert 'stage_errors_total{stage="search_web_tool"} 1' in text
+
+
+def test_json_snapshot_and_gauge_function():
+    registry = Registry()
+    registry.gauge("session_bytes", "Session memory").set_function(lambda: 2048)
+
+    snapshot = json.loads(json.dumps(registry.snapshot()))
+    assert snapshot["metrics"]["session_bytes"]["values"][0]["value"] == 2048
+
+
+if __name__ == "__main__":
+    for test in (test_prometheus_exposition, test_json_snapshot_and_gauge_function):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
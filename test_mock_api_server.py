@@ -0,0 +1,68 @@
+"""
+test_mock_api_server.py
+Test the mock chat-completions/search server through the real SDK clients.
+"""
+
+import json
+
+import openai
+
+from bench_pipeline import percentile
+from mock_api_server import MockAPIServer, MockConfig, parse_latency
+from search_module import SEARCH_TOOL
+
+
+def client_for(server):
+    return openai.OpenAI(api_key="mock", base_url=f"{server.url}/v1", max_retries=0)
+
+
+def test_scripted_tool_calls_then_answer():
+    server = MockAPIServer(MockConfig(tool_script=[["GDPR {country}"]])).start()
+    try:
+        client = client_for(server)
+        messages = [{"role": "system", "content": "search"},
+                    {"role": "user", "content": "Countries: France, Germany"}]
+        first = client.chat.completions.create(model="gpt-4o", messages=messages, tools=[SEARCH_TOOL])
+        call = first.choices[0].message.tool_calls[0]
+        assert json.loads(call.function.arguments) == {"query": "GDPR France"}
+
+        messages += [first.choices[0].message.model_dump(exclude_none=True),
+                     {"role": "tool", "tool_call_id": call.id, "content": "{}"}]
+        final = client.chat.completions.create(model="gpt-4o", messages=messages, tools=[SEARCH_TOOL])
+        reply = json.loads(final.choices[0].message.content)
+        assert reply["regulations"][0]["country_region"] == "France"
+        assert reply["search_metadata"]["searches_performed"] == 1
+
+        interpretation = client.chat.completions.create(
+            model="gpt-4o-mini", messages=[{"role": "user", "content": "We sell payroll software"}])
+        assert json.loads(interpretation.choices[0].message.content)["clarifying_questions"]
+    finally:
+        server.stop()
+
+
+def test_failure_injection():
+    server = MockAPIServer(MockConfig(failure_rate=1.0, failure_status=503)).start()
+    try:
+        client_for(server).chat.completions.create(model="gpt-4o", messages=[])
+        assert False, "expected an injected failure"
+    except openai.APIStatusError as e:
+        assert e.status_code == 503
+    finally:
+        server.stop()
+    assert server.counts["failures"] == 1
+
+
+def test_latency_specs_and_percentile():
+    import random
+    rng = random.Random(1)
+    assert parse_latency("const:0.2")(rng) == 0.2
+    assert 0.1 <= parse_latency("uniform:0.1,0.5")(rng) <= 0.5
+    assert parse_latency("lognormal:-1,0.5")(rng) > 0
+    assert percentile([1, 2, 3, 4, 5], 50) == 3
+    assert percentile([1, 2, 3, 4, 5], 95) == 4.8
+
+
+if __name__ == "__main__":
+    for test in (test_scripted_tool_calls_then_answer, test_failure_injection, test_latency_specs_and_percentile):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
@@ -0,0 +1,62 @@
+"""
+test_model_router.py
+Test per-stage routing, fallback and cost estimates.
+"""
+
+import json
+
+from model_router import ModelRouter, estimate_cost
+from security import SecurityValidator
+
+VALID = {
+    "detected_domain": "Payroll software",
+    "regulation_types": ["employment"],
+    "suggested_countries": ["Germany"],
+    "confidence": "high",
+}
+
+
+def test_routes_and_overrides():
+    router = ModelRouter(routes={"interpret": {"model": "gpt-4.1-mini"}, "search_iteration": "gpt-4.1"})
+    assert router.models_for("interpret") == ["gpt-4.1-mini", "gpt-4o"]
+    assert router.model_for("search_iteration") == "gpt-4.1"
+    assert router.model_for("refine") == "gpt-4o-mini"
+
+
+def test_falls_back_when_validation_fails():
+    router = ModelRouter(routes={})
+    tried = []
+
+    def call(model):
+        tried.append(model)
+        if model == "gpt-4o-mini":
+            return dict(VALID, confidence="certain")   # rejected by validation
+        return VALID
+
+    result = router.call_with_fallback("interpret", call, SecurityValidator().validate_interpretation)
+    assert tried == ["gpt-4o-mini", "gpt-4o"]
+    assert result == VALID
+
+
+def test_falls_back_on_malformed_json():
+    router = ModelRouter(routes={})
+
+    def call(model):
+        if model == "gpt-4o-mini":
+            return json.loads("{not json")
+        return VALID
+
+    assert router.call_with_fallback("refine", call) == VALID
+
+
+def test_estimate_cost():
+    # 1M uncached input tokens on gpt-4o-mini
+    assert abs(estimate_cost("gpt-4o-mini", 1_000_000, 0) - 0.15) < 1e-9
+    assert estimate_cost("unknown-model", 1000, 1000) == 0.0
+
+
+if __name__ == "__main__":
+    for test in (test_routes_and_overrides, test_falls_back_when_validation_fails,
+                 test_falls_back_on_malformed_json, test_estimate_cost):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
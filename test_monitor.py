@@ -0,0 +1,167 @@
+"""
+test_monitor.py
+Test scheduled profile refreshes and the change feed.
+"""
+
+import json
+import os
+import tempfile
+
+from knowledge_base import KnowledgeBase
+from monitor import Monitor, diff_regulations
+from test_search_module import REGULATIONS_REPLY, ScriptedGateway, content_message, fake_search, patched
+
+INTERPRETATION = {
+    "detected_domain": "Expense management software for B2B clients",
+    "regulation_types": ["tax"],
+    "suggested_countries": ["Germany"],
+    "confidence": "high",
+}
+
+
+def regulation(name, date="2025-01-01", confidence="verified"):
+    return {"regulation_name": name, "country_region": "Germany", "effective_date": date,
+            "source": "https://www.bundesfinanzministerium.de", "confidence": confidence}
+
+
+class FakeSearch:
+    def __init__(self):
+        self.calls = 0
+        self.result = {"regulations": [], "search_metadata": {"partial": False}}
+
+    def __call__(self, interpretation):
+        self.calls += 1
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def read_feed(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def monitor_in(tmp, search, now):
+    return Monitor(os.path.join(tmp, "monitor.db"), os.path.join(tmp, "feed.jsonl"),
+                   interval_hours=24, retry_minutes=30, search_fn=search, clock=lambda: now[0])
+
+
+def test_baseline_then_only_changes_reach_the_feed():
+    with tempfile.TemporaryDirectory() as tmp:
+        now = [1_000_000.0]
+        search = FakeSearch()
+        monitor = monitor_in(tmp, search, now)
+        monitor.add_profile("acme", "Expense software", INTERPRETATION)
+
+        search.result = {"regulations": [regulation("GoBD"), regulation("E-invoicing mandate", "2025-01-01"),
+                                         regulation("Old rule"), regulation("Guess", confidence="estimated")],
+                         "search_metadata": {"partial": False}}
+        assert monitor.run_once()["baseline"] == 1
+        assert read_feed(monitor.feed_path) == []
+
+        # Not due again until the interval has passed
+        now[0] += 3600
+        monitor.run_once()
+        assert search.calls == 1
+
+        now[0] += 24 * 3600
+        search.result = {"regulations": [regulation("GoBD"), regulation("E-invoicing mandate", "2026-01-01"),
+                                         regulation("ViDA", "2030-07-01")],
+                         "search_metadata": {"partial": False}}
+        counts = monitor.run_once()
+        assert counts["ok"] == 1 and counts["changes"] == 3
+        feed = {(line["change"], line["regulation"]["regulation_name"]): line for line in read_feed(monitor.feed_path)}
+        assert set(feed) == {("new", "ViDA"), ("date_changed", "E-invoicing mandate"), ("removed", "Old rule")}
+        assert feed[("date_changed", "E-invoicing mandate")]["previous_effective_date"] == "2025-01-01"
+        assert feed[("new", "ViDA")]["profile_id"] == "acme"
+        monitor.close()
+
+
+def test_partial_and_failed_refreshes_keep_the_snapshot_and_retry_sooner():
+    with tempfile.TemporaryDirectory() as tmp:
+        now = [1_000_000.0]
+        search = FakeSearch()
+        monitor = monitor_in(tmp, search, now)
+        monitor.add_profile("acme", "Expense software", INTERPRETATION)
+        search.result = {"regulations": [regulation("GoBD")], "search_metadata": {"partial": False}}
+        monitor.run_once()
+
+        now[0] += 25 * 3600
+        search.result = {"regulations": [], "search_metadata": {"partial": True}}
+        assert monitor.run_once()["partial"] == 1
+        search.result = RuntimeError("search backend down")
+        now[0] += 31 * 60
+        assert monitor.run_once()["error"] == 1
+        assert monitor.snapshot("acme") == [regulation("GoBD")]
+        assert read_feed(monitor.feed_path) == []
+        monitor.close()
+
+
+def test_refresh_through_the_search_reports_removals_despite_the_knowledge_base():
+    def reply(*regulations):
+        template = REGULATIONS_REPLY["regulations"][0]
+        return content_message(json.dumps(dict(REGULATIONS_REPLY, regulations=[
+            dict(template, regulation_name=name, effective_date=date, country_region="Germany")
+            for name, date in regulations])))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        now = [1_000_000.0]
+        kb = KnowledgeBase(":memory:", clock=lambda: now[0])
+        gateway = ScriptedGateway([
+            reply(("GoBD", "2025-01-01"), ("E-invoicing mandate", "2025-01-01"), ("Old rule", "2020-01-01")),
+            reply(("GoBD", "2025-01-01"), ("E-invoicing mandate", "2026-01-01")),
+        ])
+        monitor = Monitor(os.path.join(tmp, "monitor.db"), os.path.join(tmp, "feed.jsonl"),
+                          interval_hours=24, clock=lambda: now[0])
+        monitor.add_profile("acme", "Expense software", INTERPRETATION)
+        with patched(get_gateway=lambda: gateway, search_web_tool=fake_search, get_knowledge_base=lambda: kb):
+            assert monitor.run_once()["baseline"] == 1
+            now[0] += 25 * 3600
+            assert monitor.run_once()["ok"] == 1
+        assert len(gateway.calls) == 2
+        changes = {(line["change"], line["regulation"]["regulation_name"]) for line in read_feed(monitor.feed_path)}
+        assert changes == {("date_changed", "E-invoicing mandate"), ("removed", "Old rule")}
+        monitor.close()
+
+
+def test_import_keeps_going_past_a_failing_profile():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "profiles.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for id_, description in (("a", "Expense management software for B2B clients in Germany"),
+                                     ("b", "Telemedicine platform connecting patients with doctors"),
+                                     ("c", "Online marketplace for second-hand furniture in France")):
+                f.write(json.dumps({"id": id_, "description": description}) + "\n")
+
+        def interpret(description, answers):
+            if description.startswith("Telemedicine"):
+                raise TimeoutError("interpretation timed out")
+            return INTERPRETATION
+
+        monitor = monitor_in(tmp, FakeSearch(), [0.0])
+        counts = monitor.import_profiles(path, interpret)
+        assert counts == {"added": 2, "rejected": 0, "skipped": 0, "errors": 1}
+        assert monitor.profile_ids() == ["a", "c"]
+
+        # The failed profile is tried again on the next import
+        counts = monitor.import_profiles(path, lambda description, answers: INTERPRETATION)
+        assert counts == {"added": 1, "rejected": 0, "skipped": 2, "errors": 0}
+        monitor.close()
+
+
+def test_diff_ignores_unsourced_guesses():
+    previous = [regulation("GoBD"), regulation("Guess", confidence="estimated")]
+    current = [regulation("gobd ", "2025-01-01"), regulation("Other guess", confidence="estimated")]
+    assert diff_regulations(previous, current) == []
+
+
+if __name__ == "__main__":
+    for test in (test_baseline_then_only_changes_reach_the_feed,
+                 test_partial_and_failed_refreshes_keep_the_snapshot_and_retry_sooner,
+                 test_refresh_through_the_search_reports_removals_despite_the_knowledge_base,
+                 test_import_keeps_going_past_a_failing_profile,
+                 test_diff_ignores_unsourced_guesses):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
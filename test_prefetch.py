@@ -0,0 +1,102 @@
+"""
+test_prefetch.py
+Test reuse planning for speculative searches.
+"""
+
+import json
+import threading
+from types import SimpleNamespace
+
+import search_module
+from prefetch import SpeculativeSearch, plan_reuse
+from slice_cache import SliceCache, incremental_search
+from test_search_module import REGULATIONS_REPLY, content_message, patched, tool_call_message
+
+INITIAL = {
+    "detected_domain": "expense management software for B2B clients",
+    "regulation_types": ["tax", "data protection"],
+    "suggested_countries": ["Germany", "France"],
+}
+
+
+def fake_search(calls):
+    def search(domain, types, countries):
+        calls.append((tuple(types), tuple(countries)))
+        return {
+            "regulations": [{"regulation_name": f"{t} rule", "country_region": c}
+                            for t in types for c in countries],
+            "search_metadata": {"searches_performed": 1},
+        }
+    return search
+
+
+def test_plan_reuse():
+    assert plan_reuse(INITIAL, dict(INITIAL))[0] == "reuse"
+
+    added_country = dict(INITIAL, suggested_countries=["Germany", "France", "Austria"])
+    action, delta = plan_reuse(INITIAL, added_country)
+    assert action == "partial"
+    assert delta["added_countries"] == ["Austria"]
+
+    other_business = dict(INITIAL, detected_domain="telemedicine platform for clinics")
+    assert plan_reuse(INITIAL, other_business)[0] == "discard"
+
+
+def test_partial_resolve_searches_only_the_delta():
+    calls = []
+    search = SpeculativeSearch(INITIAL, fake_search(calls)).start()
+    refined = dict(INITIAL, suggested_countries=["Germany", "Austria"])
+    result = search.resolve(refined)
+
+    assert calls[1] == (("tax", "data protection"), ("Austria",))
+    countries = {r["country_region"] for r in result["regulations"]}
+    assert countries == {"Germany", "Austria"}
+    assert result["search_metadata"]["speculative"] == "partial"
+    assert result["search_metadata"]["searches_performed"] == 2
+
+
+class StallingGateway:
+    """Holds the first turn for the initial domain until released, then asks for a search."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def chat(self, stage, **kwargs):
+        prompt = kwargs["messages"][1]["content"]
+        self.calls.append(prompt)
+        if INITIAL["detected_domain"] in prompt:
+            self.started.set()
+            self.release.wait(5)
+            message = tool_call_message("expense management tax Germany")
+        else:
+            message = content_message(json.dumps(REGULATIONS_REPLY))
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def test_discarded_search_stops_and_keeps_the_refined_slices():
+    gateway, searched = StallingGateway(), []
+    slices = SliceCache()
+    with patched(get_gateway=lambda: gateway, search_web_tool=lambda **args: searched.append(args),
+                 get_knowledge_base=lambda: None, replaying=lambda: True):
+        search = SpeculativeSearch(INITIAL, lambda domain, types, countries: incremental_search(
+            slices, domain, types, countries, search_module.search_regulations_with_function_calling)).start()
+        assert gateway.started.wait(5)
+        refined = dict(INITIAL, detected_domain="telemedicine platform for clinics")
+        result = search.resolve(refined)
+        gateway.release.set()
+        discarded = search._future.result(timeout=5)
+
+    assert result["search_metadata"]["speculative"] == "discard"
+    assert discarded["search_metadata"]["error"] == "Search cancelled"
+    assert searched == [] and len(gateway.calls) == 2
+    assert slices.domain == refined["detected_domain"] and len(slices) == 4
+
+
+if __name__ == "__main__":
+    for test in (test_plan_reuse, test_partial_resolve_searches_only_the_delta,
+                 test_discarded_search_stops_and_keeps_the_refined_slices):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
@@ -0,0 +1,60 @@
+"""
+test_profiling.py
+Test collapsed-stack output and per-stage peak memory from profiled stages.
+"""
+
+import json
+import os
+import tempfile
+
+import profiling
+from instrumentation import stage
+
+
+def busy_inner():
+    data = [bytearray(1024) for _ in range(2000)]   # ~2 MiB
+    return sum(len(chunk) for chunk in data)
+
+
+def busy_outer():
+    return sum(i * i for i in range(20000))
+
+
+def test_nested_stages_write_collapsed_stacks_and_memory():
+    with tempfile.TemporaryDirectory() as directory:
+        profiling.configure("outer,inner", directory)
+        try:
+            with stage("outer"):
+                busy_outer()
+                with stage("inner", query="GDPR"):
+                    busy_inner()
+            with stage("not_profiled"):
+                busy_outer()
+        finally:
+            profiling.configure("")
+
+        with open(os.path.join(directory, "inner.collapsed"), encoding="utf-8") as f:
+            inner = f.read().splitlines()
+        with open(os.path.join(directory, "outer.collapsed"), encoding="utf-8") as f:
+            outer = f.read().splitlines()
+        with open(os.path.join(directory, "stage_memory.jsonl"), encoding="utf-8") as f:
+            memory = {entry["stage"]: entry for entry in map(json.loads, f)}
+        assert not os.path.exists(os.path.join(directory, "not_profiled.collapsed"))
+
+    for line in inner + outer:
+        stack, weight = line.rsplit(" ", 1)
+        assert int(weight) > 0 and ";" in stack
+    assert all(line.startswith("stage:inner;") for line in inner)
+    assert any("busy_inner (test_profiling.py" in line for line in inner)
+    # The outer stage pauses while the inner one runs
+    assert any("busy_outer" in line for line in outer)
+    assert not any("busy_inner" in line for line in outer)
+
+    assert memory["inner"]["peak_bytes"] > 2 * 1024 * 1024
+    assert memory["outer"]["peak_bytes"] >= memory["inner"]["peak_bytes"]
+    assert memory["inner"]["attributes"] == {"query": "GDPR"}
+
+
+if __name__ == "__main__":
+    test_nested_stages_write_collapsed_stacks_and_memory()
+    print("✅ PASS │ test_nested_stages_write_collapsed_stacks_and_memory")
@@ -0,0 +1,42 @@
+"""
+test_prompts.py
+Test that prompts keep a byte-identical static prefix across requests.
+"""
+
+from prompts import INTERPRET_TEMPLATE, SEARCH_TEMPLATE
+
+
+def render_search(domain, countries, year):
+    return SEARCH_TEMPLATE.render(
+        detected_domain=domain,
+        regulation_types=["tax", "data protection"],
+        countries=countries,
+        current_year=year,
+        today=f"{year}-01-15",
+    )
+
+
+def test_search_prompt_prefix_is_stable():
+    first = render_search("expense management", ["Germany"], 2025)
+    second = render_search("telemedicine", ["France", "Spain"], 2026)
+
+    assert first.startswith(SEARCH_TEMPLATE.prefix)
+    assert second.startswith(SEARCH_TEMPLATE.prefix)
+    # Request data only appears after the static block
+    assert "expense management" not in SEARCH_TEMPLATE.prefix
+    assert first.endswith("Today's Date: 2025-01-15")
+    assert "Countries: France, Spain" in second
+
+
+def test_missing_field_is_reported():
+    try:
+        INTERPRET_TEMPLATE.render()
+        assert False, "expected KeyError"
+    except KeyError as e:
+        assert "user_description" in str(e)
+
+
+if __name__ == "__main__":
+    for test in (test_search_prompt_prefix_is_stable, test_missing_field_is_reported):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
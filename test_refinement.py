@@ -0,0 +1,95 @@
+"""
+test_refinement.py
+Test that refinement skips answers that change nothing and merges delta patches.
+"""
+
+import json
+from types import SimpleNamespace
+
+import interpretation
+from refinement import answer_delta, apply_patch
+
+DESCRIPTION = "We build expense management software for B2B clients in Germany and France."
+
+INTERPRETATION = {
+    "detected_domain": "Expense management software for B2B clients",
+    "regulation_types": ["tax", "data protection"],
+    "detected_regions": ["EU"],
+    "suggested_countries": ["Germany", "France"],
+    "confidence": "medium",
+    "clarifying_questions": ["Do you operate in Germany?", "Do you store receipts?", "Any other markets?"],
+}
+
+
+class RecordingGateway:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def chat(self, stage, **kwargs):
+        self.calls.append(dict(kwargs, stage=stage))
+        message = SimpleNamespace(content=json.dumps(self.reply))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def refine_with(gateway, answers):
+    original = interpretation.get_gateway
+    interpretation.get_gateway = lambda: gateway
+    try:
+        return interpretation.refine_interpretation_with_answers(DESCRIPTION, INTERPRETATION, answers, model="gpt-4o")
+    finally:
+        interpretation.get_gateway = original
+
+
+def test_answers_that_cannot_change_anything_are_dropped():
+    answers = {
+        "Do you operate in Germany?": "Yes",                 # confirms a known country
+        "Do you process payments?": "No",                    # rules out something never assumed
+        "Any other markets?": "not sure",
+        "Which data protection rules apply?": "",
+    }
+    assert answer_delta(DESCRIPTION, INTERPRETATION, answers) == {}
+
+    answers = {
+        "Do you store receipts?": "Yes",                     # the question itself is new information
+        "Any other markets?": "We also sell in the UK",
+        "Do you operate in Germany?": "No, only France",     # rules out a known country
+    }
+    assert answer_delta(DESCRIPTION, INTERPRETATION, answers) == answers
+
+
+def test_refine_skips_the_call_when_nothing_can_change():
+    gateway = RecordingGateway({})
+    refined = refine_with(gateway, {"Do you operate in Germany?": "Yes", "Any other markets?": "n/a"})
+    assert gateway.calls == []
+    assert refined == dict(INTERPRETATION, clarifying_questions=[])
+
+
+def test_refine_sends_only_the_delta_and_merges_the_patch():
+    gateway = RecordingGateway({"suggested_countries": ["Germany", "France", "United Kingdom"], "confidence": "high"})
+    refined = refine_with(gateway, {"Do you operate in Germany?": "Yes", "Any other markets?": "The UK"})
+
+    prompt = gateway.calls[0]["messages"][1]["content"]
+    assert "Q: Any other markets?\nA: The UK" in prompt
+    assert "Do you operate in Germany?" not in prompt
+    assert DESCRIPTION not in prompt and "clarifying_questions" not in prompt
+    assert refined == dict(INTERPRETATION, suggested_countries=["Germany", "France", "United Kingdom"],
+                           confidence="high", clarifying_questions=[])
+
+
+def test_malformed_patch_is_rejected():
+    for patch in (["tax"], {"regulation_types": "tax"}):
+        try:
+            apply_patch(INTERPRETATION, patch)
+            assert False, "expected TypeError"
+        except TypeError:
+            pass
+
+
+if __name__ == "__main__":
+    for test in (test_answers_that_cannot_change_anything_are_dropped,
+                 test_refine_skips_the_call_when_nothing_can_change,
+                 test_refine_sends_only_the_delta_and_merges_the_patch,
+                 test_malformed_patch_is_rejected):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
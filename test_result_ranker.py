@@ -0,0 +1,79 @@
+"""
+test_result_ranker.py
+Test authority scoring, near-duplicate removal and ranking in search_web_tool.
+"""
+
+import search_module
+from result_ranker import ResultRanker, hamming, simhash
+
+DORA = ("The Digital Operational Resilience Act (DORA) applies from 17 January 2025 to financial "
+        "entities in the EU, including payment institutions and e-money institutions.")
+
+RESULTS = [
+    {"title": "DORA explained", "link": "https://someblog.medium.com/dora", "snippet": DORA, "source": "medium.com"},
+    {"title": "DORA guide | Law firm", "link": "https://lawfirm.com/dora",
+     "snippet": "Jan 3, 2025 ... " + DORA[:-1] + " ...", "source": "lawfirm.com"},
+    {"title": "Regulation (EU) 2022/2554", "link": "https://eur-lex.europa.eu/eli/reg/2022/2554/oj",
+     "snippet": "Regulation on digital operational resilience for the financial sector and amending regulations.",
+     "source": "eur-lex.europa.eu"},
+    {"title": "DORA", "link": "https://www.eiopa.europa.eu/dora",
+     "snippet": "Supervisory guidance on ICT risk management and incident reporting under DORA for insurers.",
+     "source": "eiopa.europa.eu"},
+    {"title": "DORA at BaFin", "link": "https://www.bafin.de/dora",
+     "snippet": "BaFin supervises German banks and insurers under the new ICT resilience rules.",
+     "source": "bafin.de"},
+]
+
+
+def test_authority_table_longest_match_and_official_fallback():
+    ranker = ResultRanker(authority={"lawfirm.com": 0.7})
+    assert ranker.authority("https://eur-lex.europa.eu/x") == 1.0
+    assert ranker.authority("https://www.eiopa.europa.eu/x") == 0.95
+    assert ranker.authority("https://someblog.medium.com/x") == 0.1
+    assert ranker.authority("https://www.irs.gov/x") == 0.9
+    assert ranker.authority("https://lawfirm.com/x") == 0.7
+    assert ranker.authority("https://unknown.example/x") == 0.3
+
+
+def test_near_duplicates_collapse_and_official_sources_rise():
+    assert hamming(simhash(RESULTS[0]["snippet"]), simhash(RESULTS[1]["snippet"])) <= 10
+    assert hamming(simhash(RESULTS[0]["snippet"]), simhash(RESULTS[4]["snippet"])) > 10
+    assert simhash("GDPR fines") is None
+
+    ranked = ResultRanker(authority={}, top=3).rank(RESULTS, limit=10)
+    assert [r["source"] for r in ranked] == ["eur-lex.europa.eu", "eiopa.europa.eu", "bafin.de"]
+
+    ranked = ResultRanker(authority={}, top=5).rank(RESULTS)
+    assert [r["source"] for r in ranked][-1] == "lawfirm.com"
+    assert len(ranked) == 4                       # the medium.com copy is dropped
+
+
+def test_search_web_tool_requests_candidates_and_returns_the_top():
+    requested = []
+
+    def google(query, num_results, cse_id):
+        requested.append(num_results)
+        return {"success": True, "query": query, "results": [dict(r) for r in RESULTS], "total_found": 5}
+
+    saved = (search_module.get_snippet_index, search_module.get_google_credentials,
+             search_module._google_search, search_module.get_ranker)
+    search_module.get_snippet_index = lambda: None
+    search_module.get_google_credentials = lambda: ("key", "cse")
+    search_module._google_search = google
+    search_module.get_ranker = lambda: ResultRanker(authority={}, top=5)
+    try:
+        result = search_module.search_web_tool("dora ict resilience", num_results=2)
+    finally:
+        (search_module.get_snippet_index, search_module.get_google_credentials,
+         search_module._google_search, search_module.get_ranker) = saved
+    assert requested == [10]
+    assert result["tier"] == "live" and result["total_found"] == 2
+    assert result["results"][0]["source"] == "eur-lex.europa.eu"
+
+
+if __name__ == "__main__":
+    for test in (test_authority_table_longest_match_and_official_fallback,
+                 test_near_duplicates_collapse_and_official_sources_rise,
+                 test_search_web_tool_requests_candidates_and_returns_the_top):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
@@ -0,0 +1,204 @@
+"""
+test_search_module.py
+Test the tool-calling search loop against a scripted gateway.
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+import search_module
+from circuit_breaker import CircuitBreaker
+from knowledge_base import KnowledgeBase
+from llm_gateway import LLMGateway
+from records import REGULATION_SCHEMA, Regulation
+
+REGULATIONS_REPLY = {
+    "regulations": [{
+        "regulation_name": "ViDA",
+        "full_name": "VAT in the Digital Age",
+        "effective_date": "2030-07-01",
+        "country_region": "EU",
+        "description": "E-invoicing for intra-EU B2B.",
+        "impact_level": "high",
+        "key_requirements": ["structured e-invoices"],
+        "deadline_type": "upcoming",
+        "source": "https://taxation-customs.ec.europa.eu",
+        "source_type": "official_government",
+        "confidence": "verified",
+    }],
+    "search_metadata": {"searches_performed": 1, "official_sources_found": 1, "search_date": "2026-01-01"},
+}
+
+
+def tool_call_message(query):
+    call = SimpleNamespace(
+        id="call_1",
+        function=SimpleNamespace(name="search_web_tool", arguments=json.dumps({"query": query})),
+    )
+    return SimpleNamespace(content=None, tool_calls=[call])
+
+
+def content_message(content):
+    return SimpleNamespace(content=content, tool_calls=None)
+
+
+class ScriptedGateway:
+    """Returns the scripted assistant messages in order and records each call."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.calls = []
+
+    def chat(self, stage, **kwargs):
+        self.calls.append(dict(kwargs, stage=stage))
+        message = self.messages.pop(0)
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class patched:
+    """Temporarily replace attributes on search_module."""
+
+    def __init__(self, **replacements):
+        self.replacements = replacements
+        self.saved = {}
+
+    def __enter__(self):
+        for name, value in self.replacements.items():
+            self.saved[name] = getattr(search_module, name)
+            setattr(search_module, name, value)
+
+    def __exit__(self, *exc):
+        for name, value in self.saved.items():
+            setattr(search_module, name, value)
+
+
+def fake_search(query, num_results=5):
+    return {"success": True, "query": query, "results": [], "total_found": 0}
+
+
+def test_schema_matches_regulation_record():
+    assert REGULATION_SCHEMA["required"] == list(Regulation.FIELDS)
+    assert set(REGULATION_SCHEMA["properties"]) == set(Regulation.FIELDS)
+
+
+def test_structured_reply_loads_into_records():
+    gateway = ScriptedGateway([
+        tool_call_message("e-invoicing mandate Germany"),
+        content_message(json.dumps(REGULATIONS_REPLY)),
+    ])
+    with patched(get_gateway=lambda: gateway, search_web_tool=fake_search, get_knowledge_base=lambda: None):
+        result = search_module.search_regulations_with_function_calling(
+            "expense management", ["tax"], ["Germany"]
+        )
+
+    assert result["regulations"][0]["regulation_name"] == "ViDA"
+    assert gateway.calls[-1]["response_format"]["type"] == "json_schema"
+    assert gateway.calls[-1]["response_format"]["json_schema"]["strict"] is True
+
+
+def test_budget_forces_partial_synthesis():
+    gateway = ScriptedGateway([
+        tool_call_message("e-invoicing mandate Germany"),
+        content_message(json.dumps(REGULATIONS_REPLY)),
+    ])
+    budget = search_module.SearchBudget(token_budget=50)
+    with patched(get_gateway=lambda: gateway, search_web_tool=fake_search, get_knowledge_base=lambda: None):
+        result = search_module.search_regulations_with_function_calling(
+            "expense management", ["tax"], ["Germany"], budget=budget
+        )
+
+    # One search turn spent the budget, then one forced synthesis turn
+    assert [call["stage"] for call in gateway.calls] == ["search_iteration", "search_synthesis"]
+    assert gateway.calls[-1]["tool_choice"] == "none"
+    meta = result["search_metadata"]
+    assert meta["partial"] is True
+    assert meta["termination_reason"] == "token_budget"
+    assert result["regulations"]
+
+
+class StallingClient:
+    """An OpenAI client whose second search turn runs until its request timeout expires."""
+
+    def __init__(self):
+        self.chat = self
+        self.completions = self
+        self.stages = []
+
+    def create(self, timeout=None, **kwargs):
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120)
+        if kwargs.get("tool_choice") == "none":
+            self.stages.append("synthesis")
+            message = content_message(json.dumps(REGULATIONS_REPLY))
+        elif not self.stages:
+            self.stages.append("search")
+            message = tool_call_message("e-invoicing mandate Germany")
+        else:
+            self.stages.append("stalled")
+            time.sleep(timeout)
+            raise openai.APITimeoutError(httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def test_deadline_hit_mid_call_still_synthesizes():
+    client = StallingClient()
+    gateway = LLMGateway(client=client, breaker=CircuitBreaker("test"))
+    budget = search_module.SearchBudget(deadline=0.3)
+    with patched(get_gateway=lambda: gateway, search_web_tool=fake_search, get_knowledge_base=lambda: None):
+        result = search_module.search_regulations_with_function_calling(
+            "expense management", ["tax"], ["Germany"], budget=budget
+        )
+
+    assert client.stages == ["search", "stalled", "synthesis"]
+    assert result["search_metadata"]["termination_reason"] == "deadline"
+    assert result["regulations"][0]["regulation_name"] == "ViDA"
+
+
+def test_knowledge_base_answers_covered_search():
+    kb = KnowledgeBase(":memory:")
+    gateway = ScriptedGateway([
+        tool_call_message("e-invoicing mandate Germany"),
+        content_message(json.dumps(REGULATIONS_REPLY)),
+    ])
+    with patched(get_gateway=lambda: gateway, search_web_tool=fake_search, get_knowledge_base=lambda: kb):
+        first = search_module.search_regulations_with_function_calling(
+            "expense management software", ["tax"], ["Germany"])
+        # Same slices for a similar domain: no LLM call at all
+        second = search_module.search_regulations_with_function_calling(
+            "expense management", ["Tax"], ["germany"])
+
+    assert len(gateway.calls) == 2
+    assert second["search_metadata"]["termination_reason"] == "knowledge_base"
+    assert second["regulations"] == first["regulations"]
+
+
+def test_knowledge_base_seeds_missing_slices():
+    kb = KnowledgeBase(":memory:")
+    kb.upsert(REGULATIONS_REPLY["regulations"], "expense management", ["tax"], ["Germany"])
+    kb.mark_covered("expense management", ["tax"], ["Germany"])
+    france = dict(REGULATIONS_REPLY, regulations=[dict(REGULATIONS_REPLY["regulations"][0],
+                                                       regulation_name="Facture électronique",
+                                                       country_region="France")])
+    gateway = ScriptedGateway([content_message(json.dumps(france))])
+    with patched(get_gateway=lambda: gateway, search_web_tool=fake_search, get_knowledge_base=lambda: kb):
+        result = search_module.search_regulations_with_function_calling(
+            "expense management", ["tax"], ["Germany", "France"])
+
+    prompt = gateway.calls[0]["messages"][1]["content"]
+    assert "Countries: France" in prompt
+    assert "ALREADY KNOWN" in prompt and "- ViDA (EU" in prompt
+    assert {r["regulation_name"] for r in result["regulations"]} == {"ViDA", "Facture électronique"}
+    assert result["search_metadata"]["knowledge_base_hits"] == 1
+
+
+if __name__ == "__main__":
+    for test in (test_schema_matches_regulation_record, test_structured_reply_loads_into_records,
+                 test_budget_forces_partial_synthesis, test_deadline_hit_mid_call_still_synthesizes,
+                 test_knowledge_base_answers_covered_search,
+                 test_knowledge_base_seeds_missing_slices):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
@@ -0,0 +1,107 @@
+"""
+test_session_store.py
+Test interning and idle eviction in the shared session store.
+"""
+
+import io
+from contextlib import redirect_stdout
+
+from session_store import SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+INTERPRETATION = {
+    "detected_domain": "Expense management SaaS",
+    "regulation_types": ["tax", "data protection"],
+    "detected_regions": ["EU"],
+    "suggested_countries": ["Germany", "France"],
+    "confidence": "high",
+    "clarifying_questions": [],
+}
+
+REGULATIONS = {
+    "regulations": [{
+        "regulation_name": "ViDA",
+        "country_region": "EU",
+        "effective_date": "2030-07-01",
+        "key_requirements": ["e-invoicing"],
+    }],
+    "search_metadata": {"searches_performed": 3},
+}
+
+
+def test_round_trip():
+    store = SessionStore()
+    store.put_interpretation("a", INTERPRETATION)
+    store.put_regulations("a", REGULATIONS)
+
+    assert store.get_interpretation("a") == INTERPRETATION
+    regs = store.get_regulations("a")
+    assert regs["regulations"][0]["regulation_name"] == "ViDA"
+    assert regs["regulations"][0]["key_requirements"] == ["e-invoicing"]
+    assert regs["search_metadata"] == {"searches_performed": 3}
+
+
+def test_unknown_fields_are_dropped_and_reported():
+    store = SessionStore()
+    output = io.StringIO()
+    with redirect_stdout(output):
+        store.put_interpretation("a", dict(INTERPRETATION, sector="fintech"))
+        store.put_regulations("a", dict(REGULATIONS, sources=[], regulations=[
+            dict(REGULATIONS["regulations"][0], penalty="4% of turnover")]))
+
+    assert store.get_interpretation("a") == INTERPRETATION
+    assert "penalty" not in store.get_regulations("a")["regulations"][0]
+    reported = output.getvalue()
+    assert "Interpretation: ignoring unknown field(s) sector" in reported
+    assert "RegulationSet: ignoring unknown field(s) sources" in reported
+    assert "Regulation: ignoring unknown field(s) penalty" in reported
+
+    # The same drift is reported once, not on every parse
+    output = io.StringIO()
+    with redirect_stdout(output):
+        store.put_interpretation("b", dict(INTERPRETATION, sector="insurtech"))
+    assert output.getvalue() == ""
+
+
+def test_identical_records_are_shared():
+    store = SessionStore()
+    first = store.put_interpretation("a", INTERPRETATION)
+    second = store.put_interpretation("b", dict(INTERPRETATION))
+    store.put_regulations("a", REGULATIONS)
+    store.put_regulations("b", REGULATIONS)
+
+    assert first == second
+    # One interpretation, one regulation, one regulation set
+    assert store.gauge()["interned_records"] == 3
+
+
+def test_idle_sessions_are_evicted():
+    clock = FakeClock()
+    store = SessionStore(idle_timeout=100, clock=clock)
+    assert store.touch("a") is False
+    store.put_interpretation("a", INTERPRETATION)
+    assert store.touch("a") is True
+
+    clock.now = 500
+    assert store.evict_idle() == 1
+    assert store.get_interpretation("a") is None
+    assert store.touch("a") is False
+
+    gauge = store.gauge()
+    assert gauge["evicted_total"] == 1
+    assert gauge["memory_bytes"] > 0
+
+
+if __name__ == "__main__":
+    for test in (test_round_trip, test_unknown_fields_are_dropped_and_reported,
+                 test_identical_records_are_shared, test_idle_sessions_are_evicted):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
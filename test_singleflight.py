@@ -0,0 +1,86 @@
+"""
+test_singleflight.py
+Test query normalization and coalescing of concurrent duplicate calls.
+"""
+
+import threading
+import time
+
+from singleflight import SingleFlight, normalize_query, search_key
+
+
+def test_normalize_query():
+    assert normalize_query("GDPR enforcement  Germany 2025") == normalize_query("germany gdpr 2025 Enforcement")
+    # Phrases, operators and filters keep their order
+    assert normalize_query('"data protection" Germany') != normalize_query('Germany "protection data"')
+    assert normalize_query("site:bund.de  VAT") == "site:bund.de vat"
+    assert normalize_query("GDPR -fines") != normalize_query("-GDPR fines")
+    assert search_key("GDPR", 5) != search_key("GDPR", 10)
+
+
+def test_concurrent_duplicates_share_one_call():
+    flight = SingleFlight("test_flight")
+    calls = []
+    release = threading.Event()
+
+    def slow_search():
+        calls.append(1)
+        release.wait(2)
+        return {"success": True, "results": [1, 2]}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow_search)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    while flight.stats()["coalesced"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert sum(shared for _, shared in results) == 4
+    assert all(result == {"success": True, "results": [1, 2]} for result, _ in results)
+    assert flight.in_flight() == 0
+
+    # Once finished, the next call runs again (no caching)
+    flight.do("k", lambda: calls.append(1))
+    assert len(calls) == 2
+
+
+def test_errors_are_shared():
+    flight = SingleFlight("test_flight")
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(2)
+        raise RuntimeError("quota exceeded")
+
+    errors = []
+
+    def run():
+        try:
+            flight.do("k", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=run)
+    follower.start()
+    while flight.stats()["coalesced"] < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join()
+    follower.join()
+    assert errors == ["quota exceeded", "quota exceeded"]
+
+
+if __name__ == "__main__":
+    for test in (test_normalize_query, test_concurrent_duplicates_share_one_call, test_errors_are_shared):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
@@ -0,0 +1,77 @@
+"""
+test_slice_cache.py
+Test that re-searches only cover new or stale (type, country) slices.
+"""
+
+from session_store import SessionStore
+from slice_cache import SliceCache, incremental_search
+
+DOMAIN = "expense management software for B2B clients"
+
+
+def fake_search(calls, partial=False):
+    def search(domain, types, countries):
+        calls.append((tuple(types), tuple(countries)))
+        regulations = [{"regulation_name": f"{t} rule", "country_region": c} for t in types for c in countries]
+        regulations.append({"regulation_name": "ViDA", "country_region": "EU"})
+        return {"regulations": regulations,
+                "search_metadata": {"searches_performed": 1, "partial": partial}}
+    return search
+
+
+def names(result):
+    return sorted((r["regulation_name"], r["country_region"]) for r in result["regulations"])
+
+
+def test_adding_a_country_searches_only_that_country():
+    calls = []
+    cache = SliceCache()
+    search = fake_search(calls)
+    incremental_search(cache, DOMAIN, ["tax", "data protection"], ["Germany", "France"], search)
+    assert calls == [(("tax", "data protection"), ("Germany", "France"))]
+
+    result = incremental_search(cache, DOMAIN, ["tax", "data protection"], ["Germany", "France", "Austria"], search)
+    assert calls[1:] == [(("tax", "data protection"), ("Austria",))]
+    assert ("tax rule", "Austria") in names(result) and ("tax rule", "France") in names(result)
+    assert names(result).count(("ViDA", "EU")) == 1
+    assert result["search_metadata"]["incremental"] == {"reused_slices": 4, "searched_slices": 2}
+
+    # A new type is searched for every country; removing one needs no search at all
+    incremental_search(cache, DOMAIN, ["tax", "data protection", "employment"], ["Germany", "Austria"], search)
+    assert calls[2:] == [(("employment",), ("Germany", "Austria"))]
+    result = incremental_search(cache, DOMAIN, ["tax"], ["Germany"], search)
+    assert len(calls) == 3
+    # The tax slice holds what its search found for Germany, whichever type it came from
+    assert names(result) == [("ViDA", "EU"), ("data protection rule", "Germany"), ("tax rule", "Germany")]
+
+
+def test_other_business_stale_and_partial_slices_are_searched_again():
+    now = [0.0]
+    calls = []
+    cache = SliceCache(max_age_minutes=10, clock=lambda: now[0])
+    incremental_search(cache, DOMAIN, ["tax"], ["Germany"], fake_search(calls, partial=True))
+    incremental_search(cache, DOMAIN, ["tax"], ["Germany"], fake_search(calls))
+    assert len(calls) == 2
+
+    incremental_search(cache, "telemedicine platform for clinics", ["tax"], ["Germany"], fake_search(calls))
+    assert len(calls) == 3
+    now[0] = 11 * 60
+    incremental_search(cache, "telemedicine platform for clinics", ["tax"], ["Germany"], fake_search(calls))
+    assert len(calls) == 4
+
+
+def test_session_keeps_slices_across_start_over():
+    store = SessionStore()
+    cache = store.slice_cache("s1")
+    store.clear("s1", keep_slices=True)
+    assert store.slice_cache("s1") is cache
+    store.clear("s1")
+    assert store.slice_cache("s1") is not cache
+
+
+if __name__ == "__main__":
+    for test in (test_adding_a_country_searches_only_that_country,
+                 test_other_business_stale_and_partial_slices_are_searched_again,
+                 test_session_keeps_slices_across_start_over):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
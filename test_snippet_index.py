@@ -0,0 +1,61 @@
+"""
+test_snippet_index.py
+Test BM25 ranking, hit thresholds and the local tier of search_web_tool.
+"""
+
+import search_module
+from snippet_index import SnippetIndex
+
+RESULTS = [
+    {"title": "GDPR enforcement in Germany 2025", "link": "https://a.de/1",
+     "snippet": "Fines issued by German data protection authorities under GDPR.", "source": "a.de"},
+    {"title": "German DPA annual report", "link": "https://b.de/2",
+     "snippet": "GDPR enforcement statistics for Germany, 2025 edition.", "source": "b.de"},
+    {"title": "GDPR fines tracker", "link": "https://c.eu/3",
+     "snippet": "Enforcement actions across the EU including Germany in 2025.", "source": "c.eu"},
+    {"title": "E-invoicing mandate France", "link": "https://d.fr/4",
+     "snippet": "B2B electronic invoicing timeline.", "source": "d.fr"},
+]
+
+
+def test_bm25_ranking_and_link_replacement():
+    index = SnippetIndex()
+    index.add_results(RESULTS)
+    ranked = index.search("e-invoicing France")
+    assert ranked[0]["link"] == "https://d.fr/4"
+    assert ranked[0]["coverage"] == 1.0
+
+    index.add_results([dict(RESULTS[3], title="Updated", snippet="Nothing relevant here")])
+    assert len(index) == 4
+    assert all(r["link"] != "https://d.fr/4" for r in index.search("invoicing"))
+
+
+def test_answer_requires_enough_fresh_hits():
+    now = [0.0]
+    index = SnippetIndex(max_age_hours=1, min_hits=3, clock=lambda: now[0])
+    index.add_results(RESULTS)
+    assert len(index.answer("GDPR enforcement Germany 2025")) == 3
+    assert index.answer("e-invoicing France") is None          # only one hit
+    now[0] += 7200
+    assert index.answer("GDPR enforcement Germany 2025") is None  # stale
+
+
+def test_search_web_tool_reports_local_tier():
+    index = SnippetIndex()
+    index.add_results(RESULTS)
+    saved = search_module.get_snippet_index
+    search_module.get_snippet_index = lambda: index
+    try:
+        result = search_module.search_web_tool("gdpr enforcement germany 2025", num_results=5)
+    finally:
+        search_module.get_snippet_index = saved
+    assert result["tier"] == "local_index"
+    assert result["total_found"] == 3
+    assert set(result["results"][0]) == {"title", "link", "snippet", "source"}
+
+
+if __name__ == "__main__":
+    for test in (test_bm25_ranking_and_link_replacement, test_answer_requires_enough_fresh_hits,
+                 test_search_web_tool_reports_local_tier):
+        test()
+        print(f"✅ PASS │ {test.__name__}")
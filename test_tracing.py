@@ -0,0 +1,154 @@
+"""
+test_tracing.py
+Test that one request becomes one trace of nested spans, exported as OTLP JSON.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import tracing
+from instrumentation import stage
+from metrics import SANITIZED_INPUTS
+from mock_api_server import MockAPIServer
+from security import SecurityValidator
+
+
+def _configure(export, path="", endpoint=""):
+    previous = (tracing.TRACE_EXPORT, tracing.TRACE_PATH, tracing.TRACE_ENDPOINT)
+    tracing.TRACE_EXPORT, tracing.TRACE_PATH, tracing.TRACE_ENDPOINT = export, path, endpoint
+    return previous
+
+
+def _parse():
+    with stage("parse"):
+        pass
+
+
+def _run_request():
+    request = tracing.start_request(surface="test")
+    validator = SecurityValidator()
+    validator.validate_business_description("Payroll software for small companies in Belgium.")
+    validator.sanitize_input("Payroll  software")
+    with stage("search"):
+        with stage("search_web_tool", query="payroll tax Belgium") as tool:
+            tool.set("result_count", 3)
+        tracing.current_span().add_event("security.SEARCH_ERROR", {"details": "example"})
+        worker = threading.Thread(target=tracing.bind(_parse))
+        worker.start()
+        worker.join()
+        try:
+            with stage("llm_iteration", iteration=1):
+                raise TimeoutError("deadline")
+        except TimeoutError:
+            pass
+    request.end()
+    tracing.attach(None)
+    return request
+
+
+def _check(spans, request):
+    by_name = {span["name"]: span for span in spans}
+    assert {span["traceId"] for span in spans} == {request.trace_id}
+    root = by_name["compliance_request"]
+    assert "parentSpanId" not in root
+    search = by_name["search"]
+    assert by_name["security.validate_business_description"]["parentSpanId"] == root["spanId"]
+    # Sanitizing runs per result and page, so it is counted rather than traced
+    assert "security.sanitize_input" not in by_name
+    assert search["parentSpanId"] == root["spanId"]
+    # Tool calls, worker threads and failures nest under their stage
+    tool = by_name["search_web_tool"]
+    assert tool["parentSpanId"] == search["spanId"]
+    assert {a["key"]: a["value"] for a in tool["attributes"]} == {
+        "query": {"stringValue": "payroll tax Belgium"}, "result_count": {"intValue": "3"}}
+    assert by_name["llm_iteration"]["status"] == {"code": 2, "message": "TimeoutError: deadline"}
+    assert by_name["parse"]["parentSpanId"] == search["spanId"]
+    assert search["events"][0]["name"] == "security.SEARCH_ERROR"
+    assert int(root["endTimeUnixNano"]) >= int(search["endTimeUnixNano"])
+
+
+def test_request_exports_one_trace_to_file():
+    sanitized = SANITIZED_INPUTS.value(changed="true")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "traces.jsonl")
+        previous = _configure("file", path=path)
+        try:
+            request = _run_request()
+        finally:
+            _configure(*previous)
+        assert SANITIZED_INPUTS.value(changed="true") == sanitized + 1
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+
+    # Exported once, when the request ended
+    assert len(lines) == 1
+    resource = json.loads(lines[0])["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0]["key"] == "service.name"
+    _check(resource["scopeSpans"][0]["spans"], request)
+
+
+def test_request_exports_to_collector():
+    server = MockAPIServer().start()
+    previous = _configure("http", endpoint=f"{server.url}/v1/traces")
+    try:
+        request = _run_request()
+    finally:
+        _configure(*previous)
+        server.stop()
+    _check(server.spans, request)
+
+
+def test_abandoned_request_ends_at_its_last_activity():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "traces.jsonl")
+        previous = _configure("file", path=path)
+        idle = tracing.TRACE_REQUEST_IDLE_SECONDS
+        tracing.TRACE_REQUEST_IDLE_SECONDS = 0.05
+        try:
+            abandoned = tracing.start_request(surface="test")
+            with stage("interpret"):
+                pass
+            tracing.attach(None)
+            time.sleep(0.1)
+            request = tracing.start_request(surface="test")
+            assert abandoned.span_id not in tracing._open_roots
+            request.end()
+            tracing.attach(None)
+        finally:
+            tracing.TRACE_REQUEST_IDLE_SECONDS = idle
+            _configure(*previous)
+        with open(path, encoding="utf-8") as f:
+            exported = [span for line in f
+                        for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+
+    root = next(span for span in exported if span["spanId"] == abandoned.span_id)
+    assert {"key": "abandoned", "value": {"boolValue": True}} in root["attributes"]
+    interpret = next(span for span in exported if span["name"] == "interpret")
+    assert root["endTimeUnixNano"] == interpret["endTimeUnixNano"]
+    assert int(root["endTimeUnixNano"]) < request.start_ns
+    assert not tracing._last_activity
+
+
+def test_nothing_recorded_when_off():
+    previous = _configure("off")
+    try:
+        request = tracing.start_request()
+        with stage("interpret") as current:
+            current.set("model", "gpt-4o")
+        assert request is tracing.NOOP_SPAN and tracing.current_span() is tracing.NOOP_SPAN
+    finally:
+        _configure(*previous)
+
+
+if __name__ == "__main__":
+    test_request_exports_one_trace_to_file()
+    print("✅ PASS │ test_request_exports_one_trace_to_file")
+    test_request_exports_to_collector()
+    print("✅ PASS │ test_request_exports_to_collector")
+    test_abandoned_request_ends_at_its_last_activity()
+    print("✅ PASS │ test_abandoned_request_ends_at_its_last_activity")
+    test_nothing_recorded_when_off()
+    print("✅ PASS │ test_nothing_recorded_when_off")
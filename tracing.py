@@ -0,0 +1,299 @@
+"""
+tracing.py
+Trace spans across one compliance request, exported as OTLP JSON.
+
+    TRACE_EXPORT=file python main.py                  # appends to traces.jsonl
+    TRACE_EXPORT=http TRACE_ENDPOINT=http://localhost:4318/v1/traces python main.py
+
+Every instrumentation.stage is a span; security checks, LLM calls and
+security events add their own spans and events. Spans nest through a
+ContextVar, so one request (start_request) becomes one trace. Worker threads
+do not inherit it: wrap their functions with bind(). Finished spans are
+buffered and exported when a request ends, as one OTLP/JSON
+ExportTraceServiceRequest per line (the OpenTelemetry collector's file
+exporter format) or POSTed to an OTLP/HTTP collector. Requests left open
+(a Streamlit run abandoned with its tab) are ended at their last activity
+once idle for TRACE_REQUEST_IDLE_SECONDS, when the next request starts.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, List, Optional
+
+# "file", "http" or "off"
+TRACE_EXPORT = os.environ.get("TRACE_EXPORT", "off").lower()
+TRACE_PATH = os.environ.get("TRACE_PATH", "traces.jsonl")
+TRACE_ENDPOINT = os.environ.get("TRACE_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "compliance-finder")
+# Open requests with no span finishing for this long are treated as abandoned
+TRACE_REQUEST_IDLE_SECONDS = float(os.environ.get("TRACE_REQUEST_IDLE_SECONDS", 1800))
+
+# Export early when this many finished spans are waiting
+MAX_BUFFERED_SPANS = 512
+# Longest string attribute exported
+MAX_ATTRIBUTE_CHARS = 500
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+class Span:
+    """One timed operation in a trace."""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'end_ns',
+                 'attributes', 'events', 'status', 'message')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        # Shared, not copied: instrumentation.Stage.set() lands here too
+        self.attributes = {} if attributes is None else attributes
+        self.events: List[Dict] = []
+        self.status = STATUS_UNSET
+        self.message = ""
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def update(self, values: Dict):
+        self.attributes.update(values)
+
+    def add_event(self, name: str, attributes: Optional[Dict] = None):
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes or {}})
+
+    def fail(self, message: str = ""):
+        self.status = STATUS_ERROR
+        self.message = message or self.message
+
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        _finished(self)
+
+
+class _NoopSpan:
+    """Stands in for a span while tracing is off."""
+
+    __slots__ = ()
+    trace_id = ""
+    span_id = ""
+
+    def set(self, key, value):
+        pass
+
+    def update(self, values):
+        pass
+
+    def add_event(self, name, attributes=None):
+        pass
+
+    def fail(self, message=""):
+        pass
+
+    def end(self, end_ns=None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def enabled() -> bool:
+    return TRACE_EXPORT in ("file", "http")
+
+
+def current_span():
+    """The active span, or NOOP_SPAN when there is none."""
+    return _current.get() or NOOP_SPAN
+
+
+def start_span(name: str, attributes: Optional[Dict] = None, parent=None, new_trace: bool = False):
+    """
+    A running span, not yet made current; call end() when done.
+
+    The parent defaults to the current span. Without one, or with
+    new_trace, the span starts a new trace.
+    """
+    if not enabled():
+        return NOOP_SPAN
+    parent = None if new_trace else (parent or _current.get())
+    if isinstance(parent, Span):
+        span_ = Span(name, parent.trace_id, parent.span_id, attributes)
+    else:
+        span_ = Span(name, os.urandom(16).hex(), None, attributes)
+        _end_idle_roots(span_.start_ns)
+        with _lock:
+            _open_roots[span_.span_id] = span_
+            _last_activity[span_.trace_id] = span_.start_ns
+    return span_
+
+
+@contextmanager
+def span(name: str, attributes: Optional[Dict] = None, parent=None, new_trace: bool = False):
+    """Run a block as the current span; exceptions mark it as failed."""
+    current = start_span(name, attributes, parent, new_trace)
+    if current is NOOP_SPAN:
+        yield current
+        return
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def start_request(name: str = "compliance_request", **attributes):
+    """
+    Start a new trace for one user request and make it current.
+
+    For flows that cannot sit inside one with-block (the CLI script,
+    Streamlit reruns); end() the returned span when the request is done.
+    """
+    request = start_span(name, attributes, new_trace=True)
+    attach(request)
+    return request
+
+
+def attach(span_):
+    """Make an open span (e.g. one kept across Streamlit reruns) current in this context; None clears it."""
+    _current.set(span_ if isinstance(span_, Span) else None)
+
+
+def bind(fn: Callable) -> Callable:
+    """fn, run in the caller's context (current span, admission tenant) when called from another thread."""
+    context = copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+
+_lock = threading.Lock()
+_buffer: List[Span] = []
+_open_roots: Dict[str, Span] = {}
+# Trace id -> when the open request last started or finished a span (ns)
+_last_activity: Dict[str, int] = {}
+
+
+def _end_idle_roots(now_ns: int):
+    """End open requests idle for TRACE_REQUEST_IDLE_SECONDS, as of their last activity."""
+    cutoff = now_ns - int(TRACE_REQUEST_IDLE_SECONDS * 1e9)
+    with _lock:
+        idle = [(root, _last_activity.get(root.trace_id, root.start_ns)) for root in _open_roots.values()]
+    for root, last in idle:
+        if last < cutoff:
+            root.set("abandoned", True)
+            root.end(last)
+
+
+def _finished(span_: Span):
+    with _lock:
+        _buffer.append(span_)
+        is_root = _open_roots.pop(span_.span_id, None) is not None
+        if is_root:
+            _last_activity.pop(span_.trace_id, None)
+        elif span_.trace_id in _last_activity:
+            _last_activity[span_.trace_id] = max(_last_activity[span_.trace_id], span_.end_ns)
+        if not is_root and len(_buffer) < MAX_BUFFERED_SPANS:
+            return
+        spans = list(_buffer)
+        _buffer.clear()
+    export(spans)
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)[:MAX_ATTRIBUTE_CHARS]}
+
+
+def _otlp_attributes(attributes: Dict) -> List[Dict]:
+    return [{"key": key, "value": _otlp_value(value)}
+            for key, value in attributes.items() if value is not None]
+
+
+def to_otlp(spans: List[Span]) -> Dict:
+    """An OTLP/JSON ExportTraceServiceRequest for finished spans."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": TRACE_SERVICE_NAME})},
+        "scopeSpans": [{
+            "scope": {"name": "compliance_finder"},
+            "spans": [{
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": _otlp_attributes(s.attributes),
+                "events": [{"name": e["name"], "timeUnixNano": str(e["time_ns"]),
+                            "attributes": _otlp_attributes(e["attributes"])} for e in s.events],
+                "status": {"code": s.status, **({"message": s.message} if s.message else {})},
+            } for s in spans],
+        }],
+    }]}
+
+
+def export(spans: List[Span]):
+    """Write spans to TRACE_PATH or POST them to TRACE_ENDPOINT; failures are only reported."""
+    if not spans:
+        return
+    payload = json.dumps(to_otlp(spans), ensure_ascii=False)
+    try:
+        if TRACE_EXPORT == "http":
+            import httpx
+            httpx.post(TRACE_ENDPOINT, content=payload, timeout=5,
+                       headers={"Content-Type": "application/json"}).raise_for_status()
+        else:
+            with _lock:
+                with open(TRACE_PATH, "a", encoding="utf-8") as f:
+                    f.write(payload + "\n")
+    except Exception as e:
+        print(f"⚠️  Trace export failed: {e}")
+
+
+@atexit.register
+def flush():
+    """End requests still open (e.g. a CLI run that exited early) and export everything."""
+    with _lock:
+        roots = list(_open_roots.values())
+    for root in roots:
+        root.set("ended_at_exit", True)
+        root.end()
+    with _lock:
+        spans = list(_buffer)
+        _buffer.clear()
+    export(spans)